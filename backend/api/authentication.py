@@ -0,0 +1,36 @@
+import copy
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import TTLCache
+
+token_cache = TTLCache(
+    max_size=settings.AUTH_TOKEN_CACHE['MAX_SIZE'],
+    timeout=settings.AUTH_TOKEN_CACHE['TIMEOUT'],
+)
+
+
+def evict_token(key):
+    """Удаляет токен из кэша аутентификации"""
+    token_cache.delete(key)
+
+
+def evict_user_tokens(user_id):
+    """Удаляет из кэша аутентификации все токены пользователя"""
+    token_cache.delete_if(lambda key, user: user.pk == user_id)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пользователя в памяти"""
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None:
+            user, _ = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+        '''Каждый запрос получает свою копию пользователя,
+        чтобы изменения в одном запросе не попадали в кэш'''
+        user = copy.copy(user)
+        return user, Token(key=key, user=user)
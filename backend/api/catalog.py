@@ -0,0 +1,61 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from recipes.models import Ingredient
+
+
+class IngredientCatalog:
+    """
+    Справочник продуктов в памяти процесса для поиска по началу названия.
+    Продукты хранятся в порядке выдачи базы, а поиск идёт бинарным
+    поиском по отсортированным названиям в нижнем регистре
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._items = None
+        self._index = None
+        self._loaded_at = 0
+
+    def load(self):
+        items = list(Ingredient.objects.values(
+            'id', 'name', 'measurement_unit'
+        ))
+        index = sorted(
+            (item['name'].lower(), position)
+            for position, item in enumerate(items)
+        )
+        with self._lock:
+            self._items, self._index = items, index
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._items = self._index = None
+
+    def search(self, prefix=''):
+        """Продукты, название которых начинается с prefix без учёта регистра"""
+        with self._lock:
+            items, index = self._items, self._index
+            expired = time.monotonic() - self._loaded_at > self.timeout
+        if items is None or expired:
+            self.load()
+            items, index = self._items, self._index
+        if not prefix:
+            return items
+        prefix = prefix.lower()
+        start = bisect.bisect_left(index, (prefix,))
+        positions = []
+        for name, position in index[start:]:
+            if not name.startswith(prefix):
+                break
+            positions.append(position)
+        return [items[position] for position in sorted(positions)]
+
+
+ingredient_catalog = IngredientCatalog(
+    timeout=settings.INGREDIENT_CATALOG_TIMEOUT
+)
@@ -0,0 +1,41 @@
+"""
+Аутентификация по JWT. Модуль импортируется только при USE_JWT,
+чтобы без JWT процессы не загружали rest_framework_simplejwt
+"""
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from users.models import User
+
+'''Поля пользователя, которые кладутся в JWT и восстанавливаются
+из него без запроса к базе данных'''
+JWT_USER_FIELDS = ('email', 'username', 'is_active', 'is_staff')
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Аутентификация по JWT, восстанавливающая пользователя из токена"""
+
+    def get_user(self, validated_token):
+        try:
+            claims = {
+                'id': validated_token[api_settings.USER_ID_CLAIM],
+                **{
+                    field: validated_token[field]
+                    for field in JWT_USER_FIELDS
+                }
+            }
+        except KeyError:
+            raise InvalidToken('Токен не содержит данных пользователя')
+
+        '''Остальные поля остаются отложенными: они загрузятся из базы
+        при обращении, а save() обновит только известные поля'''
+        field_names = [
+            field.attname for field in User._meta.concrete_fields
+            if field.attname in claims
+        ]
+        return User.from_db(
+            DEFAULT_DB_ALIAS,
+            field_names,
+            [claims[name] for name in field_names]
+        )
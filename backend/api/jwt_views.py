@@ -0,0 +1,26 @@
+"""
+Выдача JWT. Модуль импортируется только при USE_JWT,
+чтобы без JWT процессы не загружали rest_framework_simplejwt
+"""
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from .jwt_auth import JWT_USER_FIELDS
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Сериалайзер для выдачи JWT с данными пользователя в токене"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for field in JWT_USER_FIELDS:
+            token[field] = getattr(user, field)
+        return token
+
+
+class UserTokenObtainPairView(TokenObtainPairView):
+    """View для получения пары JWT с данными пользователя"""
+
+    serializer_class = UserTokenObtainPairSerializer
+    throttle_scope = 'auth'
@@ -0,0 +1,116 @@
+import json
+import os
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Сводка профилей запросов по маршрутам: свёрнутые стеки "
+        "для flamegraph.pl/speedscope и самые затратные функции"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--directory", default=settings.PROFILING["DIRECTORY"],
+            help="Каталог с профилями"
+        )
+        parser.add_argument(
+            "--output", default=None,
+            help="Каталог для файлов .folded (по умолчанию <directory>/folded)"
+        )
+        parser.add_argument(
+            "--route", default=None,
+            help="Только маршруты, имя которых содержит строку"
+        )
+        parser.add_argument(
+            "--since", type=int, default=None,
+            help="Только профили за последние N минут"
+        )
+        parser.add_argument(
+            "--top", type=int, default=10,
+            help="Сколько самых затратных функций показать"
+        )
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        if not os.path.isdir(directory):
+            raise CommandError(f"Каталог {directory} не найден")
+        routes = self._load(directory, options)
+        if not routes:
+            self.stdout.write("Профилей не найдено")
+            return
+        output = options["output"] or os.path.join(directory, "folded")
+        os.makedirs(output, exist_ok=True)
+        for route, profiles in sorted(routes.items()):
+            cpu = Counter()
+            memory = Counter()
+            for profile in profiles:
+                cpu.update(profile["cpu"])
+                memory.update(profile["memory"])
+            for kind, stacks in (("cpu", cpu), ("memory", memory)):
+                if stacks:
+                    self._write_folded(
+                        os.path.join(output, f"{route}.{kind}.folded"), stacks
+                    )
+            self._report(route, profiles, cpu, memory, options["top"])
+        self.stdout.write(f"Свёрнутые стеки записаны в {output}")
+
+    @staticmethod
+    def _load(directory, options):
+        since = (
+            time.time() - options["since"] * 60 if options["since"] else 0
+        )
+        routes = defaultdict(list)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith(".json") or os.path.getmtime(path) < since:
+                continue
+            with open(path) as file:
+                profile = json.load(file)
+            route = f"{profile['method']} {profile['route']}"
+            if options["route"] and options["route"] not in route:
+                continue
+            routes[route.replace(" ", "_").replace(":", "-")].append(
+                profile
+            )
+        return routes
+
+    @staticmethod
+    def _write_folded(path, stacks):
+        """Формат flamegraph.pl: стек от корня через ';' и вес"""
+        with open(path, "w") as file:
+            for stack, weight in stacks.most_common():
+                file.write(f"{stack} {weight}\n")
+
+    def _report(self, route, profiles, cpu, memory, top):
+        durations = sorted(profile["duration"] for profile in profiles)
+        self.stdout.write(
+            f"{route}: запросов {len(profiles)}, "
+            f"среднее {sum(durations) / len(durations) * 1000:.1f} мс, "
+            f"p95 {durations[int(len(durations) * 0.95)] * 1000:.1f} мс"
+        )
+        total = sum(cpu.values())
+        self_time = Counter()
+        cumulative = Counter()
+        for stack, count in cpu.items():
+            frames = stack.split(";")
+            self_time[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        self.stdout.write("  CPU, собственное время (доля выборок):")
+        for frame, count in self_time.most_common(top):
+            self.stdout.write(
+                f"    {count / total:6.1%} "
+                f"(всего {cumulative[frame] / total:6.1%})  {frame}"
+            )
+        lines = Counter()
+        for stack, size in memory.items():
+            lines[stack.split(";")[-1]] += size
+        if lines:
+            self.stdout.write("  Память, не освобождено к концу запроса:")
+            for line, size in lines.most_common(top):
+                self.stdout.write(f"    {size / 1024:9.1f} КБ  {line}")
@@ -0,0 +1,322 @@
+import json
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from jobs.models import Job
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeCard,
+    ShoppingCart,
+    ShoppingListItem,
+)
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import Subscription, User
+
+from api.readers import SubscriptionReader
+from api.views import RecipeViewSet, UserViewSet
+
+
+class Rollback(Exception):
+    """Откат транзакции с тестовыми данными"""
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN горячих запросов API: ошибка, если в плане есть "
+        "последовательное чтение большой таблицы или стоимость выше порога"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", action="store_true",
+            help="Заполнить базу тестовыми данными и откатить их в конце"
+        )
+        parser.add_argument(
+            "--recipes", type=int, default=20000,
+            help="Сколько рецептов создать при --seed"
+        )
+        parser.add_argument(
+            "--max-cost", type=float, default=5000,
+            help="Максимальная оценочная стоимость запроса"
+        )
+        parser.add_argument(
+            "--min-rows", type=int, default=10000,
+            help="Последовательное чтение таблиц меньшего размера допустимо"
+        )
+        parser.add_argument(
+            "--verbose-plans", action="store_true",
+            help="Печатать планы запросов целиком"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Проверка планов требует PostgreSQL")
+        self.options = options
+        try:
+            with transaction.atomic():
+                if options["seed"]:
+                    self._seed(options["recipes"])
+                self._analyze()
+                violations = self._check_all()
+                if options["seed"]:
+                    raise Rollback
+        except Rollback:
+            pass
+        if violations:
+            raise CommandError(
+                "Регрессии планов запросов:\n" + "\n".join(violations)
+            )
+        self.stdout.write("Планы всех запросов в порядке")
+
+    def _seed(self, recipes_count):
+        """Создаёт пропорциональный набор пользователей, рецептов и связей"""
+        rng = random.Random(0)
+        users = User.objects.bulk_create(
+            User(
+                email=f"seed{number}@example.com",
+                username=f"seed{number}",
+                password="!",
+            )
+            for number in range(max(recipes_count // 10, 10))
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"продукт {number}", measurement_unit="г")
+            for number in range(max(recipes_count // 10, 50))
+        )
+        recipes = []
+        links = []
+        for number in range(recipes_count):
+            chosen = rng.sample(ingredients, 8)
+            recipes.append(Recipe(
+                name=f"рецепт {number}",
+                text="описание",
+                image="recipes/images/seed.png",
+                cooking_time=rng.randint(5, 120),
+                author=rng.choice(users),
+                ingredient_ids=sorted(
+                    ingredient.id for ingredient in chosen
+                ),
+            ))
+            links.append(chosen)
+        Recipe.objects.bulk_create(recipes, batch_size=2000)
+        IngredientInRecipe.objects.bulk_create(
+            (
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+                for recipe, chosen in zip(recipes, links)
+                for ingredient in chosen
+            ),
+            batch_size=5000
+        )
+        for start in range(0, len(recipes), 2000):
+            RecipeCard.objects.refresh(
+                recipe.id for recipe in recipes[start:start + 2000]
+            )
+        for model, per_user, targets in (
+            (Favorite, 20, recipes),
+            (ShoppingCart, 5, recipes),
+            (Subscription, 10, users),
+        ):
+            target_field = next(
+                field.name for field in model._meta.concrete_fields
+                if field.is_relation and field.name != "user"
+            )
+            model.objects.bulk_create(
+                (
+                    model(user=user, **{target_field: target})
+                    for user in users
+                    for target in rng.sample(targets, per_user)
+                    if target != user
+                ),
+                batch_size=5000,
+                ignore_conflicts=True
+            )
+        for user in users[:100]:
+            ShoppingListItem.objects.add_recipes(
+                user.id,
+                list(user.shoppingcarts.values_list("recipe_id", flat=True))
+            )
+        self.stdout.write(
+            f"Создано: пользователей {len(users)}, рецептов {len(recipes)}"
+        )
+
+    def _analyze(self):
+        """
+        Обновляет статистику планировщика и переносит отложенные записи
+        GIN-индексов в сами индексы, как это сделал бы autovacuum:
+        иначе после массовой вставки планировщик считает их дорогими
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute(
+                "SELECT gin_clean_pending_list(indexrelid) FROM pg_index "
+                "JOIN pg_class ON pg_class.oid = indexrelid "
+                "JOIN pg_am ON pg_am.oid = pg_class.relam "
+                "WHERE pg_am.amname = 'gin'"
+            )
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'"
+            )
+            self.table_rows = dict(cursor.fetchall())
+
+    def _view_queryset(self, viewset, action, user, url, cards=False,
+                       **kwargs):
+        """
+        Queryset, который строит вьюсет для запроса, как в API,
+        с чтением списка рецептов из таблицы рецептов или из карточек
+        """
+        view = viewset(action=action, format_kwarg=None, kwargs=kwargs)
+        view.request = Request(APIRequestFactory().get(url))
+        view.request.user = user
+        with override_settings(
+            FAST_READ=cards or settings.FAST_READ,
+            RECIPE_CARDS={**settings.RECIPE_CARDS, "READ": cards},
+        ):
+            return view.get_queryset()
+
+    def _hot_queries(self):
+        user = (
+            User.objects.filter(favorites__isnull=False)
+            .filter(users__isnull=False).first()
+        )
+        recipe = Recipe.objects.exclude(ingredient_ids=[]).order_by(
+            "?"
+        ).first()
+        if user is None or recipe is None:
+            raise CommandError(
+                "В базе нет рецептов с составом или пользователя "
+                "с избранным и подписками: запустите команду с --seed"
+            )
+        author = recipe.author_id
+        ingredient_ids = recipe.ingredient_ids[:2]
+        recipe_ids = list(
+            user.favorites.values_list("recipe_id", flat=True)[:10]
+        )
+        author_ids = list(
+            user.users.order_by("pk").values_list("author_id", flat=True)[:6]
+        )
+        subscriptions = SubscriptionReader(None, recipes_limit=3)
+        page = slice(0, 6)
+        return {
+            "лента рецептов": self._view_queryset(
+                RecipeViewSet, "list", user, "/api/recipes/"
+            )[page],
+            "лента карточек": self._view_queryset(
+                RecipeViewSet, "list", user, "/api/recipes/", cards=True
+            )[page],
+            "карточки автора": self._view_queryset(
+                RecipeViewSet, "list", user, f"/api/recipes/?author={author}",
+                cards=True
+            )[page],
+            "избранное из карточек": self._view_queryset(
+                RecipeViewSet, "list", user, "/api/recipes/?is_favorited=1",
+                cards=True
+            )[page],
+            "рецепты по ids": self._view_queryset(
+                RecipeViewSet, "list", user, "/api/recipes/"
+            ).filter(pk__in=recipe_ids).order_by(),
+            "карточки по ids": self._view_queryset(
+                RecipeViewSet, "list", user, "/api/recipes/", cards=True
+            ).filter(pk__in=recipe_ids).order_by(),
+            "лента рецептов с полями": self._view_queryset(
+                RecipeViewSet, "list", user,
+                "/api/recipes/?fields=id,name,author,ingredients"
+            )[page],
+            "рецепты автора": self._view_queryset(
+                RecipeViewSet, "list", user, f"/api/recipes/?author={author}"
+            )[page],
+            "избранное": self._view_queryset(
+                RecipeViewSet, "list", user, "/api/recipes/?is_favorited=1"
+            )[page],
+            "корзина": self._view_queryset(
+                RecipeViewSet, "list", user,
+                "/api/recipes/?is_in_shopping_cart=1"
+            )[page],
+            "рецепты по продуктам": self._view_queryset(
+                RecipeViewSet, "list", user,
+                "/api/recipes/?ingredients="
+                + ",".join(map(str, ingredient_ids))
+            )[page],
+            "рецепт": self._view_queryset(
+                RecipeViewSet, "retrieve", user, f"/api/recipes/{recipe.id}/"
+            ).filter(pk=recipe.id),
+            "состав рецептов": IngredientInRecipe.objects.filter(
+                recipe_id__in=[recipe.id]
+            ).select_related("ingredient"),
+            "похожие рецепты": Recipe.objects.filter(
+                similar_to__recipe_id=recipe.id
+            ).order_by("-similar_to__score"),
+            "поиск продуктов": Ingredient.objects.filter(
+                name__istartswith="продукт 1"
+            )[:10],
+            "пользователи": self._view_queryset(
+                UserViewSet, "list", user, "/api/users/"
+            )[page],
+            "подписки": user.users.select_related("author")[page],
+            "рецепты авторов подписок": subscriptions.recipes_query(
+                author_ids
+            ),
+            "число рецептов авторов подписок":
+                subscriptions.recipes_counts_query(author_ids),
+            "рекомендации авторов": User.objects.filter(
+                recommended_to__user=user
+            ).order_by("-recommended_to__score"),
+            "список покупок": user.shopping_list_items.select_related(
+                "ingredient"
+            ),
+            "очередь задач": Job.objects.filter(
+                status=Job.PENDING
+            ).order_by("-priority", "run_at", "id")[:1],
+        }
+
+    def _check_all(self):
+        violations = []
+        for name, query in self._hot_queries().items():
+            plan = self._explain(query)
+            if self.options["verbose_plans"]:
+                self.stdout.write(f"{name}:\n{json.dumps(plan, indent=2)}")
+            problems = [
+                f"seq scan {table}" for table in self._seq_scans(plan)
+                if self.table_rows.get(table, 0) >= self.options["min_rows"]
+            ]
+            if plan["Total Cost"] > self.options["max_cost"]:
+                problems.append(f"стоимость {plan['Total Cost']:.0f}")
+            self.stdout.write(
+                f"{'ОШИБКА' if problems else 'ok':6} "
+                f"{plan['Total Cost']:10.1f}  {name}"
+                + (f": {', '.join(problems)}" if problems else "")
+            )
+            violations += [f"{name}: {problem}" for problem in problems]
+        return violations
+
+    @staticmethod
+    def _explain(query):
+        """
+        План запроса в виде словаря (EXPLAIN FORMAT JSON).
+        query - queryset или пара (SQL, параметры)
+        """
+        sql, params = (
+            query if isinstance(query, tuple)
+            else query.query.sql_with_params()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]
+
+    def _seq_scans(self, plan):
+        """Таблицы, которые план читает последовательно"""
+        if plan["Node Type"] == "Seq Scan":
+            yield plan["Relation Name"]
+        for child in plan.get("Plans", []):
+            yield from self._seq_scans(child)
@@ -0,0 +1,182 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import override_settings
+from recipes.models import Favorite, Recipe
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.models import User
+
+from api.serializers import recipe_cache
+from api.views import RecipeViewSet, UserViewSet
+
+
+'''Варианты чтения: настройки FAST_READ и RECIPE_CARDS['READ']'''
+MODES = {
+    "сериалайзер": (False, False),
+    "values()": (True, False),
+    "карточки": (True, True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение ответов списков рецептов, пользователей и подписок "
+        "через сериалайзеры, через values() (FAST_READ) и из карточек "
+        "рецептов: ошибка при любом расхождении байтов, затем "
+        "процессорное время на строку"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", type=int, default=20,
+            help="Повторов каждого запроса при замере"
+        )
+        parser.add_argument(
+            "--page-size", type=int, default=50,
+            help="Строк на странице списков"
+        )
+
+    def handle(self, *args, **options):
+        self.factory = APIRequestFactory(
+            SERVER_NAME=settings.ALLOWED_HOSTS[0]
+        )
+        self.views = {
+            "recipes": RecipeViewSet.as_view(
+                {"get": "list"}, throttle_classes=()
+            ),
+            "users": UserViewSet.as_view(
+                {"get": "list"}, throttle_classes=()
+            ),
+            "subscriptions": UserViewSet.as_view(
+                {"get": "subscriptions"}, throttle_classes=()
+            ),
+        }
+        cases = self._cases(options["page_size"])
+        mismatches = []
+        for name, view, params, user in cases:
+            for warm in (False, True):
+                expected, *others = [
+                    (mode, self._get(view, params, user, mode, not warm))
+                    for mode in MODES
+                ]
+                mismatches += [
+                    f"{name}, {mode} ({'тёплый' if warm else 'холодный'} "
+                    f"кэш): {expected[1][:300]!r} != {content[:300]!r}"
+                    for mode, content in others if content != expected[1]
+                ]
+        if mismatches:
+            raise CommandError(
+                "Ответы различаются:\n" + "\n".join(mismatches)
+            )
+        self.stdout.write(f"Ответы совпадают во всех {len(cases)} случаях")
+        for name, view, params, user in cases:
+            self._measure(name, view, params, user, options["iterations"])
+
+    def _cases(self, page_size):
+        reader = (
+            User.objects.annotate(count=Count("favorites"))
+            .filter(count__gt=0).order_by("-count").first()
+        )
+        subscriber = (
+            User.objects.annotate(count=Count("users"))
+            .filter(count__gt=0).order_by("-count").first()
+        )
+        if not Recipe.objects.exists() or not reader or not subscriber:
+            raise CommandError(
+                "Нужны рецепты, избранное и подписки для сравнения"
+            )
+        ingredients = Recipe.objects.exclude(
+            ingredient_ids=[]
+        ).values_list("ingredient_ids", flat=True).first() or []
+        ids = ",".join(map(str, Favorite.objects.filter(
+            user=reader
+        ).values_list("recipe_id", flat=True)[:10]))
+        page = {"limit": page_size}
+        return [
+            ("рецепты", "recipes", page, reader),
+            ("рецепты анонимно", "recipes", page, None),
+            ("рецепты, поля", "recipes",
+             {**page, "fields": "id,name,author,ingredients,is_favorited"},
+             reader),
+            ("рецепты, поля и expand", "recipes",
+             {**page, "fields": "id,image,author,ingredients,"
+              "is_in_shopping_cart", "expand": "author,ingredients"},
+             reader),
+            ("рецепты, состав без id", "recipes",
+             {**page, "fields": "name,ingredients", "expand": "ingredients"},
+             reader),
+            ("рецепты по ids", "recipes", {"ids": ids}, reader),
+            ("рецепты по ids, поля без id", "recipes",
+             {"ids": ids, "fields": "name,author,is_favorited"}, reader),
+            ("рецепты в избранном", "recipes",
+             {**page, "is_favorited": 1}, reader),
+            ("рецепты из продуктов", "recipes",
+             {**page, "available_ingredients": ",".join(
+                 map(str, ingredients[:3])
+             ), "max_missing": 2}, reader),
+            ("пользователи", "users", page, reader),
+            ("пользователи анонимно", "users", page, None),
+            ("пользователи, поля", "users",
+             {**page, "fields": "id,username,is_subscribed"}, reader),
+            ("пользователи, поля без id", "users",
+             {**page, "fields": "username,is_subscribed"}, reader),
+            ("подписки", "subscriptions",
+             {**page, "recipes_limit": 3}, subscriber),
+            ("подписки без recipes_limit", "subscriptions", page, subscriber),
+            ("подписки, поля", "subscriptions",
+             {**page, "recipes_limit": 2, "fields": "id,email,recipes"},
+             subscriber),
+        ]
+
+    def _get(self, view, params, user, mode, clear=False):
+        if clear:
+            recipe_cache.clear()
+        request = self.factory.get(f"/api/{view}/", params)
+        if user is not None:
+            force_authenticate(request, user=user)
+        fast, cards = MODES[mode]
+        with override_settings(
+            FAST_READ=fast,
+            RECIPE_CARDS={**settings.RECIPE_CARDS, "READ": cards},
+        ):
+            response = self.views[view](request)
+            response.render()
+        if response.status_code != 200:
+            raise CommandError(
+                f"/api/{view}/ {params}: ответ {response.status_code} "
+                f"{response.content[:300]!r}"
+            )
+        return response.content
+
+    def _measure(self, name, view, params, user, iterations):
+        rows = len(self._results(view, params, user))
+        if not rows:
+            self.stdout.write(f"  {name}: пустой ответ")
+            return
+        line = []
+        for cache in ("тёплый", "холодный"):
+            timings = {}
+            for mode in MODES:
+                self._get(view, params, user, mode)
+                started = time.process_time()
+                for _ in range(iterations):
+                    self._get(
+                        view, params, user, mode, clear=cache == "холодный"
+                    )
+                timings[mode] = (
+                    (time.process_time() - started) / iterations / rows
+                )
+            line.append(f"{cache} кэш: " + ", ".join(
+                f"{mode} {timing * 1e6:.0f} мкс"
+                for mode, timing in timings.items()
+            ))
+        self.stdout.write(
+            f"  {name}, {rows} строк, на строку: " + "; ".join(line)
+        )
+
+    def _results(self, view, params, user):
+        content = json.loads(self._get(view, params, user, "карточки"))
+        return content["results"] if isinstance(content, dict) else content
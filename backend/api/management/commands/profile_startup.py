@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+'''Скрипт, выполняемый в отдельном процессе: запуск приложения
+так же, как в воркере gunicorn, и два запроса подряд'''
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.conf import settings
+settings.WARMUP['ENABLED'] = {warm_up}
+from foodgram.wsgi import application
+app_loaded = time.perf_counter()
+from django.test import Client
+client = Client(SERVER_NAME={server_name!r})
+latencies = []
+for _ in range(2):
+    request_started = time.perf_counter()
+    status = client.get({url!r}).status_code
+    latencies.append(time.perf_counter() - request_started)
+print(json.dumps({{
+    'setup': setup_done - started,
+    'application': app_loaded - setup_done,
+    'first_request': latencies[0],
+    'second_request': latencies[1],
+    'status': status,
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Время импорта модулей и время до первого ответа "
+        "для нового процесса приложения, без прогрева и с прогревом"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", default="/api/recipes/",
+            help="Адрес первого запроса"
+        )
+        parser.add_argument(
+            "--top", type=int, default=20,
+            help="Сколько самых медленных модулей показать"
+        )
+
+    def _run_child(self, url, warm_up):
+        result = subprocess.run(
+            [
+                sys.executable, "-X", "importtime", "-c",
+                CHILD_SCRIPT.format(
+                    warm_up=warm_up,
+                    server_name=(settings.ALLOWED_HOSTS or ["localhost"])[0],
+                    url=url,
+                ),
+            ],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+    @staticmethod
+    def _parse_importtime(stderr):
+        """
+        Разбирает вывод -X importtime: собственное и накопленное время
+        модулей в микросекундах и суммарное время по пакетам
+        """
+        modules = []
+        packages = defaultdict(int)
+        for line in stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            own, cumulative, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            modules.append((int(cumulative), int(own), name))
+            packages[name.split(".")[0]] += int(own)
+        return modules, packages
+
+    def handle(self, *args, **options):
+        runs = {}
+        for warm_up in (False, True):
+            runs[warm_up], stderr = self._run_child(options["url"], warm_up)
+        modules, packages = self._parse_importtime(stderr)
+
+        self.stdout.write(
+            f"Импорт модулей: {sum(own for _, own, _ in modules) / 1e6:.3f} с"
+        )
+        self.stdout.write("Пакеты по собственному времени импорта, мс:")
+        for package, own in sorted(
+            packages.items(), key=lambda item: -item[1]
+        )[:options["top"]]:
+            self.stdout.write(f"  {own / 1000:9.1f}  {package}")
+        self.stdout.write("Модули по накопленному времени импорта, мс:")
+        for cumulative, own, name in sorted(modules, reverse=True)[
+            :options["top"]
+        ]:
+            self.stdout.write(
+                f"  {cumulative / 1000:9.1f} ({own / 1000:7.1f})  {name}"
+            )
+
+        for warm_up, run in runs.items():
+            self.stdout.write(
+                f"{'С прогревом' if warm_up else 'Без прогрева'}: "
+                f"django.setup {run['setup'] * 1000:.0f} мс, "
+                f"загрузка приложения {run['application'] * 1000:.0f} мс, "
+                f"первый запрос {run['first_request'] * 1000:.0f} мс, "
+                f"второй {run['second_request'] * 1000:.0f} мс "
+                f"(HTTP {run['status']})"
+            )
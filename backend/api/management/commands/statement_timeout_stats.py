@@ -0,0 +1,17 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.timeouts import stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Таймауты запросов к базе по маршрутам API: всего, отдано "
+        "устаревших ответов и ответов 503, в JSON. Счётчики общие "
+        "для воркеров этого сервера (STATEMENT_TIMEOUT_STATS_STORE="
+        "shared_memory) или всех серверов с общим кэшем (cache)"
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,123 @@
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from recipes.models import (
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingListItem,
+)
+from rest_framework.test import APIClient
+from users.models import Subscription, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочная проверка одновременных запросов на добавление "
+        "и удаление избранного, корзины покупок и подписок"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--rounds", type=int, default=20)
+        parser.add_argument(
+            "--allow-writes", action="store_true",
+            help="Подтверждение: команда создаёт и затем удаляет "
+            "пользователей и рецепт в текущей базе"
+        )
+
+    def _create_user(self, prefix):
+        return User.objects.create_user(
+            email=f"{prefix}-{uuid.uuid4().hex}@example.com",
+            username=f"{prefix}-{uuid.uuid4().hex[:16]}",
+            password=uuid.uuid4().hex,
+        )
+
+    def handle(self, *args, **options):
+        if not options["allow_writes"]:
+            raise CommandError(
+                "Команда пишет в базу "
+                f"{connections['default'].settings_dict['NAME']}, "
+                "запустите с --allow-writes"
+            )
+        threads, rounds = options["threads"], options["rounds"]
+        user = self._create_user("stress-user")
+        try:
+            author = self._create_user("stress-author")
+        except Exception:
+            user.delete()
+            raise
+        try:
+            self._run(user, author, threads, rounds)
+        finally:
+            user.delete()
+            author.delete()
+
+    def _run(self, user, author, threads, rounds):
+        recipe = Recipe.objects.create(
+            name="Stress", text="Stress", cooking_time=1,
+            image="recipes/images/stress.png", author=author
+        )
+        ingredient = Ingredient.objects.first()
+        if ingredient:
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+
+        urls = (
+            f"/api/recipes/{recipe.id}/favorite/",
+            f"/api/recipes/{recipe.id}/shopping_cart/",
+            f"/api/users/{author.id}/subscribe/",
+        )
+        statuses = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads, timeout=60)
+
+        def worker():
+            client = APIClient(
+                SERVER_NAME=settings.ALLOWED_HOSTS[0],
+                raise_request_exception=False
+            )
+            client.force_authenticate(user)
+            try:
+                for round_number in range(rounds):
+                    send = client.post if round_number % 2 == 0 else (
+                        client.delete
+                    )
+                    for url in urls:
+                        barrier.wait()
+                        status_code = send(url).status_code
+                        with lock:
+                            statuses[status_code] += 1
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        leftovers = (
+            user.favorites.count()
+            + user.shoppingcarts.count()
+            + Subscription.objects.filter(user=user).count()
+            + ShoppingListItem.objects.filter(user=user).count()
+        ) if rounds % 2 == 0 else 0
+
+        self.stdout.write(
+            "Ответы: " + ", ".join(
+                f"{code}: {count}" for code, count in sorted(statuses.items())
+            )
+        )
+        errors = sum(
+            count for code, count in statuses.items() if code >= 500
+        )
+        if errors or leftovers:
+            raise CommandError(
+                f"Ошибок сервера: {errors}, лишних записей: {leftovers}"
+            )
+        self.stdout.write(self.style.SUCCESS("Ошибок сервера нет"))
@@ -0,0 +1,199 @@
+import logging
+import random
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.http import HttpResponse, JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from users.hashers import busy_responses
+
+from .profiling import RequestProfile
+from .timeouts import (
+    is_statement_timeout,
+    record,
+    set_statement_timeout,
+    stale_response,
+    statement_timeout,
+    store_response,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Добавляет к ответу заголовки RateLimit-Limit, RateLimit-Remaining
+    и RateLimit-Reset, если запрос проходил через ограничение частоты
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            limit, remaining, reset = rate_limit
+            response['RateLimit-Limit'] = limit
+            response['RateLimit-Remaining'] = remaining
+            response['RateLimit-Reset'] = reset
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос (CPU и память, см. api.profiling), если
+    сотрудник передал заголовок X-Profile или параметр ?profile=1,
+    либо если запрос попал в долю PROFILING['SAMPLE_RATE'].
+    Имя файла профиля возвращается в заголовке X-Profile-Id
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self._should_profile(request):
+            return self.get_response(request)
+        profile = RequestProfile()
+        profile.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            '''Сбой профилировщика не должен подменять ответ'''
+            try:
+                profile.stop()
+            except Exception:
+                logger.exception('Не удалось снять профиль запроса')
+                profile = None
+        if profile is None:
+            return response
+        match = request.resolver_match
+        try:
+            response['X-Profile-Id'] = profile.save(
+                route=match.view_name if match else 'unresolved',
+                method=request.method,
+                path=request.path,
+                status=response.status_code,
+            )
+        except Exception:
+            logger.exception('Не удалось сохранить профиль запроса')
+        return response
+
+    @staticmethod
+    def _should_profile(request):
+        options = settings.PROFILING
+        if not options['ENABLED']:
+            return False
+        if random.random() < options['SAMPLE_RATE']:
+            return True
+        if not (
+            request.headers.get(options['HEADER'])
+            or request.GET.get(options['QUERY_PARAM'])
+        ):
+            return False
+        '''Пользователь определяется аутентификацией API заранее:
+        профиль по запросу доступен только сотрудникам'''
+        drf_request = Request(request, authenticators=[
+            authentication() for authentication
+            in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ])
+        try:
+            return drf_request.user.is_staff
+        except APIException:
+            return False
+
+
+class PasswordHashingMiddleware:
+    """
+    Разрешает пулу хэширования паролей (users.hashers) отвечать
+    HashingBusy на запросы к представлениям DRF, которые выдают его
+    как 503 с Retry-After. Остальные представления, например вход
+    в админку, при занятом пуле считают хэш в своём потоке
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            token = getattr(request, 'hashing_busy_token', None)
+            if token is not None:
+                busy_responses.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if isinstance(view_class, type) and issubclass(view_class, APIView):
+            request.hashing_busy_token = busy_responses.set(True)
+
+
+class StatementTimeoutMiddleware:
+    """
+    Выполняет представления маршрутов с ограничением времени запросов
+    к базе (api.timeouts). Потоковые ответы маршрутов из ROUTES
+    собираются целиком внутри транзакции, чтобы под ограничение попали
+    и запросы при их выводе. Потоковые ответы остальных маршрутов,
+    например выгрузки корпуса, не собираются в память: ограничение
+    действует только на само представление
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = request.resolver_match.view_name
+        timeout = statement_timeout(route)
+        if not timeout:
+            return None
+        try:
+            with transaction.atomic():
+                set_statement_timeout(timeout)
+                response = view_func(request, *view_args, **view_kwargs)
+                if (
+                    not getattr(response, 'streaming', False)
+                    or route in settings.STATEMENT_TIMEOUTS['ROUTES']
+                ):
+                    response = self._complete(response)
+        except DatabaseError as error:
+            if not is_statement_timeout(error):
+                raise
+            logger.warning('Таймаут запроса к базе: %s', request.path)
+            record(route, 'timeouts')
+            response = stale_response(request, route)
+            if response is not None:
+                record(route, 'stale')
+                return response
+            record(route, 'unavailable')
+            response = JsonResponse(
+                {'detail': 'Запрос выполняется слишком долго, '
+                           'повторите его позже.'},
+                status=503,
+                json_dumps_params={'ensure_ascii': False},
+            )
+            response['Retry-After'] = max(1, timeout // 1000)
+            return response
+        store_response(request, route, response)
+        return response
+
+    @staticmethod
+    def _complete(response):
+        if callable(getattr(response, 'render', None)):
+            return response.render()
+        if not response.streaming:
+            return response
+        complete = HttpResponse(
+            b''.join(response.streaming_content),
+            status=response.status_code,
+        )
+        for name, value in response.items():
+            if name.lower() != 'content-length':
+                complete[name] = value
+        response.close()
+        return complete
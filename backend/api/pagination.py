@@ -1,10 +1,172 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class PagesPagination(PageNumberPagination):
-    """Класс кастомной пагинации для приложения"""
+    """
+    Класс кастомной пагинации для приложения.
+    Способ подсчёта общего числа объектов задаётся атрибутом
+    pagination_count_mode вьюсета или настройкой PAGINATION['COUNT_MODE']:
+    exact - COUNT(*) на каждой странице,
+    cached - COUNT(*), закэшированный по тексту запроса на COUNT_TIMEOUT,
+    estimated - оценка планировщика для таблицы без фильтров
+    (с фильтрами - как cached),
+    has_next - без подсчёта, count в ответе равен null
+    """
 
     page_query_param = 'page'
     page_size_query_param = 'limit'
     page_size = 6
     max_page_size = 100
+
+    COUNT_MODES = ('exact', 'cached', 'estimated', 'has_next')
+
+    def get_count_mode(self, view):
+        mode = (
+            getattr(view, 'pagination_count_mode', None)
+            or settings.PAGINATION['COUNT_MODE']
+        )
+        if mode not in self.COUNT_MODES:
+            raise ValueError(f'Неизвестный способ подсчёта: {mode}')
+        return mode
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode = self.get_count_mode(view)
+        if self.count_mode == 'exact':
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            self.number = int(page_number)
+            if self.number < 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='Некорректный номер страницы'
+            ))
+
+        '''Лишняя строка показывает, есть ли следующая страница,
+        без подсчёта всех объектов'''
+        offset = (self.number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        if not rows and self.number > 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='Страница пуста'
+            ))
+        self.has_next = len(rows) > page_size
+        self.rows = rows[:page_size]
+
+        '''Оценка не может быть меньше уже прочитанного,
+        а на последней странице число объектов известно точно'''
+        seen = offset + len(self.rows)
+        if not self.has_next:
+            self.count = seen
+        elif self.count_mode == 'has_next':
+            self.count = None
+        else:
+            self.count = max(self._get_count(queryset), seen + 1)
+        return self.rows
+
+    def _get_count(self, queryset):
+        if self.count_mode == 'estimated':
+            estimate = self._estimated_count(queryset)
+            if estimate is not None:
+                return estimate
+        return self._cached_count(queryset)
+
+    @staticmethod
+    def _estimated_count(queryset):
+        """
+        Число строк таблицы по статистике планировщика (pg_class.reltuples).
+        Только для запросов без фильтров и для достаточно больших таблиц:
+        на маленьких таблицах точный подсчёт дешёвый, а оценка грубая
+        """
+        query = queryset.query
+        connection = connections[queryset.db]
+        if (
+            connection.vendor != 'postgresql'
+            or query.where
+            or query.distinct
+            or query.combinator
+        ):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if not row or row[0] < settings.PAGINATION['ESTIMATE_MIN_ROWS']:
+            return None
+        return int(row[0])
+
+    @staticmethod
+    def _cached_count(queryset):
+        """
+        COUNT(*) в кэше; ключ - текст запроса id с параметрами,
+        поэтому у каждого набора фильтров (и пользователя в них) свой счётчик
+        """
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        key = 'page_count:' + hashlib.sha1(
+            repr((queryset.db, sql, params)).encode()
+        ).hexdigest()
+        cache = caches[settings.PAGINATION['CACHE_ALIAS']]
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION['COUNT_TIMEOUT'])
+        return count
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.get_count(),
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_count(self):
+        if self.count_mode == 'exact':
+            return self.page.paginator.count
+        return self.count
+
+    def get_next_link(self):
+        if self.count_mode == 'exact':
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.page_query_param,
+            self.number + 1
+        )
+
+    def get_previous_link(self):
+        if self.count_mode == 'exact':
+            return super().get_previous_link()
+        if self.number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.number - 1)
+
+    def get_html_context(self):
+        if self.count_mode == 'exact':
+            return super().get_html_context()
+        return {
+            'previous_url': self.get_previous_link(),
+            'next_url': self.get_next_link(),
+            'page_links': [],
+        }
@@ -0,0 +1,170 @@
+"""
+Профилирование отдельных запросов: выборочный профиль CPU и снимок
+выделений памяти tracemalloc. Профили пишутся в каталог
+PROFILING['DIRECTORY'] файлами JSON со стеками в свёрнутом формате
+(кадры от корня через ';'), старые файлы удаляются сверх MAX_FILES.
+Сводку по маршрутам строит команда aggregate_profiles
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+
+
+def short_path(filename):
+    """Путь к файлу внутри пакета или проекта"""
+    for marker in ('site-packages' + os.sep, str(settings.BASE_DIR) + os.sep):
+        position = filename.rfind(marker)
+        if position != -1:
+            return filename[position + len(marker):]
+    return filename
+
+
+class StackSampler:
+    """
+    Выборочный профилировщик: отдельный поток раз в interval секунд
+    снимает стек потока запроса через sys._current_frames
+    и считает одинаковые стеки
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = Counter()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='request-profiler', daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{code.co_name} ({short_path(code.co_filename)}:'
+                    f'{code.co_firstlineno})'
+                )
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+
+class MemoryTracer:
+    """
+    Снимок памяти, выделенной за время запроса и ещё не освобождённой.
+    tracemalloc один на процесс, поэтому память профилируется только
+    у одного запроса за раз: пересекающиеся запросы снимают лишь CPU.
+    Выделения других потоков воркера в снимок всё равно попадают
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.traced = False
+        self._started = False
+
+    def start(self):
+        if not self._lock.acquire(blocking=False):
+            return
+        self.traced = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+
+    def stop(self):
+        if not self.traced:
+            return Counter()
+        try:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ))
+        finally:
+            if self._started:
+                tracemalloc.stop()
+            self._lock.release()
+        allocations = Counter()
+        for statistic in snapshot.statistics('traceback'):
+            allocations[';'.join(
+                f'{short_path(frame.filename)}:{frame.lineno}'
+                for frame in statistic.traceback
+            )] += statistic.size
+        return allocations
+
+
+class RequestProfile:
+    """Профиль одного запроса: CPU и, при включённой настройке, память"""
+
+    def __init__(self):
+        options = settings.PROFILING
+        self.sampler = StackSampler(options['INTERVAL'])
+        self.memory = (
+            MemoryTracer(options['TRACEMALLOC_FRAMES'])
+            if options['MEMORY'] else None
+        )
+
+    def start(self):
+        if self.memory:
+            self.memory.start()
+        self.started_at = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        try:
+            self.samples = self.sampler.stop()
+            self.duration = time.perf_counter() - self.started_at
+        finally:
+            self.allocations = (
+                self.memory.stop() if self.memory else Counter()
+            )
+
+    def save(self, route, method, path, status):
+        """Записывает профиль в каталог и возвращает имя файла"""
+        directory = settings.PROFILING['DIRECTORY']
+        os.makedirs(directory, exist_ok=True)
+        name = (
+            f'{time.time():.6f}-{os.getpid()}-'
+            f'{route.replace(":", "-").replace("/", "-")}.json'
+        )
+        with open(os.path.join(directory, name), 'w') as file:
+            json.dump({
+                'route': route,
+                'method': method,
+                'path': path,
+                'status': status,
+                'duration': self.duration,
+                'interval': self.sampler.interval,
+                'cpu': self.samples,
+                'memory': self.allocations,
+                'memory_traced': bool(self.memory and self.memory.traced),
+            }, file)
+        rotate(directory, settings.PROFILING['MAX_FILES'])
+        return name
+
+
+def rotate(directory, max_files):
+    """Удаляет самые старые профили сверх max_files"""
+    names = sorted(
+        name for name in os.listdir(directory) if name.endswith('.json')
+    )
+    for name in names[:-max_files]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,429 @@
+"""
+Быстрое чтение списков рецептов, пользователей и подписок.
+
+Строки страницы читаются через values(), связанные объекты - отдельными
+запросами в словари по id, и ответ собирается из простых словарей без
+экземпляров моделей и полей сериалайзеров. Состав и порядок ключей
+берутся из сериалайзеров с учётом параметров fields и expand, поэтому
+вывод совпадает с ними побайтно (проверка - команда compare_read_paths).
+Включается настройкой FAST_READ, с RECIPE_CARDS['READ'] рецепты
+читаются из карточек RecipeCard одной таблицей
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from recipes.models import IngredientInRecipe, Recipe, RecipeCard
+from users.models import Subscription, User
+
+from .serializers import (
+    RecipeSerializer,
+    ShortRecipeSerializer,
+    SubscribedUserSerializer,
+    UserSerializer,
+    recipe_cache,
+)
+
+
+def readable_fields(serializer_class):
+    """Имена выводимых полей сериалайзера в порядке вывода"""
+    return tuple(
+        name for name, field in serializer_class().fields.items()
+        if not field.write_only
+    )
+
+
+USER_FIELDS = readable_fields(UserSerializer)
+RECIPE_FIELDS = readable_fields(RecipeSerializer)
+SHORT_RECIPE_FIELDS = readable_fields(ShortRecipeSerializer)
+SUBSCRIPTION_FIELDS = readable_fields(SubscribedUserSerializer)
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+
+'''Поля-флаги и имена аннотаций, из которых они читаются'''
+RECIPE_FLAGS = {
+    'is_favorited': 'favorited',
+    'is_in_shopping_cart': 'in_shopping_cart',
+}
+
+
+def file_url(storage, name, request=None):
+    """Адрес файла, как его выводит FileField сериалайзера"""
+    if not name:
+        return None
+    url = storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def requested(all_fields, fields):
+    return tuple(
+        name for name in all_fields if fields is None or name in fields
+    )
+
+
+class UserReader:
+    """Представления пользователей из строк values()"""
+
+    avatar_storage = User._meta.get_field('avatar').storage
+
+    def __init__(self, request, fields=None, all_fields=USER_FIELDS):
+        self.request = request
+        self.fields = requested(all_fields, fields)
+
+    @property
+    def columns(self):
+        """
+        Поля для values(): флаг подписки - аннотация subscribed.
+        id читается всегда, в вывод он попадает, только если запрошен
+        """
+        return list(dict.fromkeys(['id', *(
+            'subscribed' if name == 'is_subscribed' else name
+            for name in self.fields if name in USER_FIELDS
+        )]))
+
+    def represent_row(self, row):
+        representation = {}
+        for name in self.fields:
+            if name == 'avatar':
+                representation[name] = file_url(
+                    self.avatar_storage, row['avatar'], self.request
+                )
+            elif name == 'is_subscribed':
+                representation[name] = row['subscribed']
+            elif name in USER_FIELDS:
+                representation[name] = row[name]
+        return representation
+
+    def represent(self, rows):
+        return [self.represent_row(row) for row in rows]
+
+    def by_id(self, user_ids, subscribed_ids=()):
+        """Представления пользователей по id с флагом подписки"""
+        columns = [
+            column for column in self.columns if column != 'subscribed'
+        ]
+        return {
+            row['id']: self.represent_row(
+                {**row, 'subscribed': row['id'] in subscribed_ids}
+            )
+            for row in User.objects.filter(id__in=user_ids).values(*columns)
+        }
+
+
+class RecipeReader:
+    """
+    Представления рецептов из строк values(). В полном выводе
+    не зависящая от пользователя часть берётся из кэша фрагментов
+    и дополняется флагами из аннотаций строки, как в RecipeSerializer
+    """
+
+    image_storage = Recipe._meta.get_field('image').storage
+
+    def __init__(self, request, fields=None, expand=(), use_fragments=False):
+        self.request = request
+        self.fields = requested(RECIPE_FIELDS, fields)
+        self.expand = set(expand)
+        self.use_fragments = use_fragments
+
+    @property
+    def columns(self):
+        """
+        Поля и аннотации queryset, нужные для вывода страницы.
+        id читается всегда: по нему собираются состав и страница ids,
+        а в вывод он попадает, только если запрошен
+        """
+        if self.use_fragments:
+            return [
+                'id', 'updated_at', 'author_subscribed',
+                *RECIPE_FLAGS.values()
+            ]
+        columns = ['id']
+        for name in self.fields:
+            if name == 'author':
+                columns.append('author_id')
+                if 'author' in self.expand:
+                    columns.append('author_subscribed')
+            elif name == 'ingredients':
+                if 'ingredients' not in self.expand:
+                    columns.append('ingredient_ids')
+            elif name != 'id':
+                columns.append(RECIPE_FLAGS.get(name, name))
+        return columns
+
+    def represent(self, rows):
+        """rows - строки values() страницы в порядке вывода"""
+        if self.use_fragments:
+            fragments = self.get_fragments(rows)
+            return [
+                self.add_user_flags(fragments[row['id']], row)
+                for row in rows if row['id'] in fragments
+            ]
+        authors = {}
+        if 'author' in self.fields and 'author' in self.expand:
+            authors = UserReader(self.request).by_id(
+                {row['author_id'] for row in rows}
+            )
+        ingredients = {}
+        if 'ingredients' in self.fields and 'ingredients' in self.expand:
+            ingredients = self.get_ingredients([row['id'] for row in rows])
+        return [
+            self.represent_row(row, authors, ingredients) for row in rows
+        ]
+
+    def represent_row(self, row, authors, ingredients):
+        representation = {}
+        for name in self.fields:
+            if name == 'image':
+                value = file_url(
+                    self.image_storage, row['image'], self.request
+                )
+            elif name == 'author':
+                value = row['author_id']
+                if 'author' in self.expand:
+                    value = {
+                        **authors[value],
+                        'is_subscribed': row['author_subscribed'],
+                    }
+            elif name == 'ingredients':
+                value = (
+                    ingredients.get(row['id'], [])
+                    if 'ingredients' in self.expand
+                    else list(row['ingredient_ids'])
+                )
+            else:
+                value = row[RECIPE_FLAGS.get(name, name)]
+            representation[name] = value
+        return representation
+
+    @staticmethod
+    def get_ingredients(recipe_ids):
+        ingredients = {}
+        for recipe_id, *ingredient in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('pk').values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        ):
+            ingredients.setdefault(recipe_id, []).append(
+                dict(zip(INGREDIENT_FIELDS, ingredient))
+            )
+        return ingredients
+
+    def get_fragments(self, rows):
+        """
+        Полные представления рецептов без флагов пользователя из кэша
+        фрагментов; промахи собираются из базы и кладутся в кэш
+        под теми же ключами, что и в RecipeSerializer.get_fragments
+        """
+        base_url = self.request.build_absolute_uri('/')
+        fragments = {}
+        for row in rows:
+            fragment = recipe_cache.get(
+                (base_url, row['id'], row['updated_at'])
+            )
+            if fragment is not None:
+                fragments[row['id']] = fragment
+        missing = [row['id'] for row in rows if row['id'] not in fragments]
+        if not missing:
+            return fragments
+        reader = RecipeReader(
+            self.request, expand=RecipeSerializer.expandable_fields
+        )
+        missing_rows = [
+            {
+                **row,
+                'author_subscribed': False,
+                **dict.fromkeys(RECIPE_FLAGS.values(), False),
+            }
+            for row in Recipe.objects.filter(id__in=missing).values(
+                'id', 'name', 'text', 'image', 'author_id', 'cooking_time',
+                'updated_at'
+            )
+        ]
+        for row, fragment in zip(missing_rows, reader.represent(missing_rows)):
+            recipe_cache.set(
+                (base_url, row['id'], row['updated_at']), fragment
+            )
+            fragments[row['id']] = fragment
+        return fragments
+
+    @staticmethod
+    def add_user_flags(fragment, row):
+        return {
+            **fragment,
+            'author': {
+                **fragment['author'],
+                'is_subscribed': row['author_subscribed'],
+            },
+            **{
+                name: row[annotation]
+                for name, annotation in RECIPE_FLAGS.items()
+            },
+        }
+
+
+class RecipeCardReader:
+    """
+    Представления рецептов из строк карточек: автор и состав уже лежат
+    в карточке, поэтому дополнительных запросов нет
+    """
+
+    image_storage = Recipe._meta.get_field('image').storage
+
+    def __init__(self, request, fields=None, expand=()):
+        self.request = request
+        self.fields = requested(RECIPE_FIELDS, fields)
+        self.expand = set(expand)
+        self.authors = UserReader(request)
+
+    @property
+    def columns(self):
+        """
+        Поля карточки и аннотации, нужные для вывода страницы,
+        и всегда id, как в RecipeReader
+        """
+        columns = ['id']
+        for name in self.fields:
+            if name == 'author':
+                columns.append('author_id')
+                if 'author' in self.expand:
+                    columns += [
+                        f'author_{field}'
+                        for field in RecipeCard.objects.AUTHOR_FIELDS
+                    ]
+                    columns.append('author_subscribed')
+            elif name == 'ingredients':
+                columns.append(
+                    'ingredients' if 'ingredients' in self.expand
+                    else 'ingredient_ids'
+                )
+            elif name != 'id':
+                columns.append(RECIPE_FLAGS.get(name, name))
+        return columns
+
+    def represent(self, rows):
+        return [self.represent_row(row) for row in rows]
+
+    def represent_row(self, row):
+        representation = {}
+        for name in self.fields:
+            if name == 'image':
+                value = file_url(
+                    self.image_storage, row['image'], self.request
+                )
+            elif name == 'author':
+                value = row['author_id']
+                if 'author' in self.expand:
+                    value = self.authors.represent_row({
+                        **{
+                            field: row[f'author_{field}']
+                            for field in RecipeCard.objects.AUTHOR_FIELDS
+                        },
+                        'id': value,
+                        'subscribed': row['author_subscribed'],
+                    })
+            elif name == 'ingredients':
+                value = (
+                    [
+                        dict(zip(INGREDIENT_FIELDS, ingredient))
+                        for ingredient in row['ingredients']
+                    ]
+                    if 'ingredients' in self.expand
+                    else list(row['ingredient_ids'])
+                )
+            else:
+                value = row[RECIPE_FLAGS.get(name, name)]
+            representation[name] = value
+        return representation
+
+
+class SubscriptionReader:
+    """Представления авторов на странице подписок пользователя"""
+
+    image_storage = Recipe._meta.get_field('image').storage
+
+    def __init__(self, request, fields=None, recipes_limit=None):
+        self.request = request
+        self.fields = requested(SUBSCRIPTION_FIELDS, fields)
+        self.recipes_limit = recipes_limit
+
+    def represent(self, author_ids):
+        subscribed = set()
+        if 'is_subscribed' in self.fields:
+            subscribed = set(Subscription.objects.filter(
+                user=self.request.user, author_id__in=author_ids
+            ).values_list('author_id', flat=True))
+        authors = UserReader(
+            self.request, self.fields, all_fields=SUBSCRIPTION_FIELDS
+        ).by_id(author_ids, subscribed)
+        recipes = (
+            self.get_recipes(author_ids) if 'recipes' in self.fields else {}
+        )
+        counts = (
+            self.get_recipes_counts(author_ids)
+            if 'recipes_count' in self.fields else {}
+        )
+        representations = []
+        for author_id in author_ids:
+            representation = authors[author_id]
+            if 'recipes' in self.fields:
+                representation['recipes'] = recipes.get(author_id, [])
+            if 'recipes_count' in self.fields:
+                representation['recipes_count'] = counts.get(author_id, 0)
+            representations.append(representation)
+        return representations
+
+    def get_recipes_counts(self, author_ids):
+        """Число рецептов авторов страницы одним запросом"""
+        return dict(self.recipes_counts_query(author_ids))
+
+    @staticmethod
+    def recipes_counts_query(author_ids):
+        return Recipe.objects.filter(author_id__in=author_ids).values(
+            'author_id'
+        ).annotate(count=Count('id')).order_by().values_list(
+            'author_id', 'count'
+        )
+
+    def get_recipes(self, author_ids):
+        """
+        Последние рецепты авторов, не больше recipes_limit у каждого.
+        Адрес изображения относительный, как у ShortRecipeSerializer
+        без контекста запроса
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(*self.recipes_query(author_ids))
+            rows = cursor.fetchall()
+        recipes = {}
+        for author_id, *values, _ in rows:
+            recipe = dict(zip(SHORT_RECIPE_FIELDS, values))
+            if 'image' in recipe:
+                recipe['image'] = file_url(self.image_storage, recipe['image'])
+            recipes.setdefault(author_id, []).append(recipe)
+        return recipes
+
+    def recipes_query(self, author_ids):
+        """
+        SQL и параметры выборки рецептов авторов с нумерацией
+        окном по автору
+        """
+        model = RecipeCard if settings.RECIPE_CARDS['READ'] else Recipe
+        queryset = model.objects.filter(author_id__in=author_ids).annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[
+                    F(name[1:]).desc() if name.startswith('-') else F(name)
+                    for name in model._meta.ordering
+                ],
+            )
+        ).order_by().values_list(
+            'author_id',
+            *('pk' if name == 'id' else name for name in SHORT_RECIPE_FIELDS),
+            'position'
+        )
+        sql, params = queryset.query.sql_with_params()
+        sql = f'SELECT * FROM ({sql}) AS ranked'
+        if self.recipes_limit is not None:
+            sql += ' WHERE position <= %s'
+            params = (*params, self.recipes_limit)
+        return f'{sql} ORDER BY 1, position', params
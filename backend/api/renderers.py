@@ -0,0 +1,39 @@
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(BaseRenderer):
+    """JSON-рендерер на orjson вместо стандартного json"""
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    '''Типы, которые orjson не знает (Decimal, ленивые строки и т.п.),
+    приводятся так же, как в стандартном рендерере DRF'''
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data,
+            default=self.default,
+            option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+class ORJSONParser(BaseParser):
+    """JSON-парсер на orjson вместо стандартного json"""
+
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as error:
+            raise ParseError(f'Ошибка разбора JSON - {error}')
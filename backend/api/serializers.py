@@ -1,4 +1,7 @@
+from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.db import transaction
+from django.db.models import Prefetch
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from recipes.models import (
@@ -6,13 +9,57 @@ from recipes.models import (
     Ingredient,
     IngredientInRecipe,
     Recipe,
+    RecipeCard,
     ShoppingCart,
+    ShoppingListItem,
 )
 from rest_framework import serializers
 from users.models import Subscription, User
 
+from .cache import TTLCache
 
-class UserSerializer(DjoserUserSerializer):
+recipe_cache = TTLCache(
+    max_size=settings.RECIPE_CACHE['MAX_SIZE'],
+    timeout=settings.RECIPE_CACHE['TIMEOUT'],
+)
+
+
+class SparseFieldsMixin:
+    """
+    Выборочный вывод полей по параметрам fields и expand из контекста.
+    Действует только на сериалайзер верхнего уровня: при заданном fields
+    остальные поля отбрасываются, а связи не из expand выводятся как id
+    """
+
+    '''Связи, которые можно развернуть через expand'''
+    expandable_fields = ()
+
+    def get_collapsed_fields(self):
+        '''Поля, заменяющие неразвёрнутые связи'''
+        return {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested is None or not self._is_root():
+            return fields
+        expand = self.context.get('expand', ())
+        collapsed = self.get_collapsed_fields()
+        for name in list(fields):
+            if name not in requested:
+                del fields[name]
+            elif name in collapsed and name not in expand:
+                fields[name] = collapsed[name]
+        return fields
+
+    def _is_root(self):
+        return self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer)
+            and self.parent.parent is None
+        )
+
+
+class UserSerializer(SparseFieldsMixin, DjoserUserSerializer):
     """Сериалайзер для получения пользователей с дополнительными полями"""
 
     is_subscribed = serializers.SerializerMethodField()
@@ -24,8 +71,14 @@ class UserSerializer(DjoserUserSerializer):
             'avatar',
             'is_subscribed'
         )
+        '''Пароль входит в поля djoser через REQUIRED_FIELDS,
+        но выводиться не должен'''
+        extra_kwargs = {'password': {'write_only': True}}
 
     def get_is_subscribed(self, user):
+        '''Флаг может быть заранее вычислен в запросе через annotate'''
+        if hasattr(user, 'subscribed'):
+            return user.subscribed
         request_user = self.context['request'].user
         return Subscription.objects.filter(
             author=user.id,
@@ -59,9 +112,28 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Сериалайзер списка рецептов, собирающий вывод из кэша фрагментов:
+    промахи кэша загружаются из базы одним запросом на страницу
+    """
+
+    def to_representation(self, data):
+        if not self.child.context.get('use_fragments'):
+            return super().to_representation(data)
+        recipes = list(data)
+        fragments = self.child.get_fragments(recipes)
+        return [
+            self.child.add_user_flags(fragments[recipe.id], recipe)
+            for recipe in recipes if recipe.id in fragments
+        ]
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериалайзер для работы с рецептами"""
 
+    expandable_fields = ('author', 'ingredients')
+
     author = UserSerializer(read_only=True)
     ingredients = IngredientInRecipeSerializer(
         source='recipe_ingredients', many=True
@@ -83,19 +155,118 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_favorited',
             'is_in_shopping_cart',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def get_collapsed_fields(self):
+        return {
+            'author': serializers.PrimaryKeyRelatedField(read_only=True),
+            'ingredients': serializers.ListField(
+                source='ingredient_ids',
+                child=serializers.IntegerField(),
+                read_only=True
+            ),
+        }
+
+    def to_representation(self, recipe):
+        if self.context.get('use_fragments') and self.parent is None:
+            return self.add_user_flags(
+                self.get_fragments([recipe])[recipe.id], recipe
+            )
+        '''Флаг подписки на автора может быть вычислен в запросе'''
+        if hasattr(recipe, 'author_subscribed'):
+            recipe.author.subscribed = recipe.author_subscribed
+        return super().to_representation(recipe)
+
+    def get_fragments(self, recipes):
+        """
+        Возвращает не зависящие от пользователя представления рецептов.
+        Ключ кэша включает updated_at, поэтому изменённый рецепт
+        сериализуется заново; рецептам нужны только id и updated_at
+        """
+        base_url = self.context['request'].build_absolute_uri('/')
+        fragments = {}
+        for recipe in recipes:
+            fragment = recipe_cache.get(
+                (base_url, recipe.id, recipe.updated_at)
+            )
+            if fragment is not None:
+                fragments[recipe.id] = fragment
+        missing = [
+            recipe.id for recipe in recipes if recipe.id not in fragments
+        ]
+        if not missing:
+            return fragments
+        for recipe in Recipe.objects.filter(id__in=missing).select_related(
+            'author'
+        ).prefetch_related(Prefetch(
+            'recipe_ingredients',
+            queryset=IngredientInRecipe.objects.select_related(
+                'ingredient'
+            ).order_by('pk')
+        )):
+            '''Флаги пользователя подставляются позже в add_user_flags'''
+            recipe.favorited = recipe.in_shopping_cart = False
+            recipe.author.subscribed = False
+            fragment = super().to_representation(recipe)
+            recipe_cache.set(
+                (base_url, recipe.id, recipe.updated_at), fragment
+            )
+            fragments[recipe.id] = fragment
+        return fragments
+
+    @staticmethod
+    def add_user_flags(fragment, recipe):
+        """
+        Дополняет представление рецепта флагами текущего пользователя,
+        вычисленными в запросе через annotate
+        """
+        return {
+            **fragment,
+            'author': {
+                **fragment['author'],
+                'is_subscribed': recipe.author_subscribed
+            },
+            'is_favorited': recipe.favorited,
+            'is_in_shopping_cart': recipe.in_shopping_cart,
+        }
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('recipe_ingredients', [])
+        validated_data['ingredient_ids'] = self._get_ingredient_ids(
+            ingredients_data
+        )
         recipe = super().create(validated_data)
         self._save_ingredients(recipe, ingredients_data)
+        '''Карточка создана сигналом до сохранения состава'''
+        RecipeCard.objects.refresh([recipe.id])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('recipe_ingredients', [])
+        validated_data['ingredient_ids'] = self._get_ingredient_ids(
+            ingredients_data
+        )
+        old_links = ShoppingListItem.objects.recipe_links(instance.id)
         instance.ingredients.clear()
         self._save_ingredients(instance, ingredients_data)
+        ShoppingListItem.objects.change_recipe(
+            instance,
+            old_links,
+            [
+                (ingredient['ingredient']['id'].id, ingredient['amount'])
+                for ingredient in ingredients_data
+            ]
+        )
         return super().update(instance, validated_data)
 
+    @staticmethod
+    def _get_ingredient_ids(ingredients_data):
+        return sorted(
+            ingredient['ingredient']['id'].id
+            for ingredient in ingredients_data
+        )
+
     def _save_ingredients(self, recipe, ingredients_data):
         IngredientInRecipe.objects.bulk_create(
             IngredientInRecipe(
@@ -106,7 +277,10 @@ class RecipeSerializer(serializers.ModelSerializer):
             for ingredient in ingredients_data
         )
 
-    def _check_existence(self, model, recipe):
+    def _check_existence(self, model, recipe, annotation):
+        '''Флаг может быть заранее вычислен в запросе через annotate'''
+        if hasattr(recipe, annotation):
+            return getattr(recipe, annotation)
         request = self.context.get('request')
         return (
             request.user.is_authenticated
@@ -117,10 +291,26 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, recipe):
-        return self._check_existence(Favorite, recipe)
+        return self._check_existence(Favorite, recipe, 'favorited')
 
     def get_is_in_shopping_cart(self, recipe):
-        return self._check_existence(ShoppingCart, recipe)
+        return self._check_existence(
+            ShoppingCart, recipe, 'in_shopping_cart'
+        )
+
+
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Сериалайзер для получения итогов списка покупок"""
+
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount', 'recipes_count')
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
@@ -137,7 +327,7 @@ class SubscribedUserSerializer(UserSerializer):
 
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.ReadOnlyField(
-        source='author.recipes.count'
+        source='recipes.count'
     )
 
     class Meta(UserSerializer.Meta):
@@ -155,3 +345,16 @@ class SubscribedUserSerializer(UserSerializer):
             ))],
             many=True
         ).data
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Сериалайзер для списка id в массовых операциях"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
@@ -0,0 +1,116 @@
+from changelog.models import changes_received
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.deletion import recipes_deleted
+from recipes.models import Ingredient, Recipe, RecipeCard
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .authentication import evict_token, evict_user_tokens, token_cache
+from .catalog import ingredient_catalog
+from .serializers import recipe_cache
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    """Сбрасывает кэш при удалении токена (выход из системы)"""
+    evict_token(instance.key)
+
+
+@receiver(user_logged_out)
+def evict_logged_out_user(sender, user, **kwargs):
+    """Сбрасывает кэш токенов пользователя при выходе из системы"""
+    if user is not None:
+        evict_user_tokens(user.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_changed_user(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш токенов пользователя при любом его изменении:
+    смене пароля, деактивации или удалении
+    """
+    evict_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def evict_author_recipes(sender, instance, update_fields=None, **kwargs):
+    """
+    Сбрасывает кэш рецептов автора при изменении его профиля.
+    Сохранения без полей автора (например, last_login при входе)
+    кэш не трогают
+    """
+    if update_fields is not None and not set(update_fields) & set(
+        RecipeCard.objects.AUTHOR_FIELDS
+    ):
+        return
+    recipe_cache.delete_if(
+        lambda key, fragment: fragment['author']['id'] == instance.pk
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def evict_changed_ingredient(sender, instance, **kwargs):
+    """
+    Сбрасывает справочник продуктов и кэш рецептов
+    с изменённым продуктом
+    """
+    ingredient_catalog.invalidate()
+    recipe_cache.delete_if(
+        lambda key, fragment: any(
+            ingredient['id'] == instance.pk
+            for ingredient in fragment['ingredients']
+        )
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def evict_deleted_recipe(sender, instance, **kwargs):
+    """Удаляет из кэша представления удалённого рецепта"""
+    recipe_cache.delete_if(lambda key, fragment: key[1] == instance.pk)
+
+
+@receiver(recipes_deleted)
+def evict_deleted_recipes(sender, recipe_ids, **kwargs):
+    """Удаляет из кэша представления рецептов, удалённых без сборщика"""
+    recipe_ids = set(recipe_ids)
+    recipe_cache.delete_if(lambda key, fragment: key[1] in recipe_ids)
+
+
+@receiver(changes_received)
+def evict_changed_elsewhere(sender, table, keys, columns=None, **kwargs):
+    """
+    Сбрасывает локальные кэши по журналу изменений, в том числе
+    по изменениям, сделанным другими серверами и запросами в обход ORM.
+    Рецепты автора сбрасываются, только если изменился его профиль
+    в карточке, а не, например, last_login при входе
+    """
+    if table == Token._meta.db_table:
+        token_cache.delete_many(keys)
+        return
+    ids = {int(key) for key in keys}
+    if table == User._meta.db_table:
+        token_cache.delete_if(lambda key, user: user.pk in ids)
+        author_fields = set(RecipeCard.objects.AUTHOR_FIELDS)
+        authors = {
+            int(key) for key in keys
+            if columns is None or columns[key] is None
+            or columns[key] & author_fields
+        }
+        if authors:
+            recipe_cache.delete_if(
+                lambda key, fragment: fragment['author']['id'] in authors
+            )
+    elif table == Recipe._meta.db_table:
+        recipe_cache.delete_if(lambda key, fragment: key[1] in ids)
+    elif table == Ingredient._meta.db_table:
+        ingredient_catalog.invalidate()
+        recipe_cache.delete_if(
+            lambda key, fragment: any(
+                ingredient['id'] in ids
+                for ingredient in fragment['ingredients']
+            )
+        )
@@ -0,0 +1,220 @@
+"""
+Ограничение частоты запросов по алгоритму token bucket.
+
+Корзина каждой пары (область, пользователь или IP) хранится в общем
+для всех воркеров gunicorn хранилище: в сегменте разделяемой памяти
+на одном сервере или в кэше Django (memcached и т.п.) для нескольких
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class CacheBucketStore:
+    """Хранилище корзин в кэше Django с блокировкой через cache.add"""
+
+    LOCK_ATTEMPTS = 20
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def consume(self, key, capacity, rate):
+        lock_key = f'{key}:lock'
+        locked = False
+        for _ in range(self.LOCK_ATTEMPTS):
+            locked = self.cache.add(lock_key, 1, timeout=1)
+            if locked:
+                break
+            time.sleep(0.001)
+        '''Если блокировку взять не удалось, запрос учитывается
+        без неё: лимит может быть слегка превышен, но запрос не ждёт'''
+        try:
+            now = time.time()
+            tokens, updated_at = self.cache.get(key, (capacity, now))
+            allowed, tokens = take_token(
+                tokens, now - updated_at, capacity, rate
+            )
+            self.cache.set(
+                key, (tokens, now), timeout=math.ceil(capacity / rate) + 1
+            )
+            return allowed, tokens
+        finally:
+            if locked:
+                self.cache.delete(lock_key)
+
+
+class SharedMemoryFile:
+    """
+    Таблица слотов SLOT в файле, отображённом в память (/dev/shm),
+    общая для процессов сервера. Доступ процессов разделяется
+    через flock, потоков - через Lock
+    """
+
+    SLOT = None
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.slots = slots
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def _open(self):
+        '''Файл открывается заново в каждом процессе: после fork
+        общий дескриптор не разделял бы процессы через flock'''
+        if self.pid == os.getpid():
+            return
+        size = self.SLOT.size * self.slots
+        self.file = open(self.path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.memory = mmap.mmap(self.file.fileno(), size)
+        self.pid = os.getpid()
+
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            self._open()
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def key_hash(key):
+        '''0 обозначает пустой слот'''
+        return int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little'
+        ) or 1
+
+
+class SharedMemoryBucketStore(SharedMemoryFile):
+    """
+    Хранилище корзин в разделяемой памяти. Слот - хэш ключа,
+    число жетонов и время обновления; слот ищется линейным
+    пробированием, при переполнении вытесняется самый старый
+    """
+
+    SLOT = struct.Struct('<Qdd')
+    PROBES = 8
+
+    def _find_slot(self, key_hash, now, capacity):
+        start = key_hash % self.slots
+        oldest, oldest_updated_at = start, math.inf
+        for probe in range(self.PROBES):
+            index = (start + probe) % self.slots
+            slot_hash, tokens, updated_at = self.SLOT.unpack_from(
+                self.memory, index * self.SLOT.size
+            )
+            if slot_hash == key_hash:
+                return index, tokens, updated_at
+            if slot_hash == 0:
+                return index, capacity, now
+            if updated_at < oldest_updated_at:
+                oldest, oldest_updated_at = index, updated_at
+        return oldest, capacity, now
+
+    def consume(self, key, capacity, rate):
+        key_hash = self.key_hash(key)
+        with self.locked():
+            now = time.time()
+            index, tokens, updated_at = self._find_slot(
+                key_hash, now, capacity
+            )
+            allowed, tokens = take_token(
+                tokens, now - updated_at, capacity, rate
+            )
+            self.SLOT.pack_into(
+                self.memory, index * self.SLOT.size, key_hash, tokens, now
+            )
+            return allowed, tokens
+
+
+def take_token(tokens, elapsed, capacity, rate):
+    """
+    Пополняет корзину за прошедшее время и забирает из неё жетон.
+    Возвращает признак разрешения запроса и остаток жетонов
+    """
+    tokens = min(capacity, tokens + max(elapsed, 0) * rate)
+    if tokens >= 1:
+        return True, tokens - 1
+    return False, tokens
+
+
+_store = None
+
+
+def get_store():
+    """Хранилище корзин, выбранное в настройке THROTTLE_STORE"""
+    global _store
+    if _store is None:
+        store_settings = settings.THROTTLE_STORE
+        if store_settings['BACKEND'] == 'shared_memory' and fcntl:
+            _store = SharedMemoryBucketStore(
+                store_settings['PATH'], store_settings['SLOTS']
+            )
+        else:
+            _store = CacheBucketStore(store_settings['CACHE_ALIAS'])
+    return _store
+
+
+class ScopedTokenBucketThrottle(SimpleRateThrottle):
+    """
+    Ограничение частоты запросов к отдельным эндпоинтам.
+    Область берётся из словаря throttle_scopes вьюсета по имени action
+    или из атрибута throttle_scope; запросы без области не ограничиваются.
+    Авторизованные пользователи учитываются по id, остальные - по IP
+    """
+
+    cache_format = 'throttle_%(scope)s_%(ident)s'
+
+    def __init__(self):
+        '''Область и лимит определяются по view в allow_request'''
+
+    def get_scope(self, view):
+        return getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None),
+            getattr(view, 'throttle_scope', None)
+        )
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user{request.user.pk}'
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(view)
+        if self.scope not in self.THROTTLE_RATES:
+            return True
+        capacity, duration = self.parse_rate(self.THROTTLE_RATES[self.scope])
+        rate = capacity / duration
+        allowed, tokens = get_store().consume(
+            self.get_cache_key(request, view), capacity, rate
+        )
+        self.wait_time = None if allowed else (1 - tokens) / rate
+        '''Данные для заголовков RateLimit-* (RateLimitHeadersMiddleware)'''
+        request._request.rate_limit = (
+            capacity,
+            math.floor(tokens),
+            math.ceil((capacity - tokens) / rate)
+        )
+        return allowed
+
+    def wait(self):
+        return self.wait_time
@@ -0,0 +1,211 @@
+"""
+Ограничение времени запросов к базе по маршрутам API.
+
+Представление маршрута из STATEMENT_TIMEOUTS выполняется в транзакции
+с SET LOCAL statement_timeout, поэтому один медленный запрос не держит
+соединение и воркер дольше заданного. Если время вышло, анонимное
+чтение маршрутов STALE_ROUTES получает последний удачный ответ того же
+адреса с заголовками Warning и Age, остальные запросы - 503
+с Retry-After. Ответы хранятся только для анонимных запросов: с ключом
+по пользователю кэш рос бы с каждым пользователем и страницей.
+Срабатывания считаются по маршрутам в хранилище, общем для воркеров
+сервера (команда statement_timeout_stats)
+"""
+import hashlib
+import struct
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.http import HttpResponse
+from django.urls import get_resolver
+
+from .throttling import SharedMemoryFile, fcntl
+
+QUERY_CANCELED = '57014'
+OUTCOMES = ('timeouts', 'stale', 'unavailable')
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def statement_timeout(route):
+    """Ограничение маршрута в миллисекундах, 0 - без ограничения"""
+    options = settings.STATEMENT_TIMEOUTS
+    return options['ROUTES'].get(route, options['DEFAULT'])
+
+
+def set_statement_timeout(milliseconds):
+    '''Действует до конца текущей транзакции'''
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT set_config(%s, %s, true)',
+            ['statement_timeout', f'{int(milliseconds)}ms']
+        )
+
+
+def is_statement_timeout(error):
+    return getattr(error.__cause__, 'pgcode', None) == QUERY_CANCELED
+
+
+def _cache():
+    return caches[settings.STATEMENT_TIMEOUTS['STALE_CACHE_ALIAS']]
+
+
+class SharedMemoryCounterStore(SharedMemoryFile):
+    """
+    Счётчики в разделяемой памяти, общие для воркеров gunicorn
+    и команд управления на одном сервере. Слот - хэш ключа и значение,
+    слот ищется линейным пробированием; в заполненной таблице новые
+    ключи не считаются
+    """
+
+    SLOT = struct.Struct('<Qq')
+
+    def _find_slot(self, key_hash):
+        start = key_hash % self.slots
+        for probe in range(self.slots):
+            index = (start + probe) % self.slots
+            slot_hash, value = self.SLOT.unpack_from(
+                self.memory, index * self.SLOT.size
+            )
+            if slot_hash in (key_hash, 0):
+                return index, slot_hash, value
+        return None, 0, 0
+
+    def incr(self, key):
+        key_hash = self.key_hash(key)
+        with self.locked():
+            index, _, value = self._find_slot(key_hash)
+            if index is not None:
+                self.SLOT.pack_into(
+                    self.memory, index * self.SLOT.size, key_hash, value + 1
+                )
+
+    def get_many(self, keys):
+        counters = {}
+        with self.locked():
+            for key in keys:
+                _, slot_hash, value = self._find_slot(self.key_hash(key))
+                if slot_hash:
+                    counters[key] = value
+        return counters
+
+
+class CacheCounterStore:
+    """Счётчики в кэше Django: общие, если общий и сам кэш"""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def incr(self, key):
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            '''Ключ вытеснен между add и incr'''
+            self.cache.set(key, 1, timeout=None)
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+
+_stats_store = None
+
+
+def get_stats_store():
+    """Хранилище счётчиков, выбранное в STATEMENT_TIMEOUTS['STATS_STORE']"""
+    global _stats_store
+    if _stats_store is None:
+        options = settings.STATEMENT_TIMEOUTS
+        if options['STATS_STORE'] == 'shared_memory' and fcntl:
+            _stats_store = SharedMemoryCounterStore(
+                options['STATS_PATH'], options['STATS_SLOTS']
+            )
+        else:
+            _stats_store = CacheCounterStore(options['STATS_CACHE_ALIAS'])
+    return _stats_store
+
+
+def _is_cached(request, route):
+    """Ответ хранится для анонимного чтения маршрутов STALE_ROUTES"""
+    return (
+        request.method in SAFE_METHODS
+        and route in settings.STATEMENT_TIMEOUTS['STALE_ROUTES']
+        and 'HTTP_AUTHORIZATION' not in request.META
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def _response_key(request, route):
+    '''Ответ зависит от адреса и формата вывода'''
+    identity = '\0'.join((
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ))
+    return (
+        f'stale-response:{route}:'
+        f'{hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()}'
+    )
+
+
+def store_response(request, route, response):
+    """Сохраняет удачный ответ на чтение для выдачи при таймауте"""
+    options = settings.STATEMENT_TIMEOUTS
+    if (
+        not _is_cached(request, route)
+        or response.status_code != 200
+        or response.streaming
+        or len(response.content) > options['STALE_MAX_SIZE']
+    ):
+        return
+    _cache().set(
+        _response_key(request, route),
+        (response.content, list(response.items()), time.time()),
+        timeout=options['STALE_TIMEOUT'],
+    )
+
+
+def stale_response(request, route):
+    """Последний удачный ответ с пометкой устаревшего, иначе None"""
+    if not _is_cached(request, route):
+        return None
+    stored = _cache().get(_response_key(request, route))
+    if stored is None:
+        return None
+    content, headers, stored_at = stored
+    response = HttpResponse(content)
+    for name, value in headers:
+        response[name] = value
+    response['Age'] = int(time.time() - stored_at)
+    response['Warning'] = '110 - "Response is Stale"'
+    return response
+
+
+def record(route, outcome):
+    """Увеличивает счётчик исхода таймаута маршрута"""
+    get_stats_store().incr(f'statement-timeouts:{route}:{outcome}')
+
+
+def stats():
+    """Счётчики по маршрутам, у которых были таймауты"""
+    routes = sorted(
+        name for name in get_resolver().reverse_dict
+        if isinstance(name, str)
+    )
+    counters = get_stats_store().get_many([
+        f'statement-timeouts:{route}:{outcome}'
+        for route in routes for outcome in OUTCOMES
+    ])
+    return {
+        route: {
+            outcome: counters.get(f'statement-timeouts:{route}:{outcome}', 0)
+            for outcome in OUTCOMES
+        }
+        for route in routes
+        if any(
+            f'statement-timeouts:{route}:{outcome}' in counters
+            for outcome in OUTCOMES
+        )
+    }
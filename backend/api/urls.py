@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     UserViewSet,
     IngredientViewSet,
+    ReadinessView,
     RecipeViewSet,
+    TokenCreateView,
 )
 
 
@@ -15,6 +18,8 @@ router.register(r'recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('health/ready/', ReadinessView.as_view(), name='readiness'),
+    path('auth/token/login/', TokenCreateView.as_view(), name='login'),
     path('auth/', include('djoser.urls.authtoken')),
     path(
         's/<int:pk>/',
@@ -22,3 +27,15 @@ urlpatterns = [
         name='recipe-short-link'
     )
 ]
+
+if settings.USE_JWT:
+    from .jwt_views import UserTokenObtainPairView
+
+    urlpatterns += [
+        path(
+            'auth/jwt/create/',
+            UserTokenObtainPairView.as_view(),
+            name='jwt-create'
+        ),
+        path('auth/', include('djoser.urls.jwt')),
+    ]
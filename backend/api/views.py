@@ -1,42 +1,223 @@
-from django.http import FileResponse
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (
+    BooleanField,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Value,
+)
+from django.db.models.expressions import RawSQL
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils import timezone
+from djoser.views import TokenCreateView as DjoserTokenCreateView
+from djoser.utils import logout_user
 from djoser.views import UserViewSet as DjoserUserViewSet
+from recipes.corpus import export_corpus
+from recipes.deletion import delete_recipes
 from recipes.models import (
     Favorite,
     Ingredient,
+    IngredientInRecipe,
     Recipe,
+    RecipeCard,
     ShoppingCart,
 )
+from recipes.tasks import schedule_user_deletion
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import (
+    SAFE_METHODS,
+    AllowAny,
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 from users.models import Subscription, User
+from users.tasks import enqueue_build_author_recommendations
 
+from .catalog import ingredient_catalog
 from .pagination import PagesPagination
+from .readers import (
+    RecipeCardReader,
+    RecipeReader,
+    SubscriptionReader,
+    UserReader,
+)
+from .warmup import is_ready
 from .serializers import (
+    BulkIdsSerializer,
     IngredientSerializer,
     RecipeSerializer,
+    ShoppingListItemSerializer,
     ShortRecipeSerializer,
     SubscribedUserSerializer,
-    UserSerializer
+    UserSerializer,
 )
 
 
-class UserViewSet(DjoserUserViewSet):
+def user_flag(request, model, **lookups):
+    """
+    Подзапрос, проверяющий наличие связи текущего пользователя
+    с объектом, для вычисления флагов одним запросом со списком
+    """
+    if not request.user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(model.objects.filter(user=request.user, **lookups))
+
+
+def bulk_change_relations(request, model, target_model, skipped=None):
+    """
+    Массово создаёт (POST) или удаляет (DELETE) связи текущего
+    пользователя с объектами и возвращает результат по каждому id
+    """
+
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    skipped = skipped or {}
+    ids = [
+        target_id for target_id in serializer.validated_data['ids']
+        if target_id not in skipped
+    ]
+
+    with transaction.atomic():
+        if request.method == 'POST':
+            changed = model.objects.add_many(request.user.id, ids)
+            changed_status = 'added'
+            rest = [
+                target_id for target_id in ids if target_id not in changed
+            ]
+            existing = set(
+                target_model.objects.filter(id__in=rest)
+                .values_list('id', flat=True)
+            ) if rest else set()
+        else:
+            changed = model.objects.remove_many(request.user.id, ids)
+            changed_status = 'removed'
+            existing = set()
+
+    def get_status(target_id):
+        if target_id in skipped:
+            return skipped[target_id]
+        if target_id in changed:
+            return changed_status
+        if target_id in existing:
+            return 'exists'
+        return 'not_found'
+
+    return Response(
+        {
+            'results': [
+                {'id': target_id, 'status': get_status(target_id)}
+                for target_id in serializer.validated_data['ids']
+            ]
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+class SparseFieldsViewMixin:
+    """
+    Разбор параметров fields и expand для выборочного вывода полей.
+    Без fields выводятся все поля со всеми развёрнутыми связями
+    """
+
+    def get_sparse_fields(self, serializer_class=None):
+        """Метод для получения запрошенных полей и развёрнутых связей"""
+        serializer_class = serializer_class or self.get_serializer_class()
+        expandable_fields = getattr(serializer_class, 'expandable_fields', ())
+        if self.request.method not in SAFE_METHODS:
+            return None, set(expandable_fields)
+        fields = self._get_names_param('fields', serializer_class.Meta.fields)
+        expand = self._get_names_param('expand', expandable_fields)
+        if fields is None:
+            return None, set(expandable_fields)
+        return {*fields, *expand}, expand
+
+    def _get_names_param(self, name, allowed):
+        """Метод для разбора списка имён полей вида a,b,c"""
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None if name == 'fields' else set()
+        names = {field for field in value.split(',') if field}
+        unknown = names - set(allowed)
+        if unknown:
+            raise ValidationError(
+                {name: f'Неизвестные поля: {", ".join(sorted(unknown))}'}
+            )
+        return names
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_sparse_fields()
+        return context
+
+
+class UserViewSet(SparseFieldsViewMixin, DjoserUserViewSet):
     """ViewSet, описывающий работу с пользователями и подписками"""
 
     queryset = User.objects.all()
+    lookup_value_regex = r'\d+'
     serializer_class = UserSerializer
     pagination_class = PagesPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
+    throttle_scopes = {
+        'create': 'auth',
+        'change_avatar': 'uploads',
+        'bulk_subscribe_and_unsubscribe': 'bulk',
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = self._select_requested(queryset)
+        return queryset
+
+    def _select_requested(self, queryset):
+        """
+        Метод для выборки из базы только запрошенных полей пользователя.
+        Флаг подписки вычисляется подзапросом в том же запросе
+        """
+        fields, _ = self.get_sparse_fields()
+        if fields is not None:
+            queryset = queryset.only(
+                *(field for field in fields if field != 'is_subscribed')
+            )
+        if fields is None or 'is_subscribed' in fields:
+            queryset = queryset.annotate(subscribed=user_flag(
+                self.request, Subscription, author=OuterRef('pk')
+            ))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """Метод для вывода пользователей, без сериалайзера при FAST_READ"""
+        if not settings.FAST_READ:
+            return super().list(request, *args, **kwargs)
+        reader = UserReader(request, self.get_sparse_fields()[0])
+        queryset = self.filter_queryset(
+            self.get_queryset()
+        ).values(*reader.columns)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(reader.represent(queryset))
+        return self.get_paginated_response(reader.represent(page))
+
+    def perform_destroy(self, instance):
+        """
+        Метод для удаления пользователя: вход закрывается сразу,
+        данные удаляются фоновой задачей
+        """
+        if instance == self.request.user:
+            logout_user(self.request)
+        schedule_user_deletion(instance)
 
     @action(
         detail=False,
@@ -77,39 +258,80 @@ class UserViewSet(DjoserUserViewSet):
         url_path='subscribe'
     )
     def subscribe_and_unsubscribe(self, request, id=None):
-        """Метод для создания и удаления подписки на авторов"""
+        """
+        Метод для создания и удаления подписки на авторов.
+        Подписка создаётся и удаляется одним запросом к базе данных,
+        поэтому одновременные запросы не приводят к ошибкам
+        """
 
-        author = get_object_or_404(User, pk=id)
-        if author == request.user:
+        author_id = int(id)
+        if author_id == request.user.id:
             raise ValidationError(
                 {'error': 'Нельзя подписаться на самого себя'}
             )
 
         if request.method == 'POST':
-            subscription, created = Subscription.objects.get_or_create(
-                user=request.user,
-                author=author
-            )
-
-            if not created:
+            if not Subscription.objects.add_many(
+                request.user.id, [author_id]
+            ):
+                get_object_or_404(User, pk=author_id)
                 raise ValidationError({'errors': 'Подписка уже была оформлена'})
+            enqueue_build_author_recommendations()
 
             return Response(
                 {
-                    "user": subscription.user.username,
-                    "author": subscription.author.username
+                    "user": request.user.username,
+                    "author": User.objects.values_list(
+                        'username', flat=True
+                    ).get(pk=author_id)
                 },
                 status=status.HTTP_201_CREATED
             )
 
-        get_object_or_404(
-            Subscription,
-            user=request.user,
-            author=author
-        ).delete()
+        if not Subscription.objects.remove_many(
+            request.user.id, [author_id]
+        ):
+            get_object_or_404(User, pk=author_id)
+            raise ValidationError({'errors': 'Подписка не была оформлена'})
+        enqueue_build_author_recommendations()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='subscribe',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_subscribe_and_unsubscribe(self, request):
+        """Метод для массовой подписки и отписки от авторов"""
+        response = bulk_change_relations(
+            request,
+            Subscription,
+            User,
+            skipped={request.user.id: 'self'}
+        )
+        enqueue_build_author_recommendations()
+        return response
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='recommendations',
+        permission_classes=[IsAuthenticated]
+    )
+    def recommendations(self, request):
+        """
+        Метод для получения рекомендованных авторов,
+        заранее рассчитанных командой build_author_recommendations
+        """
+        return Response(self.get_serializer(
+            self._select_requested(User.objects.filter(
+                recommended_to__user=request.user
+            )).order_by('-recommended_to__score'),
+            many=True
+        ).data)
+
     @action(detail=False, methods=['get'], url_path='subscriptions')
     def subscriptions(self, request):
         """
@@ -121,11 +343,28 @@ class UserViewSet(DjoserUserViewSet):
         subscriptions = (
             user.users.all()
             .select_related('author')
+            .order_by('pk')
         )
 
         # Пагинация
         paginator = PageNumberPagination()
         paginator.page_size = request.query_params.get('limit', 6)
+        fields, expand = self.get_sparse_fields(SubscribedUserSerializer)
+
+        recipes_limit = request.GET.get('recipes_limit')
+        if settings.FAST_READ and (
+            recipes_limit is None or recipes_limit.isdigit()
+        ):
+            author_ids = paginator.paginate_queryset(
+                subscriptions.values_list('author_id', flat=True),
+                request
+            )
+            return paginator.get_paginated_response(SubscriptionReader(
+                request,
+                fields,
+                recipes_limit and int(recipes_limit)
+            ).represent(author_ids))
+
         paginated_subscriptions = paginator.paginate_queryset(
             subscriptions,
             request
@@ -138,7 +377,7 @@ class UserViewSet(DjoserUserViewSet):
         serializer = SubscribedUserSerializer(
             authors,
             many=True,
-            context={'request': request}
+            context={'request': request, 'fields': fields, 'expand': expand}
         )
         return paginator.get_paginated_response(serializer.data)
 
@@ -157,19 +396,39 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
             return self.queryset.filter(name__istartswith=name.lower())
         return self.queryset
 
+    def list(self, request, *args, **kwargs):
+        """Метод для поиска ингредиентов по справочнику в памяти"""
+        return Response(
+            ingredient_catalog.search(request.query_params.get('name', ''))
+        )
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """ViewSet, описывающий работу с рецептами"""
 
     queryset = Recipe.objects.all()
+    lookup_value_regex = r'\d+'
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = PagesPagination
+    throttle_scopes = {
+        'create': 'uploads',
+        'update': 'uploads',
+        'partial_update': 'uploads',
+        'bulk_change_favorited_recipes': 'bulk',
+        'bulk_change_shopping_cart': 'bulk',
+        'clear_shopping_cart': 'bulk',
+        'move_favorites_to_shopping_cart': 'bulk',
+        'download_shopping_cart': 'reports',
+        'export': 'reports',
+    }
 
     def get_queryset(self):
         """Метод для получения рецептов"""
 
         queryset = super().get_queryset()
+        if self._use_cards():
+            queryset = RecipeCard.objects.annotate(id=F('pk'))
         author_id = self.request.query_params.get('author')
         is_favorited = self.request.query_params.get('is_favorited')
         is_in_shopping_cart = self.request.query_params.get(
@@ -178,52 +437,294 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if author_id:
             queryset = queryset.filter(author__id=author_id)
         if is_favorited == '1' and self.request.user.is_authenticated:
-            queryset = queryset.filter(favorites__user=self.request.user)
+            queryset = self._filter_by_user_list(queryset, Favorite)
         if is_in_shopping_cart == '1' and self.request.user.is_authenticated:
-            queryset = queryset.filter(
-                shoppingcarts__user=self.request.user
+            queryset = self._filter_by_user_list(queryset, ShoppingCart)
+
+        ingredients = self._get_ids_param('ingredients')
+        if ingredients:
+            queryset = queryset.filter(ingredient_ids__contains=ingredients)
+        available_ingredients = self._get_ids_param('available_ingredients')
+        if available_ingredients:
+            queryset = self._filter_by_available_ingredients(
+                queryset, available_ingredients
             )
+        if self.action in ('list', 'retrieve'):
+            queryset = self._select_requested(queryset)
         return queryset
 
+    def _filter_by_user_list(self, queryset, model):
+        """
+        Метод для отбора рецептов из избранного или корзины пользователя.
+        У карточек нет обратной связи со списками, поэтому отбор идёт
+        подзапросом по id рецептов
+        """
+        if queryset.model is RecipeCard:
+            return queryset.filter(pk__in=model.objects.filter(
+                user=self.request.user
+            ).values('recipe_id'))
+        return queryset.filter(**{
+            f'{model._meta.model_name}s__user': self.request.user
+        })
+
+    def _use_cards(self):
+        """
+        Метод для проверки, читается ли список рецептов из карточек
+        RecipeCard: одна таблица без соединений и prefetch
+        """
+        return (
+            settings.FAST_READ
+            and settings.RECIPE_CARDS['READ']
+            and self.action == 'list'
+        )
+
+    def _select_requested(self, queryset):
+        """
+        Метод для выборки из базы только запрошенных полей рецепта.
+        Полный вывод собирается из кэша фрагментов, если он включён.
+        Неразвёрнутые связи читаются как id без join и prefetch,
+        флаги вычисляются подзапросами в том же запросе
+        """
+        if self._use_cards():
+            return self._annotate_card_flags(queryset)
+        if self._use_fragments():
+            return queryset.only('id', 'updated_at', 'author').annotate(
+                favorited=user_flag(
+                    self.request, Favorite, recipe=OuterRef('pk')
+                ),
+                in_shopping_cart=user_flag(
+                    self.request, ShoppingCart, recipe=OuterRef('pk')
+                ),
+                author_subscribed=user_flag(
+                    self.request, Subscription, author=OuterRef('author')
+                ),
+            )
+        fields, expand = self.get_sparse_fields()
+
+        def is_requested(field):
+            return fields is None or field in fields
+
+        columns = [
+            field for field in ('id', 'name', 'text', 'image', 'cooking_time')
+            if is_requested(field)
+        ]
+        if is_requested('author'):
+            columns.append('author')
+            if 'author' in expand:
+                queryset = queryset.select_related('author').annotate(
+                    author_subscribed=user_flag(
+                        self.request, Subscription, author=OuterRef('author')
+                    )
+                )
+        if is_requested('ingredients'):
+            if 'ingredients' in expand:
+                queryset = queryset.prefetch_related(Prefetch(
+                    'recipe_ingredients',
+                    queryset=IngredientInRecipe.objects.select_related(
+                        'ingredient'
+                    ).order_by('pk')
+                ))
+            else:
+                columns.append('ingredient_ids')
+        if is_requested('is_favorited'):
+            queryset = queryset.annotate(favorited=user_flag(
+                self.request, Favorite, recipe=OuterRef('pk')
+            ))
+        if is_requested('is_in_shopping_cart'):
+            queryset = queryset.annotate(in_shopping_cart=user_flag(
+                self.request, ShoppingCart, recipe=OuterRef('pk')
+            ))
+        return queryset.only(*columns)
+
+    def _annotate_card_flags(self, queryset):
+        """Метод для вычисления запрошенных флагов пользователя к карточкам"""
+        fields, expand = self.get_sparse_fields()
+        for annotation, field, model in (
+            ('favorited', 'is_favorited', Favorite),
+            ('in_shopping_cart', 'is_in_shopping_cart', ShoppingCart),
+        ):
+            if fields is None or field in fields:
+                queryset = queryset.annotate(**{annotation: user_flag(
+                    self.request, model, recipe=OuterRef('pk')
+                )})
+        if (fields is None or 'author' in fields) and 'author' in expand:
+            queryset = queryset.annotate(author_subscribed=user_flag(
+                self.request, Subscription, author=OuterRef('author')
+            ))
+        return queryset
+
+    def _use_fragments(self):
+        """
+        Метод для проверки, можно ли собрать полный вывод рецептов
+        из кэша фрагментов: тогда из базы читаются только id, updated_at
+        и флаги текущего пользователя
+        """
+        return (
+            settings.RECIPE_CACHE['MAX_SIZE'] > 0
+            and not self._use_cards()
+            and self.action in ('list', 'retrieve')
+            and self.get_sparse_fields()[0] is None
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['use_fragments'] = self._use_fragments()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        """
+        Метод для вывода рецептов. С параметром ids=1,2,3 выводит
+        рецепты с этими id одной страницей в порядке запроса
+        """
+        ids = self._get_ids_param('ids', keep_order=True)
+        if settings.FAST_READ:
+            return self._fast_list(ids)
+        if not ids:
+            return super().list(request, *args, **kwargs)
+        recipes = {
+            recipe.pk: recipe
+            for recipe in self.filter_queryset(
+                self.get_queryset()
+            ).filter(pk__in=ids).order_by()
+        }
+        serializer = self.get_serializer(
+            [recipes[id] for id in ids if id in recipes], many=True
+        )
+        return Response({
+            'count': len(serializer.data),
+            'next': None,
+            'previous': None,
+            'results': serializer.data,
+        })
+
+    def _fast_list(self, ids):
+        """
+        Метод для вывода рецептов без сериалайзера: строки читаются
+        через values() и собираются в словари (api.readers)
+        """
+        reader = RecipeCardReader(
+            self.request, *self.get_sparse_fields()
+        ) if self._use_cards() else RecipeReader(
+            self.request,
+            *self.get_sparse_fields(),
+            use_fragments=self._use_fragments()
+        )
+        queryset = self.filter_queryset(
+            self.get_queryset()
+        ).prefetch_related(None).values(*reader.columns)
+        if ids:
+            rows = {row['id']: row for row in queryset.filter(pk__in=ids)}
+            results = reader.represent([rows[id] for id in ids if id in rows])
+            return Response({
+                'count': len(results),
+                'next': None,
+                'previous': None,
+                'results': results,
+            })
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(reader.represent(list(queryset)))
+        return self.get_paginated_response(reader.represent(page))
+
+    def _get_ids_param(self, name, keep_order=False):
+        """
+        Метод для разбора списка id вида 1,2,3 из параметра запроса.
+        Повторы отбрасываются, порядок сохраняется при keep_order
+        """
+        value = self.request.query_params.get(name)
+        if not value:
+            return []
+        try:
+            ids = [int(id) for id in value.split(',')]
+        except ValueError:
+            raise ValidationError({name: 'Ожидается список id через запятую'})
+        ids = list(dict.fromkeys(ids)) if keep_order else sorted(set(ids))
+        if len(ids) > settings.BULK_MAX_IDS:
+            raise ValidationError(
+                {name: f'Не более {settings.BULK_MAX_IDS} id'}
+            )
+        return ids
+
+    def _filter_by_available_ingredients(self, queryset, ingredients):
+        """
+        Метод для поиска рецептов, которые можно приготовить из продуктов
+        в наличии, докупив не более max_missing продуктов.
+        При max_missing=0 отбор идёт по GIN-индексу ingredient_ids
+        (вхождение состава в набор), иначе по числу недостающих
+        продуктов: рецепт без общих продуктов тоже подходит, если
+        в нём не больше max_missing продуктов. Рецепты без состава
+        не выводятся
+        """
+        try:
+            max_missing = int(
+                self.request.query_params.get('max_missing', 0)
+            )
+        except ValueError:
+            raise ValidationError({'max_missing': 'Ожидается целое число'})
+        queryset = queryset.exclude(ingredient_ids=[])
+        if max_missing <= 0:
+            return queryset.filter(ingredient_ids__contained_by=ingredients)
+        column = (
+            f'{connection.ops.quote_name(queryset.model._meta.db_table)}.'
+            f'{connection.ops.quote_name("ingredient_ids")}'
+        )
+        return queryset.annotate(
+            missing_ingredients=RawSQL(
+                f'cardinality({column}) - (SELECT count(*) '
+                f'FROM unnest({column}) AS ingredient_id '
+                'WHERE ingredient_id = ANY(%s))',
+                (ingredients,),
+                output_field=IntegerField()
+            )
+        ).filter(
+            missing_ingredients__lte=max_missing
+        ).order_by('missing_ingredients', *Recipe._meta.ordering)
+
     def perform_create(self, serializer):
         """Метод для автоматического указания автора рецепта"""
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        """
+        Метод для удаления рецепта без чтения связанных строк:
+        их удаляет база, файл изображения удаляется после коммита
+        """
+        delete_recipes([instance.pk])
+
     @staticmethod
-    def _toggle_favorite_or_shopping_cart(request, recipe, model):
+    @transaction.atomic
+    def _toggle_favorite_or_shopping_cart(request, recipe_id, model):
         """
         Метод для создания и удаления рецептов
-        в списке избранных или в корзине покупок
+        в списке избранных или в корзине покупок.
+        Запись создаётся и удаляется одним запросом к базе данных,
+        поэтому одновременные запросы не приводят к ошибкам
         """
+        recipe_id = int(recipe_id)
         if request.method == 'POST':
-            obj, created = model.objects.get_or_create(
-                user=request.user,
-                recipe=recipe
-            )
-            if not created:
+            if not model.objects.add_many(request.user.id, [recipe_id]):
+                get_object_or_404(Recipe, pk=recipe_id)
                 raise ValidationError({'errors': 'Рецепт уже добавлен'})
 
             return Response(
-                ShortRecipeSerializer(recipe).data,
+                ShortRecipeSerializer(
+                    Recipe.objects.only(
+                        *ShortRecipeSerializer.Meta.fields
+                    ).get(pk=recipe_id)
+                ).data,
                 status=status.HTTP_201_CREATED
             )
 
-        get_object_or_404(
-            model,
-            user=request.user,
-            recipe=recipe
-        ).delete()
+        if not model.objects.remove_many(request.user.id, [recipe_id]):
+            get_object_or_404(Recipe, pk=recipe_id)
+            raise ValidationError({'errors': 'Рецепт не был добавлен'})
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'], url_path='favorite')
     def change_favorited_recipes(self, request, pk=None):
         """Метод для добавления или удаления рецепта из избранного"""
-        return self._toggle_favorite_or_shopping_cart(
-            request,
-            get_object_or_404(Recipe, pk=pk),
-            Favorite
-        )
+        return self._toggle_favorite_or_shopping_cart(request, pk, Favorite)
 
     @action(
         detail=True,
@@ -233,11 +734,56 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def change_shopping_cart(self, request, pk=None):
         """Метод для добавления или удаления рецепта из списка покупок"""
         return self._toggle_favorite_or_shopping_cart(
-            request,
-            get_object_or_404(Recipe, pk=pk),
-            ShoppingCart
+            request, pk, ShoppingCart
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_change_favorited_recipes(self, request):
+        """Метод для массового добавления и удаления рецептов в избранном"""
+        return bulk_change_relations(request, Favorite, Recipe)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_change_shopping_cart(self, request):
+        """Метод для массового добавления и удаления рецептов в корзине"""
+        return bulk_change_relations(request, ShoppingCart, Recipe)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='shopping_cart/clear',
+        permission_classes=[IsAuthenticated]
+    )
+    @transaction.atomic
+    def clear_shopping_cart(self, request):
+        """Метод для очистки корзины покупок"""
+        removed = ShoppingCart.objects.remove_many(request.user.id)
+        return Response(
+            {'removed': sorted(removed)},
+            status=status.HTTP_200_OK
+        )
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='shopping_cart/from_favorites',
+        permission_classes=[IsAuthenticated]
+    )
+    @transaction.atomic
+    def move_favorites_to_shopping_cart(self, request):
+        """Метод для добавления всех избранных рецептов в корзину покупок"""
+        added = ShoppingCart.objects.copy_from(request.user.id, Favorite)
+        return Response({'added': sorted(added)}, status=status.HTTP_200_OK)
+
     @action(
         detail=False,
         methods=['get'],
@@ -246,19 +792,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def download_shopping_cart(self, request):
         """Метод для загрузки текстового отчета со списком покупок"""
 
-        ingredient_totals = {}
-        recipe_names = set()
-
-        for item in (request.user.shoppingcarts.all()
-                .select_related('recipe')):
-            recipe_names.add(item.recipe.name)
-            for ingredient_in_recipe in item.recipe.recipe_ingredients.all():
-                key = (
-                    ingredient_in_recipe.ingredient.name,
-                    ingredient_in_recipe.ingredient.measurement_unit
-                )
-                ingredient_totals[key] = (ingredient_totals.get(key, 0)
-                                          + ingredient_in_recipe.amount)
+        ingredient_totals = {
+            (item.ingredient.name, item.ingredient.measurement_unit):
+                item.amount
+            for item in (request.user.shopping_list_items.all()
+                         .select_related('ingredient'))
+        }
+        recipe_names = set(
+            request.user.shoppingcarts.values_list('recipe__name', flat=True)
+        )
 
         today = timezone.now().strftime('%d.%m.%Y')
         report_lines = [
@@ -287,6 +829,52 @@ class RecipeViewSet(viewsets.ModelViewSet):
             filename='shopping_cart.txt'
         )
 
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='shopping_list',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_list(self, request):
+        """Метод для получения актуального списка покупок в JSON"""
+        return Response(ShoppingListItemSerializer(
+            request.user.shopping_list_items.all()
+            .select_related('ingredient')
+            .order_by('ingredient__name'),
+            many=True
+        ).data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='export',
+        permission_classes=[IsAdminUser]
+    )
+    def export(self, request):
+        """Метод для потоковой выгрузки всех рецептов в формате NDJSON"""
+        response = StreamingHttpResponse(
+            export_corpus(),
+            content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"'
+        )
+        return response
+
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk=None):
+        """
+        Метод для получения похожих рецептов,
+        заранее рассчитанных командой build_similar_recipes
+        """
+        recipe = get_object_or_404(Recipe, pk=pk)
+        return Response(ShortRecipeSerializer(
+            Recipe.objects.filter(
+                similar_to__recipe=recipe
+            ).order_by('-similar_to__score'),
+            many=True
+        ).data)
+
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
         """Метод для получения короткой ссылки на рецепт"""
@@ -294,3 +882,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
             reverse('recipe-short-link', args=[pk])
         )
         return Response({'short-link': short_link}, status=status.HTTP_200_OK)
+
+
+class TokenCreateView(DjoserTokenCreateView):
+    """View для получения токена с ограничением частоты запросов"""
+
+    throttle_scope = 'auth'
+
+
+class ReadinessView(APIView):
+    """View для проверки готовности процесса после прогрева"""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        if is_ready() or not settings.WARMUP['ENABLED']:
+            return Response({'status': 'ready'})
+        return Response(
+            {'status': 'warming_up'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
@@ -0,0 +1,121 @@
+"""
+Прогрев процесса перед обслуживанием запросов: шаги из настройки
+WARMUP['STEPS'] выполняются по очереди, после чего процесс отмечается
+готовым (эндпоинт /api/health/ready/)
+"""
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+from recipes.models import Recipe, RecipeCard
+from rest_framework.request import Request
+
+from .catalog import ingredient_catalog
+from .serializers import (
+    IngredientSerializer,
+    RecipeSerializer,
+    ShoppingListItemSerializer,
+    ShortRecipeSerializer,
+    SubscribedUserSerializer,
+    UserSerializer,
+)
+
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def warm_up():
+    """
+    Выполняет шаги прогрева и отмечает готовность процесса.
+    Ошибка шага не мешает запуску: она пишется в лог,
+    а процесс обслуживает запросы без этой части прогрева.
+    Возвращает время выполнения каждого шага в секундах
+    """
+    timings = {}
+    for step in settings.WARMUP['STEPS']:
+        started = time.perf_counter()
+        try:
+            import_string(step)()
+        except Exception:
+            logger.exception('Ошибка шага прогрева %s', step)
+        timings[step] = time.perf_counter() - started
+    _ready.set()
+    return timings
+
+
+def resolve_urls():
+    """Импортирует все URLconf и строит таблицы маршрутов"""
+    get_resolver().reverse_dict
+
+
+def connect_databases():
+    """Открывает соединения с базами данных"""
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def build_serializers():
+    """Строит поля сериалайзеров и заполняет кэши метаданных моделей"""
+    for model in apps.get_models():
+        model._meta.get_fields()
+    for serializer_class in (
+        IngredientSerializer,
+        RecipeSerializer,
+        ShoppingListItemSerializer,
+        ShortRecipeSerializer,
+        SubscribedUserSerializer,
+        UserSerializer,
+    ):
+        serializer_class().fields
+
+
+def load_ingredient_catalog():
+    """Загружает справочник продуктов"""
+    ingredient_catalog.load()
+
+
+class WarmUpRequest(HttpRequest):
+    """Запрос с адресом сайта для построения абсолютных ссылок"""
+
+    def __init__(self, base_url):
+        super().__init__()
+        parts = urlsplit(base_url)
+        self.scheme_name = parts.scheme
+        self.META['HTTP_HOST'] = parts.netloc
+
+    def _get_scheme(self):
+        return self.scheme_name
+
+
+def load_popular_recipes():
+    """
+    Заполняет кэш представлений самых популярных рецептов.
+    Популярность берётся из счётчика избранного в карточках,
+    без подсчёта по всей таблице избранного.
+    Ключ кэша включает адрес сайта, поэтому шаг выполняется,
+    только если задан WARMUP['BASE_URL']
+    """
+    if not settings.WARMUP['BASE_URL']:
+        return
+    popular = RecipeCard.objects.order_by('-favorites_count').values_list(
+        'pk', flat=True
+    )[:settings.WARMUP['POPULAR_RECIPES']]
+    recipes = Recipe.objects.filter(pk__in=list(popular)).only(
+        'id', 'updated_at'
+    )
+    RecipeSerializer(context={
+        'request': Request(WarmUpRequest(settings.WARMUP['BASE_URL'])),
+        'use_fragments': True,
+    }).get_fragments(list(recipes))
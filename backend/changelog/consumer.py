@@ -0,0 +1,148 @@
+"""
+Потребитель журнала изменений. Работает фоновым потоком в каждом
+процессе приложения: читает записи после своего курсора и рассылает
+их сигналом changes_received, а обработчики сбрасывают локальные кэши.
+Новые записи ожидаются через LISTEN changelog, а без него (или в
+дополнение к нему) журнал опрашивается раз в POLL_INTERVAL секунд
+"""
+import logging
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import Change, changes_received
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeConsumer:
+    """
+    Читает журнал изменений по возрастанию id. Id выдаются при вставке,
+    а видны записи после коммита, поэтому запись с меньшим id может
+    появиться позже: пропуски в id перечитываются GAP_TIMEOUT секунд
+    """
+
+    MAX_GAPS = 1000
+
+    def __init__(self, poll_interval, gap_timeout, use_listen, batch_size):
+        self.poll_interval = poll_interval
+        self.gap_timeout = gap_timeout
+        self.use_listen = use_listen
+        self.batch_size = batch_size
+        self.cursor = None
+        self.gaps = {}
+        self.listening = False
+
+    def poll(self):
+        """
+        Читает новые записи пачками по batch_size и рассылает каждую
+        пачку отдельно: массовое изменение не загружается в память
+        целиком. Возвращает число прочитанных записей
+        """
+        if self.cursor is None:
+            '''Кэши нового процесса пусты: читать старые записи не нужно'''
+            self.cursor = Change.objects.last_id()
+            return 0
+        total = 0
+        while True:
+            read = self.poll_batch()
+            total += read
+            if read < self.batch_size:
+                return total
+
+    def poll_batch(self):
+        """Читает и рассылает одну пачку записей. Возвращает их число"""
+        changes = list(
+            Change.objects.filter(
+                Q(id__gt=self.cursor) | Q(id__in=list(self.gaps))
+            ).order_by('id').values_list(
+                'id', 'table_name', 'object_key', 'columns'
+            )[:self.batch_size]
+        )
+        now = time.monotonic()
+        columns = defaultdict(dict)
+        for change_id, table, key, changed in changes:
+            table_columns = columns[table]
+            if changed is None or table_columns.get(key, set()) is None:
+                table_columns[key] = None
+            else:
+                table_columns.setdefault(key, set()).update(changed)
+            self.gaps.pop(change_id, None)
+            if change_id > self.cursor:
+                for missing in range(self.cursor + 1, change_id):
+                    self.gaps[missing] = now
+                self.cursor = change_id
+        self.gaps = dict(sorted(
+            (change_id, seen_at)
+            for change_id, seen_at in self.gaps.items()
+            if now - seen_at < self.gap_timeout
+        )[-self.MAX_GAPS:])
+        for table, table_columns in columns.items():
+            for receiver, error in changes_received.send_robust(
+                sender=Change, table=table, keys=set(table_columns),
+                columns=table_columns
+            ):
+                if isinstance(error, Exception):
+                    logger.error(
+                        'Ошибка обработки изменений %s в %s',
+                        table, receiver, exc_info=error
+                    )
+        return len(changes)
+
+    def wait(self):
+        """Ждёт уведомления NOTIFY или истечения интервала опроса"""
+        if not self.listening:
+            time.sleep(self.poll_interval)
+            return
+        raw_connection = connection.connection
+        select.select([raw_connection], [], [], self.poll_interval)
+        raw_connection.poll()
+        raw_connection.notifies.clear()
+
+    def listen(self):
+        self.listening = False
+        if self.use_listen and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('LISTEN changelog')
+            self.listening = True
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+                while True:
+                    self.poll()
+                    self.wait()
+            except Exception:
+                logger.exception('Ошибка чтения журнала изменений')
+                connection.close()
+                time.sleep(self.poll_interval)
+
+
+_consumer_pid = None
+
+
+def start_consumer():
+    """
+    Запускает потребителя журнала в фоновом потоке текущего процесса.
+    Повторный вызов в том же процессе ничего не делает
+    """
+    global _consumer_pid
+    if _consumer_pid == os.getpid():
+        return
+    _consumer_pid = os.getpid()
+    consumer = ChangeConsumer(
+        poll_interval=settings.CHANGELOG['POLL_INTERVAL'],
+        gap_timeout=settings.CHANGELOG['GAP_TIMEOUT'],
+        use_listen=settings.CHANGELOG['USE_LISTEN'],
+        batch_size=settings.CHANGELOG['BATCH_SIZE'],
+    )
+    threading.Thread(
+        target=consumer.run, name='changelog-consumer', daemon=True
+    ).start()
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from changelog.models import Change
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Удаление старых записей журнала изменений"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours", type=int, default=settings.CHANGELOG["RETENTION_HOURS"],
+            help="Удалять записи старше указанного числа часов"
+        )
+
+    def handle(self, *args, **options):
+        deleted = Change.objects.purge(timedelta(hours=options["hours"]))
+        self.stdout.write(f"Удалено записей журнала: {deleted}")
@@ -0,0 +1,74 @@
+from django.db import migrations
+
+'''Таблицы, изменения которых пишутся в журнал, и столбец с ключом'''
+TRACKED_TABLES = {
+    'recipes_recipe': 'id',
+    'recipes_ingredient': 'id',
+    'users_user': 'id',
+    'users_subscription': 'user_id',
+    'authtoken_token': 'key',
+}
+
+'''Триггер пишет ключ изменённой строки в журнал (при смене ключа -
+старый и новый) и уведомляет слушателей канала changelog.
+Уведомления доставляются после коммита и объединяются в транзакции'''
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION changelog_record_change() RETURNS trigger AS $$
+DECLARE
+    new_key text;
+    old_key text;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        new_key := to_jsonb(NEW) ->> TG_ARGV[0];
+        INSERT INTO changelog_change (table_name, object_key, created_at)
+        VALUES (TG_TABLE_NAME, new_key, now());
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        old_key := to_jsonb(OLD) ->> TG_ARGV[0];
+        IF old_key IS DISTINCT FROM new_key THEN
+            INSERT INTO changelog_change
+                (table_name, object_key, created_at)
+            VALUES (TG_TABLE_NAME, old_key, now());
+        END IF;
+    END IF;
+    PERFORM pg_notify('changelog', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_FUNCTION)
+    for table, key in TRACKED_TABLES.items():
+        schema_editor.execute(
+            f'CREATE TRIGGER changelog_{table} '
+            f'AFTER INSERT OR UPDATE OR DELETE ON {table} '
+            f"FOR EACH ROW EXECUTE PROCEDURE changelog_record_change('{key}')"
+        )
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TRACKED_TABLES:
+        schema_editor.execute(
+            f'DROP TRIGGER IF EXISTS changelog_{table} ON {table}'
+        )
+    schema_editor.execute('DROP FUNCTION IF EXISTS changelog_record_change()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0001_initial'),
+        ('authtoken', '0003_tokenproxy'),
+        ('recipes', '0028_recipe_foreign_keys_on_delete_cascade'),
+        ('users', '0004_authorrecommendation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+TRACKED_TABLES = {
+    'recipes_recipe': 'id',
+    'recipes_ingredient': 'id',
+    'users_user': 'id',
+    'users_subscription': 'user_id',
+    'authtoken_token': 'key',
+}
+
+'''Имя таблицы передаётся вторым аргументом триггера: у секционированной
+таблицы TG_TABLE_NAME - имя секции, а не самой таблицы'''
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION changelog_record_change() RETURNS trigger AS $$
+DECLARE
+    table_name text := COALESCE(TG_ARGV[1], TG_TABLE_NAME);
+    new_key text;
+    old_key text;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        new_key := to_jsonb(NEW) ->> TG_ARGV[0];
+        INSERT INTO changelog_change (table_name, object_key, created_at)
+        VALUES (table_name, new_key, now());
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        old_key := to_jsonb(OLD) ->> TG_ARGV[0];
+        IF old_key IS DISTINCT FROM new_key THEN
+            INSERT INTO changelog_change
+                (table_name, object_key, created_at)
+            VALUES (table_name, old_key, now());
+        END IF;
+    END IF;
+    PERFORM pg_notify('changelog', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def recreate_triggers(with_table_name):
+    def recreate(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        if with_table_name:
+            schema_editor.execute(CREATE_FUNCTION)
+        for table, key in TRACKED_TABLES.items():
+            arguments = f"'{key}', '{table}'" if with_table_name else f"'{key}'"
+            schema_editor.execute(
+                f'DROP TRIGGER IF EXISTS changelog_{table} ON {table}'
+            )
+            schema_editor.execute(
+                f'CREATE TRIGGER changelog_{table} '
+                f'AFTER INSERT OR UPDATE OR DELETE ON {table} '
+                'FOR EACH ROW EXECUTE PROCEDURE '
+                f'changelog_record_change({arguments})'
+            )
+
+    return recreate
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0002_change_triggers'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recreate_triggers(with_table_name=True),
+            recreate_triggers(with_table_name=False),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+'''Изменения подписок не сбрасывают никаких кэшей: журнал по ним
+только рос и будил потребителей'''
+TABLE = 'users_subscription'
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'DROP TRIGGER IF EXISTS changelog_{TABLE} ON {TABLE}'
+    )
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE TRIGGER changelog_{TABLE} '
+        f'AFTER INSERT OR UPDATE OR DELETE ON {TABLE} '
+        'FOR EACH ROW EXECUTE PROCEDURE '
+        f"changelog_record_change('user_id', '{TABLE}')"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0003_change_trigger_table_argument'),
+        ('users', '0005_partition_subscription'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_trigger, create_trigger),
+    ]
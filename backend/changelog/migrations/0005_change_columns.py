@@ -0,0 +1,78 @@
+from importlib import import_module
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+'''Триггер пишет в журнал и список изменённых столбцов при UPDATE,
+а обновление без изменений не пишет совсем: потребители сбрасывают
+кэши только по нужным им столбцам (вход пользователя меняет лишь
+last_login)'''
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION changelog_record_change() RETURNS trigger AS $$
+DECLARE
+    table_name text := COALESCE(TG_ARGV[1], TG_TABLE_NAME);
+    new_key text;
+    old_key text;
+    old_row jsonb;
+    changed text[];
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        old_row := to_jsonb(OLD);
+        SELECT array_agg(new_row.key ORDER BY new_row.key) INTO changed
+        FROM jsonb_each(to_jsonb(NEW)) AS new_row
+        WHERE new_row.value IS DISTINCT FROM old_row -> new_row.key;
+        IF changed IS NULL THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_key := to_jsonb(NEW) ->> TG_ARGV[0];
+        INSERT INTO changelog_change
+            (table_name, object_key, columns, created_at)
+        VALUES (table_name, new_key, changed, now());
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        old_key := to_jsonb(OLD) ->> TG_ARGV[0];
+        IF old_key IS DISTINCT FROM new_key THEN
+            INSERT INTO changelog_change
+                (table_name, object_key, columns, created_at)
+            VALUES (table_name, old_key, changed, now());
+        END IF;
+    END IF;
+    PERFORM pg_notify('changelog', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def replace_function(function):
+    def replace(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(function())
+    return replace
+
+
+def previous_function():
+    return import_module(
+        'changelog.migrations.0003_change_trigger_table_argument'
+    ).CREATE_FUNCTION
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changelog', '0004_drop_subscription_trigger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='columns',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=63), blank=True, null=True, size=None, verbose_name='Изменённые столбцы'),
+        ),
+        migrations.RunPython(
+            replace_function(lambda: CREATE_FUNCTION),
+            replace_function(previous_function),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+from django.dispatch import Signal
+from django.utils import timezone
+
+'''Отправляется потребителем журнала для каждой таблицы
+с аргументами table, keys (множество строковых ключей) и columns
+(ключ -> множество изменённых столбцов или None, если строка
+добавлена, удалена или столбцы неизвестны)'''
+changes_received = Signal()
+
+
+class ChangeManager(models.Manager):
+    """Менеджер журнала изменений"""
+
+    def last_id(self):
+        return self.aggregate(last_id=models.Max('id'))['last_id'] or 0
+
+    def purge(self, older_than):
+        """Удаляет записи старше older_than (timedelta)"""
+        return self.filter(
+            created_at__lt=timezone.now() - older_than
+        ).delete()[0]
+
+
+class Change(models.Model):
+    """
+    Модель записи журнала изменений. Записи добавляют триггеры базы
+    в той же транзакции, что и изменение строки, поэтому в журнал
+    попадают и изменения в обход ORM (массовые запросы, raw SQL)
+    """
+
+    table_name = models.CharField(
+        verbose_name='Таблица',
+        max_length=63
+    )
+    object_key = models.CharField(
+        verbose_name='Ключ объекта',
+        max_length=64
+    )
+    columns = ArrayField(
+        models.CharField(max_length=63),
+        null=True,
+        blank=True,
+        verbose_name='Изменённые столбцы'
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        default=timezone.now,
+        db_index=True
+    )
+
+    objects = ChangeManager()
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'#{self.id} {self.table_name}:{self.object_key}'
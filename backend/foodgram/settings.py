@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
@@ -43,10 +46,11 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
-    'rest_framework_simplejwt',
     'api.apps.ApiConfig',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
+    'jobs.apps.JobsConfig',
+    'changelog.apps.ChangelogConfig',
     'djoser',
 ]
 
@@ -58,6 +62,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.RateLimitHeadersMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.PasswordHashingMiddleware',
+    'api.middleware.StatementTimeoutMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -94,7 +102,8 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
     }
 }
 
@@ -148,17 +157,277 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
+# Хэширование паролей (users.hashers): алгоритм новых хэшей (pbkdf2
+# или argon2) и его стоимость; хэши другого алгоритма или стоимости
+# пересчитываются при входе. Хэш считается в пуле из THREADS потоков
+# процесса (0 - в потоке запроса), ждать пула могут QUEUE_SIZE
+# запросов не дольше QUEUE_TIMEOUT секунд, остальные получают 503
+
+PASSWORD_HASHING = {
+    'ALGORITHM': os.getenv('PASSWORD_HASHER', 'pbkdf2'),
+    'PBKDF2_ITERATIONS': int(os.getenv('PBKDF2_ITERATIONS', 260000)),
+    'ARGON2_TIME_COST': int(os.getenv('ARGON2_TIME_COST', 2)),
+    'ARGON2_MEMORY_COST': int(os.getenv('ARGON2_MEMORY_COST', 19456)),
+    'ARGON2_PARALLELISM': int(os.getenv('ARGON2_PARALLELISM', 1)),
+    'THREADS': int(os.getenv('PASSWORD_HASHING_THREADS', 2)),
+    'QUEUE_SIZE': int(os.getenv('PASSWORD_HASHING_QUEUE_SIZE', 32)),
+    'QUEUE_TIMEOUT': float(os.getenv('PASSWORD_HASHING_QUEUE_TIMEOUT', 5)),
+}
+
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'users.hashers.PBKDF2PasswordHasher',
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+}
+
+if PASSWORD_HASHING['ALGORITHM'] not in PASSWORD_HASHER_CLASSES:
+    raise ImproperlyConfigured(
+        f"Неизвестный PASSWORD_HASHER {PASSWORD_HASHING['ALGORITHM']!r}: "
+        f"ожидается один из {', '.join(PASSWORD_HASHER_CLASSES)}"
+    )
+
+PASSWORD_HASHERS = sorted(
+    PASSWORD_HASHER_CLASSES.values(),
+    key=lambda path: (
+        path != PASSWORD_HASHER_CLASSES[PASSWORD_HASHING['ALGORITHM']]
+    )
+) + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+# Аутентификация: токены djoser с кэшем в памяти процесса и, опционально,
+# JWT без обращения к базе данных
+
+AUTH_TOKEN_CACHE = {
+    'MAX_SIZE': int(os.getenv('AUTH_TOKEN_CACHE_MAX_SIZE', 10000)),
+    'TIMEOUT': int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60)),
+}
+
+USE_JWT = os.getenv('USE_JWT', 'False') == 'True'
+
+AUTHENTICATION_CLASSES = [
+    'api.authentication.CachedTokenAuthentication',
+]
+if USE_JWT:
+    INSTALLED_APPS.append('rest_framework_simplejwt')
+    AUTHENTICATION_CLASSES.insert(
+        0, 'api.jwt_auth.StatelessJWTAuthentication'
+    )
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_TOKEN_LIFETIME_MINUTES', 5))
+    ),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
+
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': AUTHENTICATION_CLASSES,
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.ScopedTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': os.getenv('THROTTLE_RATE_AUTH', '10/min'),
+        'uploads': os.getenv('THROTTLE_RATE_UPLOADS', '30/hour'),
+        'bulk': os.getenv('THROTTLE_RATE_BULK', '60/min'),
+        'reports': os.getenv('THROTTLE_RATE_REPORTS', '20/min'),
+    },
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PagesPagination',
     'PAGE_SIZE': 6,
 }
 
+# Хранилище корзин ограничения частоты запросов, общее для воркеров:
+# shared_memory - файл в /dev/shm на одном сервере,
+# cache - кэш Django (для нескольких серверов нужен memcached и т.п.)
+THROTTLE_STORE = {
+    'BACKEND': os.getenv('THROTTLE_STORE', 'shared_memory'),
+    'PATH': os.getenv(
+        'THROTTLE_SHARED_MEMORY_PATH',
+        os.path.join(
+            '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+            'foodgram-throttle'
+        )
+    ),
+    'SLOTS': int(os.getenv('THROTTLE_SHARED_MEMORY_SLOTS', 65536)),
+    'CACHE_ALIAS': 'default',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    # Отдельный ограниченный кэш ответов для выдачи при таймауте
+    # (STATEMENT_TIMEOUTS), чтобы они не вытесняли остальные записи
+    'stale-responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stale-responses',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('STATEMENT_TIMEOUT_STALE_ENTRIES', 200)),
+        },
+    },
+}
+
+# Подсчёт общего числа объектов в пагинации (api.pagination):
+# exact, cached (COUNT в кэше на COUNT_TIMEOUT секунд), estimated
+# (оценка планировщика для таблиц от ESTIMATE_MIN_ROWS строк без фильтров)
+# или has_next (без подсчёта)
+PAGINATION = {
+    'COUNT_MODE': os.getenv('PAGINATION_COUNT_MODE', 'exact'),
+    'COUNT_TIMEOUT': int(os.getenv('PAGINATION_COUNT_TIMEOUT', 60)),
+    'ESTIMATE_MIN_ROWS': 10000,
+    'CACHE_ALIAS': 'default',
+}
+
+# Ограничение времени запросов к базе по маршрутам API в мс (0 - без
+# ограничения, DEFAULT - для остальных маршрутов). При превышении
+# анонимное чтение маршрутов STALE_ROUTES получает последний удачный
+# ответ из кэша STALE_CACHE_ALIAS, хранимый STALE_TIMEOUT секунд (ответы
+# больше STALE_MAX_SIZE байт не хранятся), остальные запросы - 503.
+# Счётчики таймаутов хранятся в кэше STATS_CACHE_ALIAS (api.timeouts).
+# Потоковые ответы маршрутов не из ROUTES не собираются в память,
+# ограничение действует только на само представление
+STATEMENT_TIMEOUTS = {
+    'DEFAULT': int(os.getenv('STATEMENT_TIMEOUT', 0)),
+    'ROUTES': {
+        'recipes-list': int(os.getenv('STATEMENT_TIMEOUT_RECIPES', 3000)),
+        'recipes-detail': int(os.getenv('STATEMENT_TIMEOUT_RECIPES', 3000)),
+        'users-list': int(os.getenv('STATEMENT_TIMEOUT_USERS', 3000)),
+        'users-subscriptions': int(
+            os.getenv('STATEMENT_TIMEOUT_SUBSCRIPTIONS', 5000)
+        ),
+        'recipes-download-shopping-cart': int(
+            os.getenv('STATEMENT_TIMEOUT_SHOPPING_CART', 10000)
+        ),
+    },
+    'STALE_ROUTES': ('recipes-list', 'recipes-detail', 'users-list'),
+    'STALE_CACHE_ALIAS': 'stale-responses',
+    'STALE_TIMEOUT': int(os.getenv('STATEMENT_TIMEOUT_STALE_TIMEOUT', 3600)),
+    'STALE_MAX_SIZE': 128 * 2 ** 10,
+    # Счётчики таймаутов: shared_memory - общие для воркеров одного
+    # сервера, cache - в CACHE_BACKEND (общие при общем кэше)
+    'STATS_STORE': os.getenv('STATEMENT_TIMEOUT_STATS_STORE', 'shared_memory'),
+    'STATS_PATH': os.getenv(
+        'STATEMENT_TIMEOUT_STATS_PATH',
+        os.path.join(
+            '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+            'foodgram-statement-timeouts'
+        )
+    ),
+    'STATS_SLOTS': 4096,
+    'STATS_CACHE_ALIAS': 'default',
+}
+
+# Максимальное число id в одном запросе массовых операций
+BULK_MAX_IDS = int(os.getenv('BULK_MAX_IDS', 100))
+
+# Секционирование избранного, корзин и подписок по хэшу user_id
+# (users.partitioning): число секций при миграции, 0 - без секций.
+# Изменить число секций позже можно командой partition_user_tables
+USER_TABLE_PARTITIONS = {
+    'PARTITIONS': int(os.getenv('USER_TABLE_PARTITIONS', 16)),
+    'BATCH_SIZE': int(os.getenv('USER_TABLE_PARTITIONS_BATCH_SIZE', 10000)),
+}
+
+# Удаление пользователей фоновой задачей: строк в одной транзакции
+# и рецептов в одном DELETE (их связи база удаляет каскадом)
+DELETION = {
+    'BATCH_SIZE': int(os.getenv('DELETION_BATCH_SIZE', 1000)),
+    'RECIPES_PER_BATCH': int(os.getenv('DELETION_RECIPES_PER_BATCH', 20)),
+}
+
+# Списки рецептов, пользователей и подписок без сериалайзеров:
+# строки values() собираются в ответ напрямую (api.readers)
+FAST_READ = os.getenv('FAST_READ', 'True') == 'True'
+
+# Карточки рецептов RecipeCard: чтение списков рецептов из них
+# (вместе с FAST_READ) и число рецептов в пачке при пересборке
+RECIPE_CARDS = {
+    'READ': os.getenv('RECIPE_CARDS_READ', 'True') == 'True',
+    'BATCH_SIZE': int(os.getenv('RECIPE_CARDS_BATCH_SIZE', 1000)),
+}
+
+# Кэш не зависящих от пользователя представлений рецептов
+# (0 в RECIPE_CACHE_MAX_SIZE отключает кэш)
+RECIPE_CACHE = {
+    'MAX_SIZE': int(os.getenv('RECIPE_CACHE_MAX_SIZE', 5000)),
+    'TIMEOUT': int(os.getenv('RECIPE_CACHE_TIMEOUT', 300)),
+}
+
+# Очередь фоновых задач в базе данных (воркер: manage.py run_jobs)
+JOBS = {
+    'MAX_ATTEMPTS': int(os.getenv('JOBS_MAX_ATTEMPTS', 5)),
+    'RETRY_BACKOFF': int(os.getenv('JOBS_RETRY_BACKOFF', 10)),
+    'MAX_BACKOFF': int(os.getenv('JOBS_MAX_BACKOFF', 3600)),
+    'POLL_INTERVAL': float(os.getenv('JOBS_POLL_INTERVAL', 1)),
+    'STALE_AFTER': int(os.getenv('JOBS_STALE_AFTER', 600)),
+    'KEEP_DONE_DAYS': int(os.getenv('JOBS_KEEP_DONE_DAYS', 7)),
+    'MAINTENANCE_INTERVAL': int(os.getenv('JOBS_MAINTENANCE_INTERVAL', 60)),
+}
+
+# Журнал изменений для сброса локальных кэшей на всех серверах:
+# каждый процесс читает новые записи пачками по BATCH_SIZE
+# по LISTEN/NOTIFY или раз в POLL_INTERVAL секунд; записи старше
+# RETENTION_HOURS удаляет команда purge_changes
+CHANGELOG = {
+    'ENABLED': os.getenv('CHANGELOG_ENABLED', 'True') == 'True',
+    'USE_LISTEN': os.getenv('CHANGELOG_USE_LISTEN', 'True') == 'True',
+    'POLL_INTERVAL': float(os.getenv('CHANGELOG_POLL_INTERVAL', 1)),
+    'GAP_TIMEOUT': 10,
+    'BATCH_SIZE': int(os.getenv('CHANGELOG_BATCH_SIZE', 5000)),
+    'RETENTION_HOURS': int(os.getenv('CHANGELOG_RETENTION_HOURS', 24)),
+}
+
+# Профилирование запросов (api.middleware.ProfilingMiddleware):
+# по заголовку X-Profile или параметру ?profile=1 от сотрудника
+# и для доли SAMPLE_RATE всех запросов. INTERVAL - период выборки
+# стека в секундах, MAX_FILES - сколько последних профилей хранить
+PROFILING = {
+    'ENABLED': os.getenv('PROFILING_ENABLED', 'True') == 'True',
+    'SAMPLE_RATE': float(os.getenv('PROFILING_SAMPLE_RATE', 0)),
+    'HEADER': 'X-Profile',
+    'QUERY_PARAM': 'profile',
+    'INTERVAL': float(os.getenv('PROFILING_INTERVAL', 0.002)),
+    'MEMORY': os.getenv('PROFILING_MEMORY', 'True') == 'True',
+    'TRACEMALLOC_FRAMES': 30,
+    'DIRECTORY': os.getenv(
+        'PROFILING_DIRECTORY', os.path.join(BASE_DIR, 'profiles')
+    ),
+    'MAX_FILES': int(os.getenv('PROFILING_MAX_FILES', 500)),
+}
+
+# Время жизни справочника продуктов в памяти процесса, секунды
+INGREDIENT_CATALOG_TIMEOUT = int(
+    os.getenv('INGREDIENT_CATALOG_TIMEOUT', 300)
+)
+
+# Прогрев процесса при запуске (foodgram/wsgi.py): соединения с базой,
+# маршруты, сериалайзеры и кэши. BASE_URL - адрес сайта для кэша
+# представлений рецептов, без него популярные рецепты не загружаются
+WARMUP = {
+    'ENABLED': os.getenv('WARMUP_ENABLED', 'True') == 'True',
+    'STEPS': [
+        'api.warmup.resolve_urls',
+        'api.warmup.connect_databases',
+        'api.warmup.build_serializers',
+        'api.warmup.load_ingredient_catalog',
+        'api.warmup.load_popular_recipes',
+    ],
+    'BASE_URL': os.getenv('WARMUP_BASE_URL', ''),
+    'POPULAR_RECIPES': int(os.getenv('WARMUP_POPULAR_RECIPES', 100)),
+}
+
 DJOSER = {
     'SERIALIZERS': {
         'user_create': 'djoser.serializers.UserCreateSerializer',
@@ -9,8 +9,23 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+# Модуль импортируется в каждом воркере gunicorn (без --preload),
+# поэтому прогрев выполняется до того, как воркер примет запросы
+if settings.WARMUP['ENABLED']:
+    from api.warmup import warm_up
+
+    warm_up()
+
+# Потребитель журнала изменений сбрасывает локальные кэши воркера
+# при изменениях на других серверах
+if settings.CHANGELOG['ENABLED']:
+    from changelog.consumer import start_consumer
+
+    start_consumer()
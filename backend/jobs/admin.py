@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Админка для очереди фоновых задач"""
+
+    list_display = (
+        'id', 'name', 'status', 'priority', 'attempts', 'run_at',
+        'finished_at'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'dedup_key')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'locked_by')
@@ -0,0 +1,13 @@
+import json
+
+from django.core.management.base import BaseCommand
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = "Глубина очереди фоновых задач по именам и статусам в JSON"
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            json.dumps(Job.objects.stats(), ensure_ascii=False, indent=2)
+        )
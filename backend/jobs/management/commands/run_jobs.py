@@ -0,0 +1,77 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = "Воркер очереди фоновых задач"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queue", nargs="+", default=None,
+            help="Выполнять только задачи с указанными именами"
+        )
+        parser.add_argument(
+            "--burst", action="store_true",
+            help="Завершиться, когда в очереди не останется готовых задач"
+        )
+        parser.add_argument(
+            "--max-jobs", type=int, default=None,
+            help="Завершиться после выполнения указанного числа задач"
+        )
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        done = 0
+        maintained_at = 0
+        self.stdout.write(f"Воркер {worker} запущен")
+        while not self.stopping:
+            close_old_connections()
+            if time.monotonic() - maintained_at > settings.JOBS[
+                "MAINTENANCE_INTERVAL"
+            ]:
+                self._maintain()
+                maintained_at = time.monotonic()
+
+            job = Job.objects.claim(worker, options["queue"])
+            if job is None:
+                if options["burst"]:
+                    break
+                time.sleep(settings.JOBS["POLL_INTERVAL"])
+                continue
+
+            started = time.monotonic()
+            succeeded = job.run()
+            self.stdout.write(
+                f"{job} попытка {job.attempts}: "
+                f"{'выполнена' if succeeded else 'ошибка'} "
+                f"за {time.monotonic() - started:.2f} с"
+            )
+            done += 1
+            if options["max_jobs"] and done >= options["max_jobs"]:
+                break
+        self.stdout.write(f"Воркер {worker} остановлен, задач: {done}")
+
+    def _stop(self, signum, frame):
+        """Завершает работу после текущей задачи"""
+        self.stopping = True
+
+    def _maintain(self):
+        requeued = Job.objects.requeue_stale()
+        purged = Job.objects.purge_finished()
+        if requeued or purged:
+            self.stdout.write(
+                f"Возвращено в очередь: {requeued}, удалено: {purged}"
+            )
+        for name, counts in Job.objects.stats().items():
+            self.stdout.write(f"Очередь {name}: {counts}")
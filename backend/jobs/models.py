@@ -0,0 +1,256 @@
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .tasks import TASKS
+
+
+class JobManager(models.Manager):
+    """Менеджер очереди фоновых задач"""
+
+    def enqueue(self, name, payload=None, priority=0, delay=None,
+                dedup_key=None, max_attempts=None):
+        """
+        Ставит задачу в очередь в текущей транзакции. Если в очереди
+        уже ждёт задача с тем же dedup_key, новая не создаётся
+        и возвращается ожидающая
+        """
+        if name not in TASKS:
+            raise ValueError(f'Неизвестная задача {name}')
+        job = self.model(
+            name=name,
+            payload=payload or {},
+            priority=priority,
+            run_at=timezone.now() + (delay or timedelta()),
+            dedup_key=dedup_key,
+            max_attempts=max_attempts or settings.JOBS['MAX_ATTEMPTS'],
+        )
+        if dedup_key is None:
+            job.save()
+            return job
+        self.bulk_create([job], ignore_conflicts=True)
+        pending = self.filter(
+            dedup_key=dedup_key, status=self.model.PENDING
+        ).first()
+        if pending is None:
+            '''Ожидавшую задачу успел забрать воркер между вставкой
+            и чтением, поэтому вставка повторяется'''
+            return self.enqueue(
+                name, payload, priority, delay, dedup_key, max_attempts
+            )
+        return pending
+
+    def claim(self, worker, names=None):
+        """
+        Забирает готовую к выполнению задачу с наибольшим приоритетом.
+        На PostgreSQL строки блокируются через SKIP LOCKED, поэтому
+        воркеры не ждут друг друга; на базах без SKIP LOCKED задачу
+        захватывает условный UPDATE, и проигравший воркер получает None
+        """
+        queryset = self.filter(
+            status=self.model.PENDING, run_at__lte=timezone.now()
+        ).order_by('-priority', 'run_at', 'id')
+        if names:
+            queryset = queryset.filter(name__in=names)
+        with transaction.atomic():
+            if connection.features.has_select_for_update_skip_locked:
+                queryset = queryset.select_for_update(skip_locked=True)
+            job = queryset.first()
+            if job is None:
+                return None
+            claimed = self.filter(
+                pk=job.pk, status=self.model.PENDING
+            ).update(
+                status=self.model.RUNNING,
+                attempts=F('attempts') + 1,
+                started_at=timezone.now(),
+                locked_by=worker,
+            )
+        if not claimed:
+            return None
+        job.refresh_from_db()
+        return job
+
+    def requeue_stale(self):
+        """
+        Возвращает в очередь задачи, воркер которых завис или упал,
+        не завершив выполнение за JOBS['STALE_AFTER'] секунд, как после
+        ошибки: с задержкой, а при исчерпанных попытках помечает ошибкой,
+        иначе задача, роняющая воркер, выполнялась бы бесконечно.
+        Возвращает число возвращённых в очередь задач
+        """
+        stale = self.filter(
+            status=self.model.RUNNING,
+            started_at__lt=timezone.now() - timedelta(
+                seconds=settings.JOBS['STALE_AFTER']
+            )
+        )
+        requeued = 0
+        with transaction.atomic():
+            if connection.features.has_select_for_update_skip_locked:
+                stale = stale.select_for_update(skip_locked=True)
+            for job in stale:
+                job.last_error = (
+                    f'Воркер {job.locked_by} не завершил задачу '
+                    f'за {settings.JOBS["STALE_AFTER"]} с'
+                )
+                job._retry_or_fail()
+                requeued += job.status == self.model.PENDING
+        return requeued
+
+    def purge_finished(self):
+        """Удаляет выполненные задачи старше JOBS['KEEP_DONE_DAYS'] дней"""
+        deleted, _ = self.filter(
+            status=self.model.DONE,
+            finished_at__lt=timezone.now() - timedelta(
+                days=settings.JOBS['KEEP_DONE_DAYS']
+            )
+        ).delete()
+        return deleted
+
+    def stats(self):
+        """
+        Глубина очереди: число задач по именам и статусам
+        и возраст самой старой готовой к выполнению задачи
+        """
+        now = timezone.now()
+        counts = {}
+        for row in self.values('name', 'status').annotate(
+            count=Count('id'),
+            oldest_run_at=Min('run_at', filter=Q(run_at__lte=now)),
+        ).order_by('name', 'status'):
+            item = counts.setdefault(row['name'], {
+                status: 0 for status, _ in self.model.STATUS_CHOICES
+            })
+            item[row['status']] = row['count']
+            if row['status'] == self.model.PENDING:
+                item['lag_seconds'] = round((
+                    now - (row['oldest_run_at'] or now)
+                ).total_seconds(), 1)
+        return counts
+
+
+class Job(models.Model):
+    """Модель фоновой задачи в очереди"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(verbose_name='Задача', max_length=128)
+    payload = models.JSONField(verbose_name='Параметры', default=dict)
+    priority = models.SmallIntegerField(verbose_name='Приоритет', default=0)
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    dedup_key = models.CharField(
+        verbose_name='Ключ дедупликации',
+        max_length=255,
+        blank=True,
+        null=True
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попытки', default=0
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток'
+    )
+    run_at = models.DateTimeField(verbose_name='Запустить не раньше')
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания', auto_now_add=True
+    )
+    started_at = models.DateTimeField(
+        verbose_name='Дата запуска', blank=True, null=True
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Дата завершения', blank=True, null=True
+    )
+    locked_by = models.CharField(
+        verbose_name='Воркер', max_length=128, blank=True
+    )
+    last_error = models.TextField(verbose_name='Последняя ошибка', blank=True)
+
+    objects = JobManager()
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('-created_at',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=Q(status='pending'),
+                name='unique_pending_job_dedup_key'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['-priority', 'run_at'],
+                condition=Q(status='pending'),
+                name='pending_job_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+    def run(self):
+        """
+        Выполняет задачу. При ошибке задача возвращается в очередь
+        с экспоненциальной задержкой, пока не исчерпаны попытки
+        """
+        try:
+            TASKS[self.name](**self.payload)
+        except Exception:
+            self.last_error = traceback.format_exc()
+            self._retry_or_fail()
+            return False
+        self.status = self.DONE
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'finished_at'])
+        return True
+
+    def _retry_or_fail(self):
+        self.finished_at = timezone.now()
+        if self.attempts >= self.max_attempts:
+            self.status = self.FAILED
+            self.save(update_fields=['status', 'finished_at', 'last_error'])
+            return
+        self.status = self.PENDING
+        self.locked_by = ''
+        self.run_at = self.finished_at + self.backoff(self.attempts)
+        try:
+            with transaction.atomic():
+                self.save(update_fields=[
+                    'status', 'finished_at', 'last_error', 'locked_by',
+                    'run_at'
+                ])
+        except IntegrityError:
+            '''В очереди уже ждёт такая же задача с тем же dedup_key,
+            она и выполнит работу вместо повтора'''
+            self.status = self.FAILED
+            self.save(update_fields=['status', 'finished_at', 'last_error'])
+
+    @staticmethod
+    def backoff(attempts):
+        """Задержка перед повтором: base * 2^(n-1) со случайным разбросом"""
+        delay = min(
+            settings.JOBS['RETRY_BACKOFF'] * 2 ** (attempts - 1),
+            settings.JOBS['MAX_BACKOFF']
+        )
+        return timedelta(seconds=delay * random.uniform(0.5, 1))
@@ -0,0 +1,16 @@
+"""
+Реестр фоновых задач. Задачи объявляются в модулях tasks.py
+приложений декоратором task и ставятся в очередь через Job.objects.enqueue
+"""
+
+TASKS = {}
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу с именем name"""
+
+    def register(func):
+        TASKS[name] = func
+        return func
+
+    return register
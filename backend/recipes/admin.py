@@ -1,13 +1,36 @@
+from functools import partial
+
 from django.contrib import admin
+from django.db import transaction
+
+from .deletion import delete_recipes
 from .models import (
     Recipe,
     Ingredient,
     IngredientInRecipe,
     Favorite,
-    ShoppingCart
+    ShoppingCart,
+    ShoppingListItem
 )
 
 
+class SummaryDeleteConfirmationMixin:
+    """
+    Подтверждение удаления без обхода всех связанных объектов:
+    их удаляет база или фоновая задача, а перечисление
+    у активного автора читало бы в память сотни тысяч строк
+    """
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            [],
+        )
+
+
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     """Админка для модели ингредиентов"""
@@ -19,7 +42,7 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(SummaryDeleteConfirmationMixin, admin.ModelAdmin):
     """Админка для модели рецептов"""
 
     list_display = ('id', 'name', 'author', 'get_favorites_count')
@@ -32,6 +55,12 @@ class RecipeAdmin(admin.ModelAdmin):
         """Отображает общее число добавлений рецепта в избранное"""
         return recipe.favorites.count()
 
+    def delete_model(self, request, obj):
+        delete_recipes([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        delete_recipes(queryset.values_list('pk', flat=True))
+
 
 @admin.register(IngredientInRecipe)
 class IngredientInRecipeAdmin(admin.ModelAdmin):
@@ -40,6 +69,47 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
     search_fields = ('recipe__name', 'ingredient__name')
 
+    @staticmethod
+    @transaction.atomic
+    def _change_recipes(recipe_ids, change):
+        """
+        Выполняет change и обновляет состав рецептов, как при изменении
+        через API: массивы id ингредиентов, карточки и списки покупок
+        пользователей, у которых рецепты в корзине
+        """
+        old_links = {
+            recipe_id: ShoppingListItem.objects.recipe_links(recipe_id)
+            for recipe_id in recipe_ids
+        }
+        change()
+        for recipe in Recipe.objects.filter(pk__in=recipe_ids):
+            ShoppingListItem.objects.change_recipe(
+                recipe,
+                old_links[recipe.pk],
+                ShoppingListItem.objects.recipe_links(recipe.pk)
+            )
+        Recipe.objects.update_ingredient_ids(recipe_ids)
+
+    def save_model(self, request, obj, form, change):
+        '''Связь могла перейти к другому рецепту: меняются оба'''
+        recipe_ids = {obj.recipe_id, *IngredientInRecipe.objects.filter(
+            pk=obj.pk
+        ).values_list('recipe_id', flat=True)}
+        self._change_recipes(recipe_ids, partial(
+            super().save_model, request, obj, form, change
+        ))
+
+    def delete_model(self, request, obj):
+        self._change_recipes({obj.recipe_id}, partial(
+            super().delete_model, request, obj
+        ))
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        self._change_recipes(recipe_ids, partial(
+            super().delete_queryset, request, queryset
+        ))
+
 
 @admin.register(Favorite, ShoppingCart)
 class FavoriteAndShoppingCartAdmin(admin.ModelAdmin):
@@ -48,3 +118,11 @@ class FavoriteAndShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
     search_fields = ('user__email', 'recipe__name')
     list_filter = ('user',)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    """Админка для итогов списков покупок"""
+
+    list_display = ('user', 'ingredient', 'amount', 'recipes_count')
+    search_fields = ('user__email', 'ingredient__name')
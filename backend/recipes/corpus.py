@@ -0,0 +1,237 @@
+"""
+Потоковая выгрузка и загрузка корпуса рецептов в формате NDJSON.
+
+Каждая строка - отдельный JSON-объект с полем type: сначала идут
+пользователи (user), затем продукты (ingredient), затем рецепты (recipe)
+с составом, избранным и корзинами. Ссылки между объектами задаются
+id исходной базы и при загрузке переназначаются на новые id.
+"""
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from users.models import User
+
+from .models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeCard,
+    ShoppingCart,
+    ShoppingListItem,
+)
+
+USER_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+RECIPE_FIELDS = (
+    'id', 'name', 'text', 'image', 'cooking_time', 'author_id', 'created_at'
+)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _line(object_type, data):
+    return json.dumps(
+        {'type': object_type, **data}, ensure_ascii=False, default=str
+    ) + '\n'
+
+
+def _ingredient_key(ingredient):
+    return ingredient['name'], ingredient['measurement_unit']
+
+
+def _group(queryset, recipe_ids, *fields):
+    groups = defaultdict(list)
+    for recipe_id, *values in queryset.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', *fields).order_by():
+        groups[recipe_id].append(values[0] if len(values) == 1 else values)
+    return groups
+
+
+def export_corpus(chunk_size=2000):
+    """
+    Генератор строк NDJSON со всем корпусом рецептов.
+    Данные читаются серверными курсорами порциями по chunk_size,
+    поэтому потребление памяти не зависит от размера базы
+    """
+    for user in User.objects.order_by('id').values(
+        *USER_FIELDS
+    ).iterator(chunk_size=chunk_size):
+        yield _line('user', user)
+    for ingredient in Ingredient.objects.order_by('id').values(
+        *INGREDIENT_FIELDS
+    ).iterator(chunk_size=chunk_size):
+        yield _line('ingredient', ingredient)
+    for recipes in _batches(
+        Recipe.objects.order_by('id').values(
+            *RECIPE_FIELDS
+        ).iterator(chunk_size=chunk_size),
+        chunk_size
+    ):
+        recipe_ids = [recipe['id'] for recipe in recipes]
+        ingredients = _group(
+            IngredientInRecipe.objects, recipe_ids, 'ingredient_id', 'amount'
+        )
+        favorites = _group(Favorite.objects, recipe_ids, 'user_id')
+        shopping_carts = _group(ShoppingCart.objects, recipe_ids, 'user_id')
+        for recipe in recipes:
+            yield _line('recipe', {
+                **recipe,
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': amount}
+                    for ingredient_id, amount in ingredients[recipe['id']]
+                ],
+                'favorited_by': favorites[recipe['id']],
+                'in_shopping_cart_of': shopping_carts[recipe['id']],
+            })
+
+
+class CorpusImporter:
+    """
+    Загрузка корпуса из строк NDJSON пачками через bulk_create.
+    Пользователи сопоставляются по email, продукты - по названию
+    и единице измерения; рецепты всегда создаются заново
+    """
+
+    def __init__(self, batch_size=2000):
+        self.batch_size = batch_size
+        self.user_ids = {}
+        self.ingredient_ids = {}
+        self.stats = defaultdict(int)
+
+    def load(self, lines):
+        handlers = {
+            'user': self._load_users,
+            'ingredient': self._load_ingredients,
+            'recipe': self._load_recipes,
+        }
+        batch, batch_type = [], None
+        for line in lines:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if batch and (
+                item['type'] != batch_type or len(batch) >= self.batch_size
+            ):
+                handlers[batch_type](batch)
+                batch = []
+            batch_type = item.pop('type')
+            batch.append(item)
+        if batch:
+            handlers[batch_type](batch)
+        return dict(self.stats)
+
+    @transaction.atomic
+    def _load_users(self, users):
+        existing = dict(User.objects.filter(
+            email__in=[user['email'] for user in users]
+        ).values_list('email', 'id'))
+        taken_usernames = set(User.objects.filter(
+            username__in=[user['username'] for user in users]
+        ).values_list('username', flat=True))
+        new_users = []
+        for user in users:
+            if user['email'] in existing:
+                self.user_ids[user['id']] = existing[user['email']]
+                continue
+            username = user['username']
+            if username in taken_usernames:
+                username = f'{username}-{user["id"]}'
+            new_users.append((user['id'], User(
+                email=user['email'],
+                username=username,
+                first_name=user['first_name'],
+                last_name=user['last_name'],
+                password=make_password(None),
+            )))
+        User.objects.bulk_create(user for _, user in new_users)
+        for old_id, user in new_users:
+            self.user_ids[old_id] = user.id
+        self.stats['users'] += len(new_users)
+
+    @transaction.atomic
+    def _load_ingredients(self, ingredients):
+        existing = {
+            (name, unit): ingredient_id
+            for ingredient_id, name, unit in Ingredient.objects.filter(
+                name__in=[ingredient['name'] for ingredient in ingredients]
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+        new_ingredients = [
+            (ingredient['id'], Ingredient(
+                name=ingredient['name'],
+                measurement_unit=ingredient['measurement_unit']
+            ))
+            for ingredient in ingredients
+            if _ingredient_key(ingredient) not in existing
+        ]
+        Ingredient.objects.bulk_create(
+            ingredient for _, ingredient in new_ingredients
+        )
+        for ingredient in ingredients:
+            if _ingredient_key(ingredient) in existing:
+                self.ingredient_ids[ingredient['id']] = existing[
+                    _ingredient_key(ingredient)
+                ]
+        for old_id, ingredient in new_ingredients:
+            self.ingredient_ids[old_id] = ingredient.id
+        self.stats['ingredients'] += len(new_ingredients)
+
+    @transaction.atomic
+    def _load_recipes(self, items):
+        recipes = [
+            Recipe(
+                name=item['name'],
+                text=item['text'],
+                image=item['image'],
+                cooking_time=item['cooking_time'],
+                author_id=self.user_ids[item['author_id']],
+                ingredient_ids=sorted(
+                    self.ingredient_ids[ingredient['id']]
+                    for ingredient in item['ingredients']
+                ),
+            )
+            for item in items
+        ]
+        Recipe.objects.bulk_create(recipes)
+        '''bulk_create проставляет created_at текущим временем,
+        поэтому исходные даты возвращаются отдельным запросом'''
+        for recipe, item in zip(recipes, items):
+            recipe.created_at = item['created_at']
+        Recipe.objects.bulk_update(recipes, ['created_at'])
+
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient_id=self.ingredient_ids[ingredient['id']],
+                amount=ingredient['amount']
+            )
+            for recipe, item in zip(recipes, items)
+            for ingredient in item['ingredients']
+        )
+        Favorite.objects.bulk_create(
+            Favorite(recipe=recipe, user_id=self.user_ids[user_id])
+            for recipe, item in zip(recipes, items)
+            for user_id in item['favorited_by']
+        )
+        carts = defaultdict(list)
+        for recipe, item in zip(recipes, items):
+            for user_id in item['in_shopping_cart_of']:
+                carts[self.user_ids[user_id]].append(recipe.id)
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(recipe_id=recipe_id, user_id=user_id)
+            for user_id, recipe_ids in carts.items()
+            for recipe_id in recipe_ids
+        )
+        for user_id, recipe_ids in carts.items():
+            ShoppingListItem.objects.add_recipes(user_id, recipe_ids)
+        RecipeCard.objects.refresh(recipe.id for recipe in recipes)
+        self.stats['recipes'] += len(recipes)
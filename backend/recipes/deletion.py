@@ -0,0 +1,178 @@
+"""
+Удаление рецептов и пользователей без сборщика Django, который читает
+в память все связанные строки и удаляет их в одной долгой транзакции.
+
+Рецепты удаляются одним DELETE: состав, избранное, корзины и похожие
+рецепты удаляет каскадом сама база (миграция 0028), итоги списков
+покупок пересчитываются заранее одним запросом. Строки пользователя
+удаляются пачками в отдельных транзакциях фоновой задачей.
+Файлы изображений удаляются после коммита
+"""
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from rest_framework.authtoken.models import Token
+from users.models import AuthorRecommendation, Subscription, User
+
+from .models import (
+    Favorite,
+    Recipe,
+    RecipeCard,
+    ShoppingCart,
+    ShoppingListItem,
+)
+
+logger = logging.getLogger(__name__)
+
+'''Отправляется после коммита удаления рецептов с аргументом recipe_ids'''
+recipes_deleted = Signal()
+
+
+def delete_files(field, names):
+    """Удаляет файлы поля модели из хранилища"""
+    for name in names:
+        if name:
+            field.storage.delete(name)
+
+
+def delete_recipes(recipe_ids):
+    """
+    Удаляет рецепты и все связанные с ними строки.
+    Возвращает число удалённых рецептов
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return 0
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        '''Блокировка рецептов не даёт параллельно добавить их
+        в корзину между пересчётом списков покупок и удалением'''
+        cursor.execute(
+            f'SELECT id FROM {table} WHERE id = ANY(%s) '
+            'ORDER BY id FOR UPDATE',
+            [recipe_ids]
+        )
+        ShoppingListItem.objects.remove_recipes_from_carts(recipe_ids)
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id = ANY(%s) RETURNING id, image',
+            [recipe_ids]
+        )
+        deleted = cursor.fetchall()
+        transaction.on_commit(partial(
+            delete_files,
+            Recipe._meta.get_field('image'),
+            [image for _, image in deleted]
+        ))
+        transaction.on_commit(partial(
+            recipes_deleted.send,
+            sender=Recipe,
+            recipe_ids=[recipe_id for recipe_id, _ in deleted]
+        ))
+    return len(deleted)
+
+
+def delete_in_batches(queryset, batch_size):
+    """
+    Удаляет строки queryset пачками по batch_size, каждую в своей
+    транзакции, без загрузки объектов и без сигналов.
+    Счётчики карточек рецептов уменьшаются в транзакции пачки,
+    поэтому повтор после прерванного удаления не вычтет их дважды.
+    Возвращает число удалённых строк
+    """
+    model = queryset.model
+    counted = model in RecipeCard.objects.COUNTERS.values()
+    quote_name = connection.ops.quote_name
+    ids = queryset.order_by().values_list('pk', flat=True)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(ids[:batch_size])
+            if not batch:
+                return deleted
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {quote_name(model._meta.db_table)} '
+                    f'WHERE {quote_name(model._meta.pk.column)} = ANY(%s)'
+                    + (' RETURNING recipe_id' if counted else ''),
+                    [batch]
+                )
+                deleted += cursor.rowcount
+                if counted:
+                    RecipeCard.objects.subtract_removed(
+                        model, [row[0] for row in cursor.fetchall()]
+                    )
+
+
+def log_progress(stage, count):
+    logger.info('Удаление: %s - %s', stage, count)
+
+
+def deactivate_user(user):
+    """
+    Закрывает пользователю вход до фонового удаления:
+    деактивирует его и удаляет токены
+    """
+    if user.is_active:
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+    Token.objects.filter(user=user).delete()
+
+
+def delete_user(user_id, batch_size=None, progress=log_progress):
+    """
+    Удаляет пользователя: рецепты - группами по RECIPES_PER_BATCH,
+    остальные связанные строки - пачками по batch_size.
+    Прогресс передаётся в progress(этап, число удалённых строк)
+    """
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    deactivate_user(user)
+    batch_size = batch_size or settings.DELETION['BATCH_SIZE']
+
+    recipes = Recipe.objects.filter(author_id=user_id).order_by('id')
+    deleted = 0
+    while True:
+        batch = list(recipes.values_list('id', flat=True)[
+            :settings.DELETION['RECIPES_PER_BATCH']
+        ])
+        if not batch:
+            break
+        deleted += delete_recipes(batch)
+        progress('рецепты', deleted)
+
+    '''Итоги списка покупок удаляются целиком, поэтому корзина
+    удаляется без их пересчёта'''
+    for stage, queryset in (
+        ('избранное', Favorite.objects.filter(user_id=user_id)),
+        ('корзина', ShoppingCart.objects.filter(user_id=user_id)),
+        (
+            'список покупок',
+            ShoppingListItem.objects.filter(user_id=user_id)
+        ),
+        (
+            'подписки',
+            Subscription.objects.filter(
+                Q(user_id=user_id) | Q(author_id=user_id)
+            )
+        ),
+        (
+            'рекомендации',
+            AuthorRecommendation.objects.filter(
+                Q(user_id=user_id) | Q(author_id=user_id)
+            )
+        ),
+    ):
+        progress(stage, delete_in_batches(queryset, batch_size))
+
+    with transaction.atomic():
+        avatar = user.avatar.name
+        user.delete()
+        transaction.on_commit(partial(
+            delete_files, User._meta.get_field('avatar'), [avatar]
+        ))
+    progress('пользователь', 1)
@@ -0,0 +1,179 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from recipes.matrices import (
+    idf_weights,
+    indexed_pairs_matrix,
+    normalize_rows,
+    product_chunks,
+    top_k_per_row,
+)
+from recipes.models import (
+    IngredientInRecipe,
+    Recipe,
+    RecipeNeighbor,
+    RecipeNeighborsComputed,
+)
+from scipy import sparse
+
+
+class Command(BaseCommand):
+    help = (
+        "Расчёт похожих рецептов по косинусной близости составов "
+        "с весами по обратной частоте ингредиентов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top-k", type=int, default=10,
+            help="Сколько похожих рецептов сохранять для каждого рецепта"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000,
+            help="Сколько рецептов обрабатывать за один шаг"
+        )
+        parser.add_argument(
+            "--max-products", type=int, default=5000000,
+            help=(
+                "Сколько значений близости держать в памяти за шаг: "
+                "рецепты с частыми ингредиентами (соль, вода) "
+                "обрабатываются меньшими шагами"
+            )
+        )
+        parser.add_argument(
+            "--changed-only", action="store_true",
+            help="Пересчитать только изменённые рецепты и их соседей"
+        )
+
+    def _build_matrix(self):
+        """
+        Строит разреженную матрицу рецепт x ингредиент с весами
+        idf = log(N / df) и нормированными строками. Рецепты и
+        ингредиенты берутся из тех же пар, что и матрица
+        """
+        recipe_ids, _, matrix = indexed_pairs_matrix(
+            IngredientInRecipe.objects.values_list(
+                "recipe_id", "ingredient_id"
+            ).order_by().iterator(chunk_size=10000)
+        )
+        matrix = matrix @ sparse.diags(idf_weights(matrix))
+        matrix.eliminate_zeros()
+        return recipe_ids, normalize_rows(matrix)
+
+    def _thresholds(self, recipe_ids, top_k):
+        """
+        Наименьшая близость в текущем списке похожих каждого рецепта;
+        0, если в списке меньше top_k рецептов
+        """
+        thresholds = np.zeros(len(recipe_ids))
+        full = RecipeNeighbor.objects.values("recipe_id").annotate(
+            count=Count("id"), lowest=Min("score")
+        ).filter(count__gte=top_k).values_list("recipe_id", "lowest")
+        for recipe_id, lowest in full.iterator(chunk_size=10000):
+            row = np.searchsorted(recipe_ids, recipe_id)
+            if row < len(recipe_ids) and recipe_ids[row] == recipe_id:
+                thresholds[row] = lowest
+        return thresholds
+
+    def _changed_recipe_ids(self, recipe_ids, matrix, transposed, options):
+        """
+        Изменённые с последнего расчёта рецепты и рецепты, чей список
+        похожих от них зависит: бывшие соседи изменённых и рецепты,
+        в чей список изменённый входит по новой близости (она не ниже
+        последнего места списка). Близость считается только
+        для строк изменённых рецептов. Сдвиг весов idf у остальных
+        рецептов не отслеживается: его исправляет полный пересчёт
+        """
+        changed = set(
+            Recipe.objects.filter(
+                Q(neighbors_computed__isnull=True)
+                | Q(updated_at__gt=F("neighbors_computed__computed_at"))
+            ).values_list("id", flat=True)
+        )
+        affected = set(
+            RecipeNeighbor.objects.filter(
+                neighbor_id__in=changed
+            ).values_list("recipe_id", flat=True)
+        )
+        thresholds = self._thresholds(recipe_ids, options["top_k"])
+        for chunk in product_chunks(
+            matrix, np.flatnonzero(np.isin(recipe_ids, list(changed))),
+            options["chunk_size"], options["max_products"]
+        ):
+            similarity = (matrix[chunk] @ transposed).tocoo()
+            entered = (similarity.data > 0) & (
+                similarity.data >= thresholds[similarity.col]
+            )
+            affected.update(recipe_ids[similarity.col[entered]].tolist())
+        return changed | affected
+
+    @staticmethod
+    def _mark_computed(recipe_ids, computed_at):
+        RecipeNeighborsComputed.objects.filter(
+            recipe_id__in=recipe_ids
+        ).delete()
+        RecipeNeighborsComputed.objects.bulk_create(
+            RecipeNeighborsComputed(
+                recipe_id=recipe_id, computed_at=computed_at
+            )
+            for recipe_id in recipe_ids
+        )
+
+    def handle(self, *args, **options):
+        top_k = options["top_k"]
+        '''Отметка ставится временем до чтения составов, поэтому правка
+        во время расчёта попадёт в следующий пересчёт'''
+        started_at = timezone.now()
+        recipe_ids, matrix = self._build_matrix()
+        transposed = matrix.T.tocsr()
+        if options["changed_only"]:
+            targets = self._changed_recipe_ids(
+                recipe_ids, matrix, transposed, options
+            )
+            rows = np.flatnonzero(np.isin(recipe_ids, list(targets)))
+        else:
+            targets = None
+            rows = np.arange(len(recipe_ids))
+
+        '''У рецептов без ингредиентов похожих нет'''
+        empty = Recipe.objects.exclude(id__in=recipe_ids.tolist())
+        if targets is not None:
+            empty = empty.filter(id__in=targets)
+        empty_ids = list(empty.values_list("id", flat=True))
+        with transaction.atomic():
+            RecipeNeighbor.objects.filter(recipe_id__in=empty_ids).delete()
+            self._mark_computed(empty_ids, started_at)
+
+        done = 0
+        for chunk in product_chunks(
+            matrix, rows, options["chunk_size"], options["max_products"]
+        ):
+            similarity = (matrix[chunk] @ transposed).tocoo()
+            '''Рецепт не должен попадать в список похожих на самого себя'''
+            similarity.data[similarity.col == chunk[similarity.row]] = 0
+            chunk_rows, columns, scores = top_k_per_row(similarity, top_k)
+            computed_at = timezone.now()
+            with transaction.atomic():
+                RecipeNeighbor.objects.filter(
+                    recipe_id__in=recipe_ids[chunk].tolist()
+                ).delete()
+                RecipeNeighbor.objects.bulk_create(
+                    RecipeNeighbor(
+                        recipe_id=recipe_id,
+                        neighbor_id=neighbor_id,
+                        score=score,
+                        computed_at=computed_at
+                    )
+                    for recipe_id, neighbor_id, score in zip(
+                        recipe_ids[chunk[chunk_rows]].tolist(),
+                        recipe_ids[columns].tolist(),
+                        scores.tolist()
+                    )
+                )
+                self._mark_computed(recipe_ids[chunk].tolist(), started_at)
+            done += len(chunk)
+            self.stdout.write(f"Обработано рецептов: {done} из {len(rows)}")
+
+        self.stdout.write(self.style.SUCCESS("Похожие рецепты рассчитаны"))
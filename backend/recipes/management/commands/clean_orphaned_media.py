@@ -0,0 +1,166 @@
+import heapq
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Collate
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаление или перенос в карантин файлов изображений рецептов "
+        "и аватаров, на которые не ссылается ни одна запись в базе"
+    )
+
+    '''Поля с файлами: сравнение идёт только в их каталогах upload_to'''
+    FILE_FIELDS = (
+        (Recipe, "image"),
+        (User, "avatar"),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Только показать файлы-сироты, ничего не удаляя"
+        )
+        parser.add_argument(
+            "--quarantine", default=None,
+            help="Переносить файлы в этот каталог вместо удаления"
+        )
+        parser.add_argument(
+            "--min-age", type=int, default=60,
+            help="Не трогать файлы моложе указанного числа минут"
+        )
+        parser.add_argument(
+            "--rate", type=float, default=500,
+            help="Не больше указанного числа файловых операций в секунду"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=50000,
+            help="Сколько имён файлов сортировать в памяти за раз"
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.started = time.monotonic()
+        self.operations = 0
+        self.stats = {"files": 0, "orphans": 0, "young": 0, "bytes": 0}
+        for model, field_name in self.FILE_FIELDS:
+            directory = model._meta.get_field(field_name).upload_to
+            self._collect(model, field_name, directory.strip("/"))
+        action = (
+            "Найдено" if options["dry_run"]
+            else "Перенесено в карантин" if options["quarantine"]
+            else "Удалено"
+        )
+        self.stdout.write(
+            f"Проверено файлов: {self.stats['files']}. "
+            f"{action} файлов-сирот: {self.stats['orphans']} "
+            f"({self.stats['bytes'] / 2 ** 20:.1f} МБ), "
+            f"пропущено свежих: {self.stats['young']}"
+        )
+
+    def _collect(self, model, field_name, directory):
+        """
+        Сравнивает слиянием два отсортированных потока: пути из базы
+        (сортирует PostgreSQL) и пути файлов (внешняя сортировка),
+        поэтому память не зависит от числа файлов и записей
+        """
+        root = os.path.join(settings.MEDIA_ROOT, directory)
+        if not os.path.isdir(root):
+            return
+        references = (
+            model.objects.filter(**{f"{field_name}__startswith": directory})
+            .order_by(Collate(field_name, "C"))
+            .values_list(field_name, flat=True)
+            .iterator(chunk_size=self.options["chunk_size"])
+        )
+        reference = next(references, None)
+        for path in self._sorted_files(root, directory):
+            self.stats["files"] += 1
+            while reference is not None and reference < path:
+                reference = next(references, None)
+            if reference != path:
+                self._remove(path)
+
+    def _scan(self, root, directory):
+        """Обходит каталог через os.scandir без рекурсии"""
+        stack = [(root, directory)]
+        while stack:
+            path, relative = stack.pop()
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    self._throttle()
+                    name = f"{relative}/{entry.name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, name))
+                    elif entry.is_file(follow_symlinks=False):
+                        if "\n" not in name:
+                            yield name
+
+    def _sorted_files(self, root, directory):
+        """
+        Внешняя сортировка путей: порции по chunk_size сортируются
+        в памяти и пишутся во временные файлы, затем сливаются
+        """
+        runs = []
+        chunk = []
+        try:
+            for name in self._scan(root, directory):
+                chunk.append(name)
+                if len(chunk) >= self.options["chunk_size"]:
+                    runs.append(self._write_run(chunk))
+                    chunk = []
+            chunk.sort()
+            yield from heapq.merge(
+                chunk,
+                *((line.rstrip("\n") for line in run) for run in runs)
+            )
+        finally:
+            for run in runs:
+                run.close()
+
+    @staticmethod
+    def _write_run(chunk):
+        run = tempfile.TemporaryFile("w+", encoding="utf-8")
+        run.writelines(f"{name}\n" for name in sorted(chunk))
+        run.seek(0)
+        return run
+
+    def _remove(self, name):
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        '''Свежий файл может принадлежать ещё не сохранённой записи'''
+        if time.time() - stat.st_mtime < self.options["min_age"] * 60:
+            self.stats["young"] += 1
+            return
+        self.stats["orphans"] += 1
+        self.stats["bytes"] += stat.st_size
+        if self.options["dry_run"]:
+            self.stdout.write(name)
+            return
+        self._throttle()
+        if self.options["quarantine"]:
+            target = os.path.join(self.options["quarantine"], name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            os.remove(path)
+
+    def _throttle(self):
+        """Ограничивает число файловых операций в секунду"""
+        self.operations += 1
+        delay = (
+            self.operations / self.options["rate"]
+            - (time.monotonic() - self.started)
+        )
+        if delay > 0:
+            time.sleep(delay)
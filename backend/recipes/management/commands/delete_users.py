@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.deletion import delete_user
+from recipes.tasks import schedule_user_deletion
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаление пользователей со всеми рецептами, подписками "
+        "и избранным пачками в отдельных транзакциях"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("user_ids", nargs="+", type=int)
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="Строк в одной транзакции (по умолчанию DELETION_BATCH_SIZE)"
+        )
+        parser.add_argument(
+            "--background", action="store_true",
+            help="Поставить удаление в очередь фоновых задач"
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(pk__in=options["user_ids"])
+        missing = set(options["user_ids"]) - {user.pk for user in users}
+        if missing:
+            raise CommandError(
+                f"Пользователи не найдены: {sorted(missing)}"
+            )
+        for user in users:
+            if options["background"]:
+                schedule_user_deletion(user)
+                self.stdout.write(f"{user}: удаление поставлено в очередь")
+                continue
+            delete_user(
+                user.pk,
+                options["batch_size"],
+                progress=lambda stage, count, user=user: self.stdout.write(
+                    f"{user}: {stage} - удалено {count}"
+                )
+            )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from recipes.corpus import export_corpus
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка корпуса рецептов в формате NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", help="Файл для выгрузки (по умолчанию stdout)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        lines = export_corpus(options["chunk_size"])
+        if not options["output"]:
+            self.stdout.writelines(lines)
+            return
+        with open(options["output"], "w", encoding="utf-8") as output:
+            output.writelines(lines)
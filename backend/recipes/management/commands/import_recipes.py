@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from recipes.corpus import CorpusImporter
+
+
+class Command(BaseCommand):
+    help = "Загрузка корпуса рецептов из NDJSON с переназначением id"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл NDJSON")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with open(options["path"], encoding="utf-8") as file:
+            stats = CorpusImporter(options["batch_size"]).load(file)
+        self.stdout.write(self.style.SUCCESS(
+            "Создано: " + ", ".join(
+                f"{name}: {count}" for name, count in stats.items()
+            )
+        ))
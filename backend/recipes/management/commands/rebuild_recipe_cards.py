@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe, RecipeCard
+
+
+class Command(BaseCommand):
+    help = (
+        "Полная пересборка карточек рецептов из рецептов, авторов, "
+        "состава, избранного и корзин пачками в отдельных транзакциях"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="Рецептов в одной транзакции, по умолчанию из настроек"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = (
+            options["batch_size"] or settings.RECIPE_CARDS["BATCH_SIZE"]
+        )
+        recipe_ids = Recipe.objects.order_by("id").values_list(
+            "id", flat=True
+        )
+        total = recipe_ids.count()
+        done = 0
+        last_id = 0
+        while True:
+            batch = list(recipe_ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                RecipeCard.objects.refresh(batch, counters=True)
+            last_id = batch[-1]
+            done += len(batch)
+            self.stdout.write(f"Карточек пересобрано: {done} из {total}")
+        self.stdout.write(
+            f"Готово, карточек всего: {RecipeCard.objects.count()}"
+        )
@@ -0,0 +1,125 @@
+import numpy as np
+from scipy import sparse
+
+
+def pairs_array(pairs):
+    """Массив n x 2 из пар (id строки, id столбца)"""
+    return np.fromiter(
+        (value for pair in pairs for value in pair), dtype=np.int64
+    ).reshape(-1, 2)
+
+
+def pairs_matrix(pairs, row_ids, column_ids):
+    """
+    Строит разреженную матрицу из пар (id строки, id столбца),
+    где row_ids и column_ids - отсортированные массивы всех id
+    """
+    pairs = pairs_array(pairs)
+    return sparse.csr_matrix(
+        (
+            np.ones(len(pairs)),
+            (
+                np.searchsorted(row_ids, pairs[:, 0]),
+                np.searchsorted(column_ids, pairs[:, 1])
+            )
+        ),
+        shape=(len(row_ids), len(column_ids))
+    )
+
+
+def indexed_pairs_matrix(pairs):
+    """
+    Строит разреженную матрицу из пар (id строки, id столбца)
+    и возвращает (id строк, id столбцов, матрица). Индексы берутся
+    из самих пар, поэтому не расходятся с ними, даже если пары
+    меняются в базе во время чтения
+    """
+    pairs = pairs_array(pairs)
+    row_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    column_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    return row_ids, column_ids, sparse.csr_matrix(
+        (np.ones(len(pairs)), (rows, columns)),
+        shape=(len(row_ids), len(column_ids))
+    )
+
+
+def product_chunks(matrix, rows, max_rows, max_products):
+    """
+    Делит строки rows на шаги для умножения matrix[шаг] @ matrix.T:
+    не больше max_rows строк и не больше max_products ненулевых
+    значений в произведении по оценке сверху (сумма частот столбцов
+    строки). Строка дороже max_products идёт отдельным шагом
+    """
+    frequency = matrix.getnnz(axis=0)
+    costs = np.asarray(abs(matrix[rows]).sign() @ frequency).ravel()
+    start, total = 0, 0
+    for end, cost in enumerate(costs):
+        if end > start and (
+            end - start >= max_rows or total + cost > max_products
+        ):
+            yield rows[start:end]
+            start, total = end, 0
+        total += cost
+    if start < len(rows):
+        yield rows[start:]
+
+
+def idf_weights(matrix):
+    """Возвращает веса столбцов log(N / df) для матрицы вхождений"""
+    document_frequency = matrix.getnnz(axis=0)
+    return np.log(
+        matrix.shape[0] / np.maximum(document_frequency, 1)
+    ) * (document_frequency > 0)
+
+
+def normalize_rows(matrix):
+    """Нормирует строки разреженной матрицы по длине вектора"""
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+def top_k_per_row(matrix, top_k):
+    """
+    Возвращает массивы (строки, столбцы, значения) top_k наибольших
+    положительных значений каждой строки, упорядоченные по строке
+    и убыванию значения
+    """
+    matrix = matrix.tocoo()
+    positive = matrix.data > 0
+    rows = matrix.row[positive]
+    columns = matrix.col[positive]
+    values = matrix.data[positive]
+    order = np.lexsort((-values, rows))
+    rows, columns, values = rows[order], columns[order], values[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    best = rank < top_k
+    return rows[best], columns[best], values[best]
+
+
+def sample_row_entries(matrix, limit, seed=0):
+    """
+    Оставляет в каждой строке разреженной матрицы не больше limit
+    случайно выбранных значений (выбор повторяем при том же seed)
+    """
+    matrix = matrix.tocoo()
+    keys = np.random.default_rng(seed).random(matrix.nnz)
+    order = np.lexsort((keys, matrix.row))
+    rows = matrix.row[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    kept = order[rank < limit]
+    return sparse.csr_matrix(
+        (matrix.data[kept], (matrix.row[kept], matrix.col[kept])),
+        shape=matrix.shape
+    )
+
+
+def prune_rows(matrix, top_k):
+    """Оставляет в каждой строке top_k наибольших положительных значений"""
+    rows, columns, values = top_k_per_row(matrix, top_k)
+    return sparse.csr_matrix((values, (rows, columns)), shape=matrix.shape)
+
+
+def row_dot(left, right):
+    """Скалярные произведения соответствующих строк двух матриц"""
+    return np.asarray(left.multiply(right).sum(axis=1)).ravel()
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:24
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """Удаляет повторные записи избранного и корзины перед
+    добавлением ограничений уникальности"""
+    affected_users = set()
+    for model_name in ('Favorite', 'ShoppingCart'):
+        model = apps.get_model('recipes', model_name)
+        duplicates = model.objects.values('user', 'recipe').annotate(
+            first_id=models.Min('id'),
+            count=models.Count('id'),
+        ).filter(count__gt=1).order_by()
+        for duplicate in duplicates.iterator():
+            model.objects.filter(
+                user=duplicate['user'],
+                recipe=duplicate['recipe'],
+            ).exclude(id=duplicate['first_id']).delete()
+            if model_name == 'ShoppingCart':
+                affected_users.add(duplicate['user'])
+    for user_id in affected_users:
+        refill_shopping_list(apps, user_id)
+
+
+def refill_shopping_list(apps, user_id):
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    ShoppingListItem.objects.filter(user_id=user_id).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user_id, **item)
+        for item in ShoppingCart.objects.filter(
+            user_id=user_id,
+            recipe__recipe_ingredients__isnull=False
+        ).values(
+            ingredient_id=models.F('recipe__recipe_ingredients__ingredient'),
+        ).annotate(
+            amount=models.Sum('recipe__recipe_ingredients__amount'),
+            recipes_count=models.Count('recipe'),
+        ).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0022_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:31
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0024_unique_user_recipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, editable=False, size=None, verbose_name='Id ингредиентов'),
+        ),
+        migrations.RunSQL(
+            'UPDATE recipes_recipe AS recipe SET ingredient_ids = ARRAY('
+            'SELECT ingredient_id FROM recipes_ingredientinrecipe '
+            'WHERE recipe_id = recipe.id ORDER BY ingredient_id)',
+            migrations.RunSQL.noop
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='recipe_ingredient_ids_gin'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0025_recipe_ingredient_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.CreateModel(
+            name='RecipeNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Близость')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчёта')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='recipes.recipe', verbose_name='Похожий рецепт')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+                'ordering': ('-score',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipeneighbor',
+            index=models.Index(fields=['recipe', '-score'], name='recipe_neighbor_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeneighbor',
+            constraint=models.UniqueConstraint(fields=('recipe', 'neighbor'), name='unique_recipe_neighbor'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Индексы под запросы API: лента рецептов и страница автора
+    с сортировкой по дате, поиск продуктов по началу названия
+    (name__istartswith строит UPPER(name::text) LIKE ...).
+    Индексы создаются без блокировки записи в таблицы
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0026_recipeneighbor'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(
+                fields=['-created_at'], name='recipe_created_at_idx'
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(
+                fields=['author', '-created_at'],
+                name='recipe_author_created_at_idx'
+            ),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+            'ingredient_name_upper_like_idx ON recipes_ingredient '
+            '(UPPER(name::text) text_pattern_ops)',
+            'DROP INDEX CONCURRENTLY IF EXISTS ingredient_name_upper_like_idx',
+        ),
+    ]
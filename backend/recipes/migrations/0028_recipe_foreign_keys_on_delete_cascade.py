@@ -0,0 +1,68 @@
+from django.db import migrations
+
+'''Внешние ключи на рецепт, которые каскадно удаляет сама база:
+recipes.deletion.delete_recipes удаляет рецепты одним DELETE
+без обхода связанных строк сборщиком Django'''
+CASCADES = (
+    ('IngredientInRecipe', 'recipe'),
+    ('Favorite', 'recipe'),
+    ('ShoppingCart', 'recipe'),
+    ('RecipeNeighbor', 'recipe'),
+    ('RecipeNeighbor', 'neighbor'),
+)
+
+
+def set_on_delete(action):
+    def alter_foreign_keys(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'postgresql':
+            return
+        quote_name = schema_editor.quote_name
+        for model_name, field_name in CASCADES:
+            model = apps.get_model('recipes', model_name)
+            field = model._meta.get_field(field_name)
+            table = model._meta.db_table
+            target = field.related_model._meta
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(
+                    cursor, table
+                )
+            for name, constraint in constraints.items():
+                if not (
+                    constraint['foreign_key']
+                    and constraint['columns'] == [field.column]
+                ):
+                    continue
+                '''NOT VALID и отдельная проверка: таблица не блокируется
+                на запись на время проверки существующих строк'''
+                schema_editor.execute(
+                    f'ALTER TABLE {quote_name(table)} '
+                    f'DROP CONSTRAINT {quote_name(name)}, '
+                    f'ADD CONSTRAINT {quote_name(name)} '
+                    f'FOREIGN KEY ({quote_name(field.column)}) '
+                    f'REFERENCES {quote_name(target.db_table)} '
+                    f'({quote_name(target.pk.column)}) {action} '
+                    'DEFERRABLE INITIALLY DEFERRED NOT VALID'
+                )
+                schema_editor.execute(
+                    f'ALTER TABLE {quote_name(table)} '
+                    f'VALIDATE CONSTRAINT {quote_name(name)}'
+                )
+
+    return alter_foreign_keys
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0027_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            set_on_delete('ON DELETE CASCADE'),
+            set_on_delete('ON DELETE NO ACTION'),
+        ),
+    ]
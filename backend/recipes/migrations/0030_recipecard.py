@@ -0,0 +1,80 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:53
+
+from django.conf import settings
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+FILL_CARDS = (
+    'INSERT INTO recipes_recipecard (recipe_id, name, text, image, '
+    'cooking_time, created_at, updated_at, author_id, author_username, '
+    'author_first_name, author_last_name, author_email, author_avatar, '
+    'ingredient_ids, ingredients, favorites_count, shoppingcarts_count) '
+    'SELECT recipe.id, recipe.name, recipe.text, recipe.image, '
+    'recipe.cooking_time, recipe.created_at, recipe.updated_at, author.id, '
+    'author.username, author.first_name, author.last_name, author.email, '
+    'author.avatar, recipe.ingredient_ids, COALESCE(('
+    'SELECT jsonb_agg(jsonb_build_array(ingredient.id, ingredient.name, '
+    'ingredient.measurement_unit, link.amount) ORDER BY link.id) '
+    'FROM recipes_ingredientinrecipe AS link '
+    'JOIN recipes_ingredient AS ingredient '
+    'ON ingredient.id = link.ingredient_id '
+    "WHERE link.recipe_id = recipe.id), '[]'::jsonb), "
+    '(SELECT count(*) FROM recipes_favorite WHERE recipe_id = recipe.id), '
+    '(SELECT count(*) FROM recipes_shoppingcart '
+    'WHERE recipe_id = recipe.id) '
+    'FROM recipes_recipe AS recipe '
+    'JOIN users_user AS author ON author.id = recipe.author_id'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0029_partition_favorite_shoppingcart'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeCard',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('name', models.CharField(max_length=256, verbose_name='Название')),
+                ('text', models.TextField(verbose_name='Описание')),
+                ('image', models.CharField(max_length=100, verbose_name='Картинка')),
+                ('cooking_time', models.IntegerField(verbose_name='Время приготовления (в минутах)')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата изменения')),
+                ('author_username', models.CharField(max_length=150)),
+                ('author_first_name', models.CharField(max_length=150)),
+                ('author_last_name', models.CharField(max_length=150)),
+                ('author_email', models.CharField(max_length=254)),
+                ('author_avatar', models.CharField(max_length=100, null=True)),
+                ('ingredient_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None, verbose_name='Id ингредиентов')),
+                ('ingredients', models.JSONField(default=list, verbose_name='Состав')),
+                ('favorites_count', models.IntegerField(default=0, verbose_name='В избранном')),
+                ('shoppingcarts_count', models.IntegerField(default=0, verbose_name='В корзинах')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_cards', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Карточка рецепта',
+                'verbose_name_plural': 'Карточки рецептов',
+                'ordering': ('-created_at', '-recipe_id'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipecard',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='card_ingredient_ids_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='recipecard',
+            index=models.Index(fields=['-created_at', '-recipe'], name='card_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipecard',
+            index=models.Index(fields=['author', '-created_at', '-recipe'], name='card_author_created_at_idx'),
+        ),
+        migrations.RunSQL(FILL_CARDS, migrations.RunSQL.noop),
+    ]
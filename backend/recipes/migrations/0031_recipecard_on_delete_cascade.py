@@ -0,0 +1,37 @@
+from django.db import migrations
+
+'''Карточку удаляет сама база вместе с рецептом:
+recipes.deletion.delete_recipes удаляет рецепты одним DELETE'''
+
+
+def cascade_recipe_deletion(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, 'recipes_recipecard'
+        )
+    for name, constraint in constraints.items():
+        if constraint['foreign_key'] and constraint['columns'] == [
+            'recipe_id'
+        ]:
+            schema_editor.execute(
+                f'ALTER TABLE recipes_recipecard DROP CONSTRAINT "{name}", '
+                f'ADD CONSTRAINT "{name}" FOREIGN KEY (recipe_id) '
+                'REFERENCES recipes_recipe (id) ON DELETE CASCADE '
+                'DEFERRABLE INITIALLY DEFERRED'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0030_recipecard'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            cascade_recipe_deletion, migrations.RunPython.noop
+        ),
+    ]
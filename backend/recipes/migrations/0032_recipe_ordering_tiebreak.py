@@ -0,0 +1,48 @@
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Рецепты с одинаковой датой создания упорядочиваются по id: порядок
+    страниц устойчив и совпадает у рецептов и их карточек. Новые индексы
+    создаются без блокировки записи до удаления старых
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0031_recipecard_on_delete_cascade'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'default_related_name': 'recipes', 'ordering': ('-created_at', '-id'), 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(
+                fields=['-created_at', '-id'],
+                name='recipe_created_at_id_idx'
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(
+                fields=['author', '-created_at', '-id'],
+                name='recipe_author_created_id_idx'
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name='recipe',
+            name='recipe_created_at_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='recipe',
+            name='recipe_author_created_at_idx',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0032_recipe_ordering_tiebreak'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNeighborsComputed',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbors_computed', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчёта')),
+            ],
+            options={
+                'verbose_name': 'Расчёт похожих рецептов',
+                'verbose_name_plural': 'Расчёты похожих рецептов',
+            },
+        ),
+    ]
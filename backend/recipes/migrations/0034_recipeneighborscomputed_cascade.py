@@ -0,0 +1,44 @@
+from django.db import migrations
+
+'''Отметку расчёта удаляет сама база вместе с рецептом:
+recipes.deletion.delete_recipes удаляет рецепты одним DELETE.
+Рецептам с уже рассчитанными похожими ставится дата этого расчёта,
+чтобы первый пересчёт изменённых не затронул все рецепты'''
+
+
+def cascade_and_mark_computed(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, 'recipes_recipeneighborscomputed'
+            )
+        for name, constraint in constraints.items():
+            if constraint['foreign_key'] and constraint['columns'] == [
+                'recipe_id'
+            ]:
+                schema_editor.execute(
+                    'ALTER TABLE recipes_recipeneighborscomputed '
+                    f'DROP CONSTRAINT "{name}", '
+                    f'ADD CONSTRAINT "{name}" FOREIGN KEY (recipe_id) '
+                    'REFERENCES recipes_recipe (id) ON DELETE CASCADE '
+                    'DEFERRABLE INITIALLY DEFERRED'
+                )
+    schema_editor.execute(
+        'INSERT INTO recipes_recipeneighborscomputed (recipe_id, computed_at) '
+        'SELECT recipe_id, MAX(computed_at) FROM recipes_recipeneighbor '
+        'GROUP BY recipe_id'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0033_recipeneighborscomputed'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            cascade_and_mark_computed, migrations.RunPython.noop
+        ),
+    ]
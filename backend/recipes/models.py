@@ -1,6 +1,9 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import MinValueValidator
-from django.db import models
-from users.models import User
+from django.db import connection, models
+from django.utils import timezone
+from users.models import User, UserRelationManager
 
 
 class Ingredient(models.Model):
@@ -30,6 +33,30 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
+class RecipeManager(models.Manager):
+    """Менеджер рецептов"""
+
+    def update_ingredient_ids(self, recipe_ids):
+        """
+        Пересобирает отсортированные массивы id ингредиентов рецептов
+        по их составу одним запросом
+        """
+        if not recipe_ids:
+            return
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {quote_name(self.model._meta.db_table)} AS recipe '
+                'SET ingredient_ids = ARRAY('
+                'SELECT ingredient_id FROM '
+                f'{quote_name(IngredientInRecipe._meta.db_table)} '
+                'WHERE recipe_id = recipe.id ORDER BY ingredient_id'
+                '), updated_at = %s WHERE recipe.id = ANY(%s)',
+                [timezone.now(), list(recipe_ids)]
+            )
+        RecipeCard.objects.refresh(recipe_ids)
+
+
 class Recipe(models.Model):
     """Модель рецептов"""
 
@@ -72,11 +99,42 @@ class Recipe(models.Model):
         verbose_name='Дата создания'
     )
 
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    ingredient_ids = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        editable=False,
+        verbose_name='Id ингредиентов'
+    )
+
+    '''Денормализованный отсортированный список id ингредиентов
+    с GIN-индексом: обратный индекс для поиска рецептов по продуктам'''
+
+    objects = RecipeManager()
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-created_at',)
+        ordering = ('-created_at', '-id')
         default_related_name = 'recipes'
+        indexes = [
+            GinIndex(
+                fields=['ingredient_ids'],
+                name='recipe_ingredient_ids_gin'
+            ),
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='recipe_created_at_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-created_at', '-id'],
+                name='recipe_author_created_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'ID рецепта: {self.id} | {self.name}'
@@ -122,6 +180,35 @@ class IngredientInRecipe(models.Model):
                 f'для {self.recipe.name}')
 
 
+class RecipeRelationManager(UserRelationManager):
+    """
+    Менеджер избранного и корзины покупок: массовые изменения идут
+    в обход сигналов, поэтому счётчики карточек рецептов меняются здесь же
+    """
+
+    def shift_card_counter(self, recipe_ids, delta):
+        column = next(
+            column for column, model in RecipeCard.objects.COUNTERS.items()
+            if model is self.model
+        )
+        RecipeCard.objects.shift_counter(column, recipe_ids, delta)
+
+    def add_many(self, user_id, target_ids):
+        added = super().add_many(user_id, target_ids)
+        self.shift_card_counter(added, 1)
+        return added
+
+    def copy_from(self, user_id, source_model):
+        added = super().copy_from(user_id, source_model)
+        self.shift_card_counter(added, 1)
+        return added
+
+    def remove_many(self, user_id, target_ids=None):
+        removed = super().remove_many(user_id, target_ids)
+        self.shift_card_counter(removed, -1)
+        return removed
+
+
 class UserOfRecipeBase(models.Model):
     """Базовый класс для Favorite и ShoppingCart"""
     user = models.ForeignKey(
@@ -137,6 +224,8 @@ class UserOfRecipeBase(models.Model):
         related_name='%(class)ss'
     )
 
+    objects = RecipeRelationManager()
+
     '''К сожалению я узнал, что default_related_name в Meta, 
     не поддерживает динамическое указание названия related_name,
     поэтому пришлось оставить related_name в ForeignKey'''
@@ -146,7 +235,7 @@ class UserOfRecipeBase(models.Model):
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
-                name='unique_user_recipe'
+                name='unique_user_recipe_%(class)s'
             )
         ]
 
@@ -157,14 +246,492 @@ class UserOfRecipeBase(models.Model):
 class Favorite(UserOfRecipeBase):
     """Модель избранных рецептов"""
 
-    class Meta:
+    class Meta(UserOfRecipeBase.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
 
 
+class ShoppingCartManager(RecipeRelationManager):
+    """
+    Менеджер корзины покупок: массовые изменения идут в обход сигналов,
+    поэтому итоги списка покупок обновляются здесь же
+    """
+
+    def add_many(self, user_id, target_ids):
+        added = super().add_many(user_id, target_ids)
+        ShoppingListItem.objects.add_recipes(user_id, added)
+        return added
+
+    def copy_from(self, user_id, source_model):
+        added = super().copy_from(user_id, source_model)
+        ShoppingListItem.objects.add_recipes(user_id, added)
+        return added
+
+    def remove_many(self, user_id, target_ids=None):
+        removed = super().remove_many(user_id, target_ids)
+        if target_ids is None:
+            ShoppingListItem.objects.filter(user_id=user_id).delete()
+        else:
+            ShoppingListItem.objects.remove_recipes(user_id, removed)
+        return removed
+
+
 class ShoppingCart(UserOfRecipeBase):
     """Модель корзины покупок"""
 
-    class Meta:
+    objects = ShoppingCartManager()
+
+    class Meta(UserOfRecipeBase.Meta):
         verbose_name = 'Корзина покупок'
         verbose_name_plural = 'Корзины покупок'
+
+
+class ShoppingListItemManager(models.Manager):
+    """Менеджер, поддерживающий итоги списка покупок в актуальном виде"""
+
+    BATCH_SIZE = 500
+
+    def _shift(self, deltas):
+        """
+        Применяет изменения {(id пользователя, id ингредиента):
+        (количество, число рецептов)} одним upsert-запросом на пачку
+        и удаляет ингредиенты, которые больше не нужны ни одному рецепту
+        """
+        rows = [
+            (user_id, ingredient_id, amount, recipes_count)
+            for (user_id, ingredient_id), (amount, recipes_count)
+            in deltas.items()
+            if amount or recipes_count
+        ]
+        if not rows:
+            return
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.BATCH_SIZE):
+                batch = rows[start:start + self.BATCH_SIZE]
+                cursor.execute(
+                    f'INSERT INTO {table} '
+                    '(user_id, ingredient_id, amount, recipes_count) '
+                    f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))} '
+                    'ON CONFLICT (user_id, ingredient_id) DO UPDATE SET '
+                    f'amount = {table}.amount + EXCLUDED.amount, '
+                    f'recipes_count = {table}.recipes_count '
+                    '+ EXCLUDED.recipes_count',
+                    [value for row in batch for value in row]
+                )
+        if any(row[3] < 0 for row in rows):
+            self.filter(
+                user_id__in={row[0] for row in rows},
+                recipes_count__lte=0
+            ).delete()
+
+    @staticmethod
+    def recipe_links(recipe_id):
+        """Возвращает пары (id ингредиента, количество) рецепта"""
+        return list(
+            IngredientInRecipe.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', 'amount')
+        )
+
+    def _shift_recipes(self, user_id, recipe_ids, sign):
+        deltas = {}
+        for ingredient_id, amount in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            total, count = deltas.get((user_id, ingredient_id), (0, 0))
+            deltas[(user_id, ingredient_id)] = (
+                total + sign * amount, count + sign
+            )
+        self._shift(deltas)
+
+    def add_recipes(self, user_id, recipe_ids):
+        """Добавляет ингредиенты рецептов в список покупок пользователя"""
+        if recipe_ids:
+            self._shift_recipes(user_id, recipe_ids, 1)
+
+    def remove_recipes(self, user_id, recipe_ids):
+        """Убирает ингредиенты рецептов из списка покупок пользователя"""
+        if recipe_ids:
+            self._shift_recipes(user_id, recipe_ids, -1)
+
+    def change_recipe(self, recipe, old_links, new_links):
+        """Пересчитывает списки покупок после изменения состава рецепта"""
+        old_links, new_links = dict(old_links), dict(new_links)
+        diff = {
+            ingredient_id: (
+                new_links.get(ingredient_id, 0)
+                - old_links.get(ingredient_id, 0),
+                (ingredient_id in new_links) - (ingredient_id in old_links)
+            )
+            for ingredient_id in old_links.keys() | new_links.keys()
+        }
+        self._shift({
+            (user_id, ingredient_id): delta
+            for user_id in recipe.shoppingcarts.values_list(
+                'user_id', flat=True
+            )
+            for ingredient_id, delta in diff.items()
+        })
+
+    def remove_recipes_from_carts(self, recipe_ids):
+        """
+        Убирает рецепты из итогов списков покупок всех пользователей,
+        у которых они в корзине, двумя запросами без чтения корзин в Python.
+        Вызывается перед удалением рецептов, пока корзины ещё существуют
+        """
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        carts = quote_name(ShoppingCart._meta.db_table)
+        links = quote_name(IngredientInRecipe._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} AS item SET '
+                'amount = item.amount - removed.amount, '
+                'recipes_count = item.recipes_count - removed.recipes_count '
+                'FROM (SELECT cart.user_id, link.ingredient_id, '
+                'SUM(link.amount) AS amount, COUNT(*) AS recipes_count '
+                f'FROM {carts} AS cart JOIN {links} AS link '
+                'ON link.recipe_id = cart.recipe_id '
+                'WHERE cart.recipe_id = ANY(%s) '
+                'GROUP BY cart.user_id, link.ingredient_id) AS removed '
+                'WHERE item.user_id = removed.user_id '
+                'AND item.ingredient_id = removed.ingredient_id',
+                [list(recipe_ids)]
+            )
+            cursor.execute(
+                f'DELETE FROM {table} WHERE recipes_count <= 0 '
+                f'AND user_id IN (SELECT user_id FROM {carts} '
+                'WHERE recipe_id = ANY(%s))',
+                [list(recipe_ids)]
+            )
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель итогового количества ингредиента в списке покупок пользователя.
+    Обновляется вместе с корзиной покупок и составом рецептов
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(verbose_name='Количество')
+    recipes_count = models.IntegerField(
+        verbose_name='Количество рецептов'
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Продукт списка покупок'
+        verbose_name_plural = 'Продукты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient'
+            )
+        ]
+        default_related_name = 'shopping_list_items'
+
+    def __str__(self):
+        return (f'{self.user.username}: {self.ingredient.name} - '
+                f'{self.amount}{self.ingredient.measurement_unit}')
+
+
+class RecipeNeighbor(models.Model):
+    """
+    Модель похожих рецептов. Заполняется командой build_similar_recipes
+    по косинусной близости составов рецептов
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbors',
+        verbose_name='Рецепт'
+    )
+    neighbor = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Близость')
+    computed_at = models.DateTimeField(verbose_name='Дата расчёта')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('-score',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'neighbor'],
+                name='unique_recipe_neighbor'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='recipe_neighbor_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.neighbor_id}: {self.score:.3f}'
+
+
+class RecipeNeighborsComputed(models.Model):
+    """
+    Дата последнего расчёта похожих для рецепта, в том числе когда
+    похожих не нашлось. Хранится отдельно от рецепта, чтобы отметки
+    расчёта не попадали в журнал изменений рецептов
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='neighbors_computed',
+        verbose_name='Рецепт'
+    )
+    computed_at = models.DateTimeField(verbose_name='Дата расчёта')
+
+    class Meta:
+        verbose_name = 'Расчёт похожих рецептов'
+        verbose_name_plural = 'Расчёты похожих рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.computed_at}'
+
+
+class RecipeCardManager(models.Manager):
+    """
+    Менеджер карточек рецептов: карточки пересобираются из рецептов,
+    авторов и состава одним upsert-запросом, счётчики избранного
+    и корзин меняются на число добавленных и удалённых связей
+    """
+
+    AUTHOR_FIELDS = ('username', 'first_name', 'last_name', 'email', 'avatar')
+    COUNTERS = {
+        'favorites_count': Favorite,
+        'shoppingcarts_count': ShoppingCart,
+    }
+
+    def refresh(self, recipe_ids, counters=False):
+        """
+        Создаёт или пересобирает карточки рецептов. Счётчики
+        существующих карточек пересчитываются только с counters=True:
+        иначе подсчёт по снимку запроса затёр бы сдвиг счётчика
+        от параллельно добавленной связи, ещё не видной в снимке
+        """
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        quote_name = connection.ops.quote_name
+        author_columns = [f'author_{name}' for name in self.AUTHOR_FIELDS]
+        columns = [
+            'recipe_id', 'name', 'text', 'image', 'cooking_time',
+            'created_at', 'updated_at', 'author_id', *author_columns,
+            'ingredient_ids', 'ingredients', *self.COUNTERS,
+        ]
+        updated = columns[1:] if counters else columns[1:-len(self.COUNTERS)]
+        counts = [
+            f'(SELECT count(*) FROM {quote_name(model._meta.db_table)} '
+            'WHERE recipe_id = recipe.id)'
+            for model in self.COUNTERS.values()
+        ]
+        '''Состав хранится массивами [id, название, единица, количество]
+        в порядке добавления: в jsonb ключи объектов переупорядочиваются'''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote_name(self.model._meta.db_table)} '
+                f'({", ".join(columns)}) '
+                'SELECT recipe.id, recipe.name, recipe.text, recipe.image, '
+                'recipe.cooking_time, recipe.created_at, recipe.updated_at, '
+                'author.id, '
+                + ', '.join(f'author.{name}' for name in self.AUTHOR_FIELDS)
+                + ', recipe.ingredient_ids, COALESCE(('
+                'SELECT jsonb_agg(jsonb_build_array(ingredient.id, '
+                'ingredient.name, ingredient.measurement_unit, link.amount) '
+                'ORDER BY link.id) '
+                f'FROM {quote_name(IngredientInRecipe._meta.db_table)} '
+                'AS link '
+                f'JOIN {quote_name(Ingredient._meta.db_table)} AS ingredient '
+                'ON ingredient.id = link.ingredient_id '
+                "WHERE link.recipe_id = recipe.id), '[]'::jsonb), "
+                + ', '.join(counts)
+                + f' FROM {quote_name(Recipe._meta.db_table)} AS recipe '
+                f'JOIN {quote_name(User._meta.db_table)} AS author '
+                'ON author.id = recipe.author_id '
+                'WHERE recipe.id = ANY(%s) '
+                'ON CONFLICT (recipe_id) DO UPDATE SET '
+                + ', '.join(
+                    f'{column} = EXCLUDED.{column}' for column in updated
+                ),
+                [recipe_ids]
+            )
+
+    def refresh_authors(self, author_ids):
+        """Обновляет в карточках изменившиеся поля профиля авторов"""
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} AS card SET '
+                + ', '.join(
+                    f'author_{name} = author.{name}'
+                    for name in self.AUTHOR_FIELDS
+                )
+                + f' FROM {quote_name(User._meta.db_table)} AS author '
+                'WHERE card.author_id = author.id '
+                'AND author.id = ANY(%s) AND ('
+                + ', '.join(
+                    f'card.author_{name}' for name in self.AUTHOR_FIELDS
+                )
+                + ') IS DISTINCT FROM ('
+                + ', '.join(f'author.{name}' for name in self.AUTHOR_FIELDS)
+                + ')',
+                [list(author_ids)]
+            )
+
+    def refresh_ingredient(self, ingredient_id, recipe_ids):
+        """
+        Переписывает название и единицу продукта в составе карточек,
+        не пересобирая остальные поля
+        """
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {quote_name(self.model._meta.db_table)} AS card '
+                'SET ingredients = (SELECT jsonb_agg(CASE '
+                'WHEN (item ->> 0)::bigint = ingredient.id '
+                'THEN jsonb_build_array(ingredient.id, ingredient.name, '
+                'ingredient.measurement_unit, item -> 3) ELSE item END '
+                'ORDER BY position) '
+                'FROM jsonb_array_elements(card.ingredients) '
+                'WITH ORDINALITY AS element(item, position)) '
+                f'FROM {quote_name(Ingredient._meta.db_table)} AS ingredient '
+                'WHERE ingredient.id = %s AND card.recipe_id = ANY(%s) '
+                'AND card.ingredient_ids @> ARRAY[ingredient.id]::bigint[]',
+                [ingredient_id, list(recipe_ids)]
+            )
+
+    def shift_counter(self, column, recipe_ids, delta):
+        """Меняет счётчик карточек рецептов на delta"""
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids or not delta:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE '
+                f'{connection.ops.quote_name(self.model._meta.db_table)} '
+                f'SET {column} = {column} + %s WHERE recipe_id = ANY(%s)',
+                [delta, recipe_ids]
+            )
+
+    def subtract_removed(self, model, recipe_ids):
+        """
+        Вычитает из счётчиков удалённые в обход менеджеров связи модели
+        model: recipe_ids - рецепты удалённых строк, с повторами
+        """
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        column = next(
+            column for column, counted in self.COUNTERS.items()
+            if counted is model
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE '
+                f'{connection.ops.quote_name(self.model._meta.db_table)} '
+                f'AS card SET {column} = card.{column} - removed.count '
+                'FROM (SELECT recipe_id, count(*) AS count '
+                'FROM unnest(%s::bigint[]) AS recipe_id '
+                'GROUP BY recipe_id) AS removed '
+                'WHERE card.recipe_id = removed.recipe_id',
+                [recipe_ids]
+            )
+
+
+class RecipeCard(models.Model):
+    """
+    Денормализованная карточка рецепта для списков: поля рецепта,
+    профиль автора, состав и счётчики в одной строке, чтобы список
+    читался из одной таблицы без соединений. Обновляется вместе
+    с рецептом, составом, продуктами и профилем автора (RecipeCardManager),
+    целиком пересобирается командой rebuild_recipe_cards
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card',
+        verbose_name='Рецепт'
+    )
+    name = models.CharField(verbose_name='Название', max_length=256)
+    text = models.TextField(verbose_name='Описание')
+    image = models.CharField(verbose_name='Картинка', max_length=100)
+    cooking_time = models.IntegerField(
+        verbose_name='Время приготовления (в минутах)'
+    )
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    updated_at = models.DateTimeField(verbose_name='Дата изменения')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recipe_cards',
+        verbose_name='Автор'
+    )
+    author_username = models.CharField(max_length=150)
+    author_first_name = models.CharField(max_length=150)
+    author_last_name = models.CharField(max_length=150)
+    author_email = models.CharField(max_length=254)
+    author_avatar = models.CharField(max_length=100, null=True)
+    ingredient_ids = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        verbose_name='Id ингредиентов'
+    )
+    ingredients = models.JSONField(default=list, verbose_name='Состав')
+    favorites_count = models.IntegerField(
+        default=0,
+        verbose_name='В избранном'
+    )
+    shoppingcarts_count = models.IntegerField(
+        default=0,
+        verbose_name='В корзинах'
+    )
+
+    objects = RecipeCardManager()
+
+    class Meta:
+        verbose_name = 'Карточка рецепта'
+        verbose_name_plural = 'Карточки рецептов'
+        ordering = ('-created_at', '-recipe_id')
+        indexes = [
+            GinIndex(
+                fields=['ingredient_ids'],
+                name='card_ingredient_ids_gin'
+            ),
+            models.Index(
+                fields=['-created_at', '-recipe'],
+                name='card_created_at_idx'
+            ),
+            models.Index(
+                fields=['author', '-created_at', '-recipe'],
+                name='card_author_created_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'Карточка рецепта {self.recipe_id} | {self.name}'
@@ -0,0 +1,96 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from users.models import User
+
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeCard,
+    ShoppingCart,
+    ShoppingListItem,
+)
+from .tasks import (
+    enqueue_refresh_ingredient_cards,
+    enqueue_refresh_similar_recipes,
+)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в итоги списка покупок"""
+    if created:
+        ShoppingListItem.objects.add_recipes(
+            instance.user_id, [instance.recipe_id]
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """
+    Убирает ингредиенты рецепта из итогов списка покупок.
+    Срабатывает до удаления, чтобы состав рецепта
+    был ещё доступен при каскадном удалении
+    """
+    ShoppingListItem.objects.remove_recipes(
+        instance.user_id, [instance.recipe_id]
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_similar_recipes(sender, instance, **kwargs):
+    """Ставит в очередь пересчёт похожих рецептов после изменения рецепта"""
+    enqueue_refresh_similar_recipes()
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_card(sender, instance, **kwargs):
+    """Пересобирает карточку изменённого рецепта"""
+    RecipeCard.objects.refresh([instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_cards(sender, instance, created, update_fields=None,
+                             **kwargs):
+    """Ставит в очередь обновление карточек с изменённым продуктом"""
+    if not created and (update_fields is None or set(update_fields) & {
+        'name', 'measurement_unit'
+    }):
+        enqueue_refresh_ingredient_cards(instance.pk)
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_deleted_ingredient(sender, instance, **kwargs):
+    """
+    Убирает удалённый продукт из состава рецептов: связи удаляет
+    сборщик Django, а массивы id и карточки пересобираются здесь
+    """
+    Recipe.objects.update_ingredient_ids(
+        Recipe.objects.filter(
+            ingredient_ids__contains=[instance.pk]
+        ).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def refresh_author_cards(sender, instance, update_fields=None, **kwargs):
+    """Обновляет профиль автора в карточках его рецептов"""
+    if update_fields is None or set(update_fields) & set(
+        RecipeCard.objects.AUTHOR_FIELDS
+    ):
+        RecipeCard.objects.refresh_authors([instance.pk])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def count_added_relation(sender, instance, created, **kwargs):
+    """Увеличивает счётчик карточки при добавлении через ORM"""
+    if created:
+        sender.objects.shift_card_counter([instance.recipe_id], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def count_removed_relation(sender, instance, **kwargs):
+    """Уменьшает счётчик карточки при удалении через ORM"""
+    sender.objects.shift_card_counter([instance.recipe_id], -1)
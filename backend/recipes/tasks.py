@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from jobs.models import Job
+from jobs.tasks import task
+
+from . import deletion
+from .models import RecipeCard
+
+REFRESH_SIMILAR_RECIPES = 'recipes.refresh_similar_recipes'
+DELETE_USER = 'recipes.delete_user'
+REFRESH_INGREDIENT_CARDS = 'recipes.refresh_ingredient_cards'
+
+
+@task(REFRESH_SIMILAR_RECIPES)
+def refresh_similar_recipes():
+    """Пересчитывает похожие рецепты для изменённых рецептов"""
+    call_command('build_similar_recipes', changed_only=True)
+
+
+def enqueue_refresh_similar_recipes():
+    """
+    Ставит пересчёт похожих рецептов в очередь с задержкой:
+    правки за это время объединяются в один пересчёт
+    """
+    Job.objects.enqueue(
+        REFRESH_SIMILAR_RECIPES,
+        priority=-1,
+        delay=timedelta(minutes=1),
+        dedup_key=REFRESH_SIMILAR_RECIPES
+    )
+
+
+@task(REFRESH_INGREDIENT_CARDS)
+def refresh_ingredient_cards(ingredient_id):
+    """
+    Переписывает продукт в составе карточек пачками по
+    RECIPE_CARDS['BATCH_SIZE'], каждую в своей транзакции
+    """
+    recipe_ids = RecipeCard.objects.filter(
+        ingredient_ids__contains=[ingredient_id]
+    ).order_by('pk').values_list('pk', flat=True)
+    last_id = 0
+    while True:
+        batch = list(recipe_ids.filter(pk__gt=last_id)[
+            :settings.RECIPE_CARDS['BATCH_SIZE']
+        ])
+        if not batch:
+            return
+        with transaction.atomic():
+            RecipeCard.objects.refresh_ingredient(ingredient_id, batch)
+        last_id = batch[-1]
+
+
+def enqueue_refresh_ingredient_cards(ingredient_id):
+    """
+    Ставит в очередь обновление карточек с изменённым продуктом:
+    у распространённого продукта это десятки тысяч карточек
+    """
+    Job.objects.enqueue(
+        REFRESH_INGREDIENT_CARDS,
+        payload={'ingredient_id': ingredient_id},
+        dedup_key=f'{REFRESH_INGREDIENT_CARDS}:{ingredient_id}'
+    )
+
+
+@task(DELETE_USER)
+def delete_user(user_id):
+    """Удаляет пользователя и все его данные пачками"""
+    deletion.delete_user(user_id)
+
+
+def schedule_user_deletion(user):
+    """
+    Закрывает пользователю вход и ставит удаление его данных в очередь:
+    у активного автора это могут быть сотни тысяч строк
+    """
+    deletion.deactivate_user(user)
+    Job.objects.enqueue(
+        DELETE_USER,
+        payload={'user_id': user.pk},
+        dedup_key=f'{DELETE_USER}:{user.pk}'
+    )
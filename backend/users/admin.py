@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from recipes.admin import SummaryDeleteConfirmationMixin
+from recipes.tasks import schedule_user_deletion
 from .models import Subscription, User
 
 @admin.register(User)
-class UserAdmin(UserAdmin):
+class UserAdmin(SummaryDeleteConfirmationMixin, UserAdmin):
     """Модель пользователей для админ-зоны проекта"""
 
     list_display = (
@@ -18,6 +20,13 @@ class UserAdmin(UserAdmin):
 
     ordering = ('id',)
 
+    def delete_model(self, request, obj):
+        schedule_user_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            schedule_user_deletion(user)
+
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
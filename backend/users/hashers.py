@@ -0,0 +1,130 @@
+"""
+Хэшеры паролей со стоимостью из настроек PASSWORD_HASHING.
+
+Имена алгоритмов совпадают со стандартными хэшерами Django, поэтому
+существующие хэши проверяются как прежде, а хэши другого алгоритма
+или с другой стоимостью Django пересчитывает при успешном входе.
+
+Хэш считается в пуле из THREADS потоков процесса: вход и регистрация
+занимают не больше THREADS ядер, и остальные потоки воркера продолжают
+обслуживать запросы. Ожидающих пула не больше QUEUE_SIZE, остальные
+запросы к API после QUEUE_TIMEOUT секунд получают ответ 503
+с Retry-After. Вне запросов к API (админка, команды управления)
+хэш в этом случае считается в вызывающем потоке
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+
+
+class HashingBusy(Throttled):
+    """Пул хэширования паролей занят"""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер занят проверкой паролей.'
+    default_code = 'password_hashing_busy'
+    extra_detail_singular = 'Повторите запрос через {wait} секунду.'
+    extra_detail_plural = 'Повторите запрос через {wait} секунд.'
+
+
+'''Истина, пока выполняется представление API (PasswordHashingMiddleware):
+только DRF превращает HashingBusy в ответ 503'''
+busy_responses = ContextVar('password_hashing_busy_responses', default=False)
+
+
+class HashingPool:
+    """Ограниченный пул потоков для хэширования, свой в каждом процессе"""
+
+    def __init__(self, threads, queue_size):
+        self.pid = os.getpid()
+        self.threads = threads
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(threads + queue_size)
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(
+            max_workers=threads,
+            thread_name_prefix='password-hasher',
+            initializer=self._mark_worker,
+        )
+
+    def _mark_worker(self):
+        self._local.worker = True
+
+    def run(self, function):
+        '''Вложенные вызовы из потока пула выполняются на месте'''
+        if getattr(self._local, 'worker', False):
+            return function()
+        timeout = settings.PASSWORD_HASHING['QUEUE_TIMEOUT']
+        if not self._slots.acquire(timeout=timeout):
+            if busy_responses.get():
+                raise HashingBusy(wait=timeout)
+            return function()
+        try:
+            return self._executor.submit(function).result()
+        finally:
+            self._slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Пул текущего процесса, None при хэшировании в потоке запроса"""
+    global _pool
+    options = settings.PASSWORD_HASHING
+    if not options['THREADS']:
+        return None
+    key = (os.getpid(), options['THREADS'], options['QUEUE_SIZE'])
+    with _pool_lock:
+        if _pool is None or (
+            _pool.pid, _pool.threads, _pool.queue_size
+        ) != key:
+            _pool = HashingPool(options['THREADS'], options['QUEUE_SIZE'])
+        return _pool
+
+
+def run_hashing(function):
+    pool = get_pool()
+    return pool.run(function) if pool else function()
+
+
+class PooledHashingMixin:
+    """Вычисление и проверка хэша в пуле потоков"""
+
+    def encode(self, *args, **kwargs):
+        return run_hashing(partial(super().encode, *args, **kwargs))
+
+    def verify(self, password, encoded):
+        return run_hashing(partial(super().verify, password, encoded))
+
+
+class PBKDF2PasswordHasher(PooledHashingMixin, hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 с числом итераций PBKDF2_ITERATIONS"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHING['PBKDF2_ITERATIONS']
+
+
+class Argon2PasswordHasher(PooledHashingMixin, hashers.Argon2PasswordHasher):
+    """Argon2id с временем, памятью (КиБ) и параллелизмом из настроек"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_HASHING['ARGON2_TIME_COST']
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_HASHING['ARGON2_MEMORY_COST']
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_HASHING['ARGON2_PARALLELISM']
@@ -0,0 +1,184 @@
+import statistics
+import threading
+import time
+import uuid
+
+from api.views import IngredientViewSet, TokenCreateView
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+PASSWORD = "benchmark-Pass-12345"
+HASHERS = {
+    "pbkdf2": "users.hashers.PBKDF2PasswordHasher",
+    "argon2": "users.hashers.Argon2PasswordHasher",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Пропускная способность входа по токену при разных хэшерах "
+        "и размерах пула хэширования и задержка других запросов "
+        "во время входов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hasher", action="append", choices=sorted(HASHERS),
+            help="Алгоритм хэша (можно несколько), по умолчанию текущий"
+        )
+        parser.add_argument(
+            "--stored-hasher", choices=sorted(HASHERS), default=None,
+            help="Алгоритм сохранённых хэшей: при отличии от --hasher "
+                 "первый вход каждого пользователя пересчитывает хэш"
+        )
+        parser.add_argument(
+            "--pool-threads", type=int, action="append",
+            help="Потоков в пуле хэширования (можно несколько, "
+                 "0 - в потоке запроса), по умолчанию из настроек"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=8,
+            help="Одновременных запросов входа"
+        )
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument("--users", type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.factory = APIRequestFactory(
+            SERVER_NAME=settings.ALLOWED_HOSTS[0]
+        )
+        self.login = TokenCreateView.as_view(throttle_classes=())
+        self.ingredients = IngredientViewSet.as_view(
+            {"get": "list"}, throttle_classes=()
+        )
+        for algorithm in (
+            options["hasher"] or [settings.PASSWORD_HASHING["ALGORITHM"]]
+        ):
+            for threads in (
+                options["pool_threads"]
+                or [settings.PASSWORD_HASHING["THREADS"]]
+            ):
+                self._run(algorithm, threads, options)
+
+    def _settings(self, algorithm, threads):
+        return override_settings(
+            PASSWORD_HASHING={
+                **settings.PASSWORD_HASHING,
+                "ALGORITHM": algorithm,
+                "THREADS": threads,
+            },
+            PASSWORD_HASHERS=[HASHERS[algorithm]] + [
+                path for path in settings.PASSWORD_HASHERS
+                if path != HASHERS[algorithm]
+            ],
+        )
+
+    def _run(self, algorithm, threads, options):
+        prefix = f"benchmark-login-{uuid.uuid4().hex[:8]}"
+        with self._settings(options["stored_hasher"] or algorithm, threads):
+            encoded = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            User(
+                email=f"{prefix}-{number}@example.com",
+                username=f"{prefix}-{number}",
+                password=encoded,
+            )
+            for number in range(options["users"])
+        )
+        try:
+            with self._settings(algorithm, threads):
+                quiet = self._measure_other(lambda timings: len(timings) >= 50)
+                self._report(algorithm, threads, users, quiet, options)
+        finally:
+            User.objects.filter(email__startswith=prefix).delete()
+
+    def _report(self, algorithm, threads, users, quiet, options):
+        done = threading.Event()
+        other = []
+        watcher = threading.Thread(
+            target=lambda: other.extend(
+                self._measure_other(lambda timings: done.is_set())
+            )
+        )
+        watcher.start()
+        started = time.perf_counter()
+        timings, statuses = self._logins(users, options)
+        elapsed = time.perf_counter() - started
+        done.set()
+        watcher.join()
+        rehashed = User.objects.filter(
+            pk__in=[user.pk for user in users],
+            password__startswith=f"{get_hasher().algorithm}$",
+        ).count()
+        self.stdout.write(
+            f"{algorithm}, потоков пула {threads}: "
+            f"{len(timings) / elapsed:.1f} входов/с, "
+            f"вход медиана {statistics.median(timings) * 1000:.0f} мс, "
+            f"p95 {self._p95(timings) * 1000:.0f} мс; "
+            f"другой запрос p95 {self._p95(quiet) * 1000:.1f} мс "
+            f"без входов, {self._p95(other) * 1000:.1f} мс во время; "
+            f"ответы {dict(sorted(statuses.items()))}, "
+            f"хэш {algorithm} у {rehashed} из {len(users)}"
+        )
+
+    def _logins(self, users, options):
+        timings = []
+        statuses = {}
+        lock = threading.Lock()
+        remaining = iter(range(options["logins"]))
+
+        def worker():
+            try:
+                for number in remaining:
+                    request = self.factory.post(
+                        "/api/auth/token/login/",
+                        {
+                            "email": users[number % len(users)].email,
+                            "password": PASSWORD,
+                        },
+                        format="json",
+                    )
+                    started = time.perf_counter()
+                    status_code = self.login(request).status_code
+                    with lock:
+                        timings.append(time.perf_counter() - started)
+                        statuses[status_code] = (
+                            statuses.get(status_code, 0) + 1
+                        )
+            finally:
+                connections.close_all()
+
+        workers = [
+            threading.Thread(target=worker)
+            for _ in range(options["concurrency"])
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return timings, statuses
+
+    def _measure_other(self, finished):
+        """Задержки поиска продуктов, пока finished(задержки) ложно"""
+        timings = []
+        try:
+            while not finished(timings):
+                started = time.perf_counter()
+                self.ingredients(
+                    self.factory.get("/api/ingredients/", {"name": "а"})
+                ).render()
+                timings.append(time.perf_counter() - started)
+                time.sleep(0.01)
+        finally:
+            connections.close_all()
+        return timings
+
+    @staticmethod
+    def _p95(timings):
+        timings = sorted(timings)
+        return timings[int(len(timings) * 0.95)] if timings else 0
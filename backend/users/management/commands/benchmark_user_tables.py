@@ -0,0 +1,136 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+from users.partitioning import partition_count
+
+
+class Rollback(Exception):
+    """Откат изменений, сделанных замерами"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер запросов к избранному, корзинам и подпискам по пользователю "
+        "до и после секционирования (изменения откатываются)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", type=int, default=200,
+            help="Повторов каждого запроса"
+        )
+
+    def handle(self, *args, **options):
+        user_ids = list(
+            Favorite.objects.values_list("user_id", flat=True).distinct()[
+                :1000
+            ]
+        )
+        recipe_ids = list(Recipe.objects.values_list("id", flat=True)[:1000])
+        if not user_ids or not recipe_ids:
+            raise CommandError("Нет данных для замеров")
+        rng = random.Random(0)
+        self.iterations = options["iterations"]
+
+        for model in (Favorite, ShoppingCart, Subscription):
+            table = model._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_total_relation_size(%s::regclass) + "
+                    "coalesce((SELECT sum(pg_total_relation_size(inhrelid)) "
+                    "FROM pg_inherits WHERE inhparent = %s::regclass), 0)",
+                    [table, table]
+                )
+                size = cursor.fetchone()[0]
+            self.stdout.write(
+                f"{table}: строк {model.objects.count()}, "
+                f"{size / 2 ** 20:.1f} МБ, "
+                f"секций {partition_count(connection, table) or 0}"
+            )
+
+        favorite = Favorite.objects.order_by("?").first()
+        self._measure(
+            "избранное пользователя",
+            lambda: list(Favorite.objects.filter(
+                user_id=rng.choice(user_ids)
+            ).values_list("recipe_id", flat=True)),
+            Favorite.objects.filter(user_id=user_ids[0]),
+        )
+        self._measure(
+            "флаг в избранном",
+            lambda: Favorite.objects.filter(
+                user_id=rng.choice(user_ids), recipe_id=rng.choice(recipe_ids)
+            ).exists(),
+            Favorite.objects.filter(
+                user_id=user_ids[0], recipe_id=recipe_ids[0]
+            ),
+        )
+        self._measure(
+            "корзина пользователя",
+            lambda: list(ShoppingCart.objects.filter(
+                user_id=rng.choice(user_ids)
+            ).values_list("recipe_id", flat=True)),
+            ShoppingCart.objects.filter(user_id=user_ids[0]),
+        )
+        self._measure(
+            "страница подписок",
+            lambda: list(Subscription.objects.filter(
+                user_id=rng.choice(user_ids)
+            ).select_related("author")[:6]),
+            Subscription.objects.filter(user_id=user_ids[0])[:6],
+        )
+        self._measure(
+            "поиск по id",
+            lambda: Favorite.objects.filter(pk=favorite.pk).exists(),
+            Favorite.objects.filter(pk=favorite.pk),
+        )
+        try:
+            with transaction.atomic():
+                self._measure(
+                    "добавление и удаление 10 рецептов",
+                    lambda: self._toggle(rng, user_ids, recipe_ids),
+                )
+                raise Rollback
+        except Rollback:
+            pass
+
+    @staticmethod
+    def _toggle(rng, user_ids, recipe_ids):
+        user_id = rng.choice(user_ids)
+        targets = rng.sample(recipe_ids, 10)
+        Favorite.objects.add_many(user_id, targets)
+        Favorite.objects.remove_many(user_id, targets)
+
+    def _measure(self, name, query, queryset=None):
+        timings = []
+        for _ in range(self.iterations):
+            started = time.perf_counter()
+            query()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        scanned = ""
+        if queryset is not None:
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scanned = f", таблиц в плане {self._count_scans(plan[0]['Plan'])}"
+        self.stdout.write(
+            f"  {name}: медиана {statistics.median(timings) * 1000:.3f} мс, "
+            f"p95 {timings[int(len(timings) * 0.95)] * 1000:.3f} мс"
+            + scanned
+        )
+
+    def _count_scans(self, plan):
+        """Число сканируемых таблиц и секций в плане"""
+        return int("Relation Name" in plan) + sum(
+            self._count_scans(child) for child in plan.get("Plans", [])
+        )
@@ -0,0 +1,186 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from recipes.matrices import (
+    idf_weights,
+    normalize_rows,
+    pairs_matrix,
+    prune_rows,
+    row_dot,
+    sample_row_entries,
+    top_k_per_row,
+)
+from recipes.models import Favorite, Ingredient, IngredientInRecipe, Recipe
+from scipy import sparse
+from users.models import AuthorRecommendation, Subscription, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Расчёт рекомендаций авторов по совместным подпискам "
+        "и общим ингредиентам избранных рецептов. Кандидаты берутся "
+        "из подписок похожих пользователей, и на каждом шаге в строке "
+        "остаётся ограниченное число значений, поэтому память не растёт "
+        "с числом подписчиков популярных авторов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top-k", type=int, default=10,
+            help="Сколько авторов рекомендовать каждому пользователю"
+        )
+        parser.add_argument(
+            "--block-size", type=int, default=1000,
+            help="Сколько пользователей обрабатывать за один шаг"
+        )
+        parser.add_argument(
+            "--ingredients-weight", type=float, default=0.3,
+            help="Вес близости по ингредиентам относительно подписок"
+        )
+        parser.add_argument(
+            "--max-followers", type=int, default=1000,
+            help="Сколько случайных подписчиков автора учитывать "
+            "при поиске похожих пользователей"
+        )
+        parser.add_argument(
+            "--neighbors", type=int, default=100,
+            help="Сколько похожих пользователей оставлять каждому"
+        )
+        parser.add_argument(
+            "--candidates", type=int, default=50,
+            help="Сколько авторов-кандидатов оценивать по ингредиентам"
+        )
+
+    @staticmethod
+    def _ids(queryset):
+        return np.fromiter(
+            queryset.order_by("id").values_list("id", flat=True).iterator(
+                chunk_size=10000
+            ),
+            dtype=np.int64
+        )
+
+    @staticmethod
+    def _pairs(queryset, *fields):
+        return queryset.values_list(*fields).order_by().iterator(
+            chunk_size=10000
+        )
+
+    def _build_matrices(self, user_ids):
+        recipe_ids = self._ids(Recipe.objects.all())
+        ingredient_ids = self._ids(Ingredient.objects.all())
+        follows = pairs_matrix(
+            self._pairs(Subscription.objects.all(), "user_id", "author_id"),
+            user_ids, user_ids
+        )
+        favorites = pairs_matrix(
+            self._pairs(Favorite.objects.all(), "user_id", "recipe_id"),
+            user_ids, recipe_ids
+        )
+        authorship = pairs_matrix(
+            self._pairs(Recipe.objects.all(), "author_id", "id"),
+            user_ids, recipe_ids
+        )
+        recipe_ingredients = pairs_matrix(
+            self._pairs(
+                IngredientInRecipe.objects.all(),
+                "recipe_id", "ingredient_id"
+            ),
+            recipe_ids, ingredient_ids
+        )
+        recipe_ingredients = recipe_ingredients @ sparse.diags(
+            idf_weights(recipe_ingredients)
+        )
+        return follows, favorites, authorship, recipe_ingredients
+
+    def handle(self, *args, **options):
+        top_k, block_size = options["top_k"], options["block_size"]
+        ingredients_weight = options["ingredients_weight"]
+        started_at = timezone.now()
+        '''Id и все пары читаются из одного снимка базы: иначе пара,
+        добавленная между запросами, попала бы в чужую строку'''
+        with transaction.atomic(durable=True):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"
+                )
+            user_ids = self._ids(User.objects.all())
+            follows, favorites, authorship, recipe_ingredients = (
+                self._build_matrices(user_ids)
+            )
+
+        '''Подписки на популярных авторов дают меньший вклад в сходство,
+        а из их подписчиков берётся случайная выборка: иначе строка
+        похожих пользователей содержала бы всех подписчиков автора'''
+        follows_t = follows.T.tocsr()
+        followers = follows_t.getnnz(axis=1)
+        weighted_follows_t = sparse.diags(
+            1 / np.sqrt(np.maximum(followers, 1))
+        ) @ sample_row_entries(follows_t, options["max_followers"])
+        user_tastes = normalize_rows(favorites @ recipe_ingredients)
+        author_tastes = normalize_rows(authorship @ recipe_ingredients)
+        is_author = authorship.getnnz(axis=1) > 0
+
+        active_rows = np.flatnonzero(follows.getnnz(axis=1))
+        for start in range(0, len(active_rows), block_size):
+            block = active_rows[start:start + block_size]
+            neighbors = prune_rows(
+                follows[block] @ weighted_follows_t, options["neighbors"]
+            )
+            co_following = (neighbors @ follows).tocoo()
+            row_max = np.zeros(len(block))
+            np.maximum.at(row_max, co_following.row, co_following.data)
+            row_max[row_max == 0] = 1
+
+            '''Не рекомендуем самого себя, уже оформленные подписки
+            и пользователей без рецептов'''
+            followed = follows[block].tocoo()
+            excluded = np.isin(
+                co_following.row.astype(np.int64) * len(user_ids)
+                + co_following.col,
+                followed.row.astype(np.int64) * len(user_ids) + followed.col
+            ) | (co_following.col == block[co_following.row]) | ~is_author[
+                co_following.col
+            ]
+            co_following.data[excluded] = 0
+
+            rows, columns, values = top_k_per_row(
+                co_following, options["candidates"]
+            )
+            scores = values / row_max[rows] + ingredients_weight * row_dot(
+                user_tastes[block[rows]], author_tastes[columns]
+            )
+            rows, columns, values = top_k_per_row(
+                sparse.coo_matrix(
+                    (scores, (rows, columns)), shape=co_following.shape
+                ),
+                top_k
+            )
+            computed_at = timezone.now()
+            with transaction.atomic():
+                AuthorRecommendation.objects.filter(
+                    user_id__in=user_ids[block].tolist()
+                ).delete()
+                AuthorRecommendation.objects.bulk_create(
+                    AuthorRecommendation(
+                        user_id=user_id,
+                        author_id=author_id,
+                        score=score,
+                        computed_at=computed_at
+                    )
+                    for user_id, author_id, score in zip(
+                        user_ids[block[rows]].tolist(),
+                        user_ids[columns].tolist(),
+                        values.tolist()
+                    )
+                )
+            self.stdout.write(
+                "Обработано пользователей: "
+                f"{start + len(block)} из {len(active_rows)}"
+            )
+
+        AuthorRecommendation.objects.filter(
+            computed_at__lt=started_at
+        ).delete()
+        self.stdout.write(self.style.SUCCESS("Рекомендации рассчитаны"))
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+from users.partitioning import convert_table, partition_count
+
+
+class Command(BaseCommand):
+    help = (
+        "Перестройка избранного, корзин и подписок в секционированные "
+        "по хэшу user_id таблицы (или обратно) без долгой блокировки"
+    )
+
+    MODELS = (Favorite, ShoppingCart, Subscription)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--partitions", type=int,
+            default=settings.USER_TABLE_PARTITIONS["PARTITIONS"],
+            help="Число секций, 0 - обычные таблицы"
+        )
+        parser.add_argument(
+            "--batch-size", type=int,
+            default=settings.USER_TABLE_PARTITIONS["BATCH_SIZE"],
+            help="Строк в одной транзакции копирования"
+        )
+
+    def handle(self, *args, **options):
+        for model in self.MODELS:
+            table = model._meta.db_table
+            converted = convert_table(
+                connection,
+                table,
+                options["partitions"] or None,
+                batch_size=options["batch_size"],
+                progress=lambda copied, total, table=table: self.stdout.write(
+                    f"{table}: скопировано {copied} из ~{total}"
+                ),
+            )
+            self.stdout.write(
+                f"{table}: секций {partition_count(connection, table) or 0}"
+                + ("" if converted else " (без изменений)")
+            )
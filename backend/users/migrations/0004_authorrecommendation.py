@@ -0,0 +1,38 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_subscription_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчёта')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_to', to=settings.AUTH_USER_MODEL, verbose_name='Рекомендованный автор')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация автора',
+                'verbose_name_plural': 'Рекомендации авторов',
+                'ordering': ('-score',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='authorrecommendation',
+            index=models.Index(fields=['user', '-score'], name='author_recommendation_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='authorrecommendation',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_author_recommendation'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import migrations
+from users.partitioning import convert_table
+
+TABLES = ('users_subscription',)
+
+
+def convert(partitioned):
+    def convert_tables(apps, schema_editor):
+        options = settings.USER_TABLE_PARTITIONS
+        for table in TABLES:
+            convert_table(
+                schema_editor.connection,
+                table,
+                (options['PARTITIONS'] or None) if partitioned else None,
+                batch_size=options['BATCH_SIZE'],
+            )
+
+    return convert_tables
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0004_authorrecommendation'),
+        ('changelog', '0003_change_trigger_table_argument'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert(True), convert(False)),
+    ]
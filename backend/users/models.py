@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import connection, models
 
 
 class User(AbstractUser):
@@ -55,6 +55,81 @@ class User(AbstractUser):
 User = get_user_model()
 
 
+class UserRelationManager(models.Manager):
+    """
+    Менеджер связей пользователя с объектами (подписки, избранное,
+    корзина покупок), изменяющий их одним SQL-запросом.
+    Целевым считается внешний ключ модели, отличный от user
+    """
+
+    def _tables(self):
+        target = next(
+            field for field in self.model._meta.concrete_fields
+            if field.is_relation and field.name != 'user'
+        )
+        quote_name = connection.ops.quote_name
+        return (
+            quote_name(self.model._meta.db_table),
+            quote_name(target.column),
+            quote_name(target.related_model._meta.db_table),
+        )
+
+    @staticmethod
+    def _execute(sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def add_many(self, user_id, target_ids):
+        """
+        Создаёт связи с существующими объектами из target_ids,
+        пропуская уже созданные. Возвращает id добавленных объектов
+        """
+        if not target_ids:
+            return set()
+        table, column, target_table = self._tables()
+        return self._execute(
+            f'INSERT INTO {table} (user_id, {column}) '
+            f'SELECT %s, id FROM {target_table} '
+            f'WHERE id IN ({", ".join(["%s"] * len(target_ids))}) '
+            f'ON CONFLICT DO NOTHING RETURNING {column}',
+            [user_id, *target_ids]
+        )
+
+    def copy_from(self, user_id, source_model):
+        """
+        Переносит связи пользователя из таблицы другой модели
+        с тем же целевым полем. Возвращает id добавленных объектов
+        """
+        table, column, _ = self._tables()
+        source_table = connection.ops.quote_name(
+            source_model._meta.db_table
+        )
+        return self._execute(
+            f'INSERT INTO {table} (user_id, {column}) '
+            f'SELECT user_id, {column} FROM {source_table} '
+            'WHERE user_id = %s '
+            f'ON CONFLICT DO NOTHING RETURNING {column}',
+            [user_id]
+        )
+
+    def remove_many(self, user_id, target_ids=None):
+        """
+        Удаляет связи пользователя с объектами из target_ids
+        (или все связи, если target_ids не передан).
+        Возвращает id объектов, связи с которыми были удалены
+        """
+        table, column, _ = self._tables()
+        sql = f'DELETE FROM {table} WHERE user_id = %s'
+        params = [user_id]
+        if target_ids is not None:
+            if not target_ids:
+                return set()
+            sql += f' AND {column} IN ({", ".join(["%s"] * len(target_ids))})'
+            params += target_ids
+        return self._execute(f'{sql} RETURNING {column}', params)
+
+
 class Subscription(models.Model):
     """Модель подписок"""
 
@@ -71,6 +146,8 @@ class Subscription(models.Model):
         verbose_name='Автор рецептов'
     )
 
+    objects = UserRelationManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -83,3 +160,45 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class AuthorRecommendation(models.Model):
+    """
+    Модель рекомендованных пользователю авторов. Заполняется командой
+    build_author_recommendations по графу подписок и избранному
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommended_to',
+        verbose_name='Рекомендованный автор'
+    )
+    score = models.FloatField(verbose_name='Оценка')
+    computed_at = models.DateTimeField(verbose_name='Дата расчёта')
+
+    class Meta:
+        verbose_name = 'Рекомендация автора'
+        verbose_name_plural = 'Рекомендации авторов'
+        ordering = ('-score',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_author_recommendation'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-score'],
+                name='author_recommendation_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} -> {self.author}: {self.score:.3f}'
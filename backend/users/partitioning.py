@@ -0,0 +1,268 @@
+"""
+Перевод таблиц связей пользователя (избранное, корзина, подписки)
+в секционирование PostgreSQL по хэшу user_id и обратно без
+длительной блокировки.
+
+Новая таблица создаётся рядом со старой с теми же столбцами,
+ограничениями и индексами. Триггер на старой таблице повторяет
+в ней все изменения, а существующие строки копируются пачками
+по id в отдельных транзакциях. Затем таблицы меняются местами
+в одной короткой транзакции, и старая удаляется. Копирование
+и замена ждут блокировок не дольше LOCK_TIMEOUT и повторяются:
+при взаимной блокировке с запросами приложения уступают они.
+Остатки прерванной перестройки удаляются при следующем запуске.
+
+Первичный ключ секционированной таблицы - (id, user_id): ключ
+секционирования обязан входить в уникальные ограничения. Уникальность
+id обеспечивает последовательность, поиск по id идёт по этому индексу
+"""
+import time
+
+from django.db import OperationalError, transaction
+
+LOCK_TIMEOUT = '200ms'
+ATTEMPTS = 50
+'''SQLSTATE lock_not_available и deadlock_detected'''
+RETRIED_ERRORS = ('55P03', '40P01')
+
+
+def _fetch(cursor, sql, params=None):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def _execute_all(cursor, statements):
+    for sql in statements:
+        cursor.execute(sql)
+
+
+def _with_retries(connection, work):
+    """
+    Выполняет work(cursor) в транзакции с коротким ожиданием блокировок,
+    повторяя её, пока блокировки заняты запросами приложения
+    """
+    for attempt in range(ATTEMPTS):
+        try:
+            with transaction.atomic(using=connection.alias), \
+                    connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+                return work(cursor)
+        except OperationalError as error:
+            code = getattr(error.__cause__, 'pgcode', None)
+            if code not in RETRIED_ERRORS or attempt == ATTEMPTS - 1:
+                raise
+            time.sleep(0.1 * (attempt + 1))
+
+
+def _drop_leftovers(connection, table):
+    """Удаляет таблицу и триггер прерванной перестройки"""
+    quote = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        cursor.execute(
+            f'DROP TRIGGER IF EXISTS {quote(f"{table}_mirror")} '
+            f'ON {quote(table)}'
+        )
+        cursor.execute(
+            f'DROP FUNCTION IF EXISTS {quote(f"{table}_mirror")}()'
+        )
+        cursor.execute(f'DROP TABLE IF EXISTS {quote(f"{table}_new")}')
+
+
+def partition_count(connection, table):
+    """
+    Число секций секционированной таблицы,
+    None для обычной таблицы и вне PostgreSQL
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        rows = _fetch(
+            cursor,
+            "SELECT relkind, (SELECT count(*) FROM pg_inherits "
+            "WHERE inhparent = pg_class.oid) FROM pg_class "
+            "WHERE oid = %s::regclass",
+            [table]
+        )
+    relkind, count = rows[0]
+    return count if relkind == 'p' else None
+
+
+def convert_table(connection, table, partitions, key='user_id',
+                  primary_key='id', batch_size=10000, progress=None):
+    """
+    Перестраивает таблицу в секционированную по хэшу key
+    на partitions секций (или в обычную при partitions=None).
+    progress(скопировано строк, всего) вызывается после каждой пачки.
+    Возвращает False, если таблица уже в нужном виде
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    _drop_leftovers(connection, table)
+    if partition_count(connection, table) == partitions:
+        return False
+    quote = connection.ops.quote_name
+    new = f'{table}_new'
+    old = f'{table}_old'
+    mirror = f'{table}_mirror'
+    with connection.cursor() as cursor:
+        constraints = _fetch(
+            cursor,
+            'SELECT conname, contype, pg_get_constraintdef(oid) '
+            'FROM pg_constraint WHERE conrelid = %s::regclass '
+            "AND contype IN ('p', 'u', 'f', 'c') ORDER BY contype",
+            [table]
+        )
+        indexes = _fetch(
+            cursor,
+            'SELECT index.relname, pg_get_indexdef(index.oid) '
+            'FROM pg_index JOIN pg_class AS index '
+            'ON index.oid = pg_index.indexrelid '
+            'WHERE pg_index.indrelid = %s::regclass AND NOT EXISTS '
+            '(SELECT 1 FROM pg_constraint '
+            'WHERE conindid = pg_index.indexrelid)',
+            [table]
+        )
+        triggers = [
+            definition for _, definition in _fetch(
+                cursor,
+                'SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger '
+                'WHERE tgrelid = %s::regclass AND NOT tgisinternal '
+                'AND tgparentid = 0',
+                [table]
+            )
+        ]
+        sequence = _fetch(
+            cursor, 'SELECT pg_get_serial_sequence(%s, %s)',
+            [table, primary_key]
+        )[0][0]
+        values = ', '.join(
+            f'NEW.{quote(column.name)}'
+            for column in connection.introspection.get_table_description(
+                cursor, table
+            )
+        )
+
+    '''Ограничения и индексы, имена которых общие для схемы,
+    создаются с временными именами и переименовываются после замены'''
+    renames = []
+
+    def temporary(name):
+        renamed = f'{name[:55]}_new'
+        renames.append((renamed, name))
+        return renamed
+
+    statements = [
+        f'CREATE TABLE {quote(new)} '
+        f'(LIKE {quote(table)} INCLUDING DEFAULTS)'
+        + (f' PARTITION BY HASH ({quote(key)})' if partitions else '')
+    ]
+    for remainder in range(partitions or 0):
+        statements.append(
+            f'CREATE TABLE {quote(f"{table}_h{partitions}_p{remainder}")} '
+            f'PARTITION OF {quote(new)} FOR VALUES WITH '
+            f'(MODULUS {partitions}, REMAINDER {remainder})'
+        )
+    for name, kind, definition in constraints:
+        if kind == 'p':
+            columns = [primary_key, key] if partitions else [primary_key]
+            definition = f'PRIMARY KEY ({", ".join(map(quote, columns))})'
+        if kind in ('p', 'u'):
+            name = temporary(name)
+        statements.append(
+            f'ALTER TABLE {quote(new)} '
+            f'ADD CONSTRAINT {quote(name)} {definition}'
+        )
+    for name, definition in indexes:
+        statements.append(
+            f'CREATE INDEX {quote(temporary(name))} ON {quote(new)} '
+            f'USING {definition.split(" USING ", 1)[1]}'
+        )
+    statements.append(
+        f'CREATE FUNCTION {quote(mirror)}() RETURNS trigger AS $$ '
+        'BEGIN '
+        "IF TG_OP <> 'INSERT' THEN "
+        f'DELETE FROM {quote(new)} '
+        f'WHERE {quote(primary_key)} = OLD.{quote(primary_key)} '
+        f'AND {quote(key)} = OLD.{quote(key)}; '
+        'END IF; '
+        "IF TG_OP <> 'DELETE' THEN "
+        f'INSERT INTO {quote(new)} VALUES ({values}) '
+        'ON CONFLICT DO NOTHING; '
+        'END IF; '
+        'RETURN NULL; '
+        'END; $$ LANGUAGE plpgsql'
+    )
+    statements.append(
+        f'CREATE TRIGGER {quote(mirror)} '
+        f'AFTER INSERT OR UPDATE OR DELETE ON {quote(table)} '
+        f'FOR EACH ROW EXECUTE PROCEDURE {quote(mirror)}()'
+    )
+    _with_retries(connection, lambda cursor: _execute_all(cursor, statements))
+
+    with connection.cursor() as cursor:
+        first, last = _fetch(
+            cursor,
+            f'SELECT min({quote(primary_key)}), max({quote(primary_key)}) '
+            f'FROM {quote(table)}'
+        )[0]
+        total = _fetch(
+            cursor,
+            'SELECT sum(greatest(reltuples, 0))::bigint FROM pg_class '
+            "WHERE oid = %s::regclass AND relkind <> 'p' OR oid IN "
+            '(SELECT inhrelid '
+            'FROM pg_inherits WHERE inhparent = %s::regclass)',
+            [table, table]
+        )[0][0]
+
+    def copy_batch(cursor):
+        """
+        Строки, изменённые после установки триггера, он уже скопировал.
+        FOR SHARE не даёт удалить строку пачки, пока пачка не закоммичена:
+        иначе триггер не увидел бы её в новой таблице
+        """
+        cursor.execute(
+            f'INSERT INTO {quote(new)} SELECT * FROM {quote(table)} '
+            f'WHERE {quote(primary_key)} >= %s '
+            f'AND {quote(primary_key)} < %s '
+            'FOR SHARE ON CONFLICT DO NOTHING',
+            [start, start + batch_size]
+        )
+        return cursor.rowcount
+
+    copied = 0
+    start = first or 0
+    while last is not None and start <= last:
+        copied += _with_retries(connection, copy_batch)
+        start += batch_size
+        if progress:
+            progress(copied, total)
+
+    def swap(cursor):
+        """
+        Удаление старой таблицы с внешними ключами блокирует и таблицы,
+        на которые они ссылаются, поэтому замена тоже ждёт недолго
+        """
+        cursor.execute(
+            f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE'
+        )
+        cursor.execute(f'DROP TRIGGER {quote(mirror)} ON {quote(table)}')
+        cursor.execute(f'DROP FUNCTION {quote(mirror)}()')
+        if sequence:
+            cursor.execute(
+                f'ALTER SEQUENCE {sequence} '
+                f'OWNED BY {quote(new)}.{quote(primary_key)}'
+            )
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        cursor.execute(f'ALTER TABLE {quote(new)} RENAME TO {quote(table)}')
+        cursor.execute(f'DROP TABLE {quote(old)}')
+        for renamed, name in renames:
+            cursor.execute(
+                f'ALTER INDEX {quote(renamed)} RENAME TO {quote(name)}'
+            )
+        _execute_all(cursor, triggers)
+
+    _with_retries(connection, swap)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {quote(table)}')
+    return True
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from jobs.models import Job
+from jobs.tasks import task
+
+BUILD_AUTHOR_RECOMMENDATIONS = 'users.build_author_recommendations'
+
+
+@task(BUILD_AUTHOR_RECOMMENDATIONS)
+def build_author_recommendations():
+    """Пересчитывает рекомендации авторов по графу подписок"""
+    call_command('build_author_recommendations')
+
+
+def enqueue_build_author_recommendations():
+    """
+    Ставит пересчёт рекомендаций в очередь с задержкой:
+    подписки за это время объединяются в один пересчёт
+    """
+    Job.objects.enqueue(
+        BUILD_AUTHOR_RECOMMENDATIONS,
+        priority=-2,
+        delay=timedelta(minutes=10),
+        dedup_key=BUILD_AUTHOR_RECOMMENDATIONS
+    )